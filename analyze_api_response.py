@@ -5,44 +5,93 @@ Metaso API响应分析器
 分析各个API端点的响应内容，找出视频下载链接
 """
 
-import requests
+import sys
 import json
-import re
 from urllib.parse import urljoin, urlparse
+from http_session import create_session
+from http2_transport import enable_http2
+from http_cache import enable_http_cache
+from endpoint_registry import EndpointRegistry
+from page_scanner import scan_page
+from streaming_json import preview_text
 
 class MetasoAPIAnalyzer:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Referer': 'https://metaso.cn/'
-        })
+    # 分析结果在端点统计中的资源类型
+    REGISTRY_TYPE = 'analysis'
+    
+    # 要分析的API端点模板
+    API_ENDPOINT_TEMPLATES = [
+        "/api/file/{file_id}",
+        "/api/file/{file_id}/download",
+        "/api/file/{file_id}/video",
+        "/api/file/{file_id}/stream",
+        "/api/file/{file_id}/media",
+        "/api/file/{file_id}/play",
+        "/api/file/{file_id}/export",
+        "/api/file/{file_id}/export/video",
+        "/api/file/{file_id}/generate/video",
+        "/api/chapter/{chapter_id}",
+        "/api/chapter/{chapter_id}/video",
+        "/api/chapter/{chapter_id}/stream",
+        "/api/chapter/{chapter_id}/export",
+        "/api/video/{file_id}",
+        "/api/media/{file_id}",
+        "/api/stream/{file_id}",
+        "/api/courseware/{file_id}",
+        "/api/courseware/{file_id}/video",
+        "/api/courseware/{file_id}/export",
+        # 新增一些可能的端点
+        "/api/ppt/{file_id}/video/url",
+        "/api/file/{file_id}/video/url",
+        "/api/chapter/{chapter_id}/video/url",
+        "/api/export/{file_id}/video",
+        "/api/generate/{file_id}/video",
+    ]
+    
+    def __init__(self, http2=False):
+        self.session = create_session('api')
+        
+        # 重复运行时元数据响应直接从本地返回或通过304重新验证
+        self.http_cache = enable_http_cache(self.session)
+        
+        # 可选：所有API请求在一个HTTP/2连接上多路复用
+        if http2 and enable_http2(self.session):
+            print("⚡ 已启用HTTP/2")
         
         # 从URL中提取的参数
         self.file_id = "8651522172447916032"
         self.chapter_id = "8651523279591608320"
         self.base_url = "https://metaso.cn"
         
+        # 端点统计，与下载器共用同一个文件，但记录在单独的资源类型下：
+        # 这里的成功只表示响应中有链接，不代表下载器所需的可播放视频地址，不能影响下载器的排序
+        self.registry = EndpointRegistry()
+        
     def analyze_api_endpoint(self, endpoint):
-        """分析单个API端点"""
+        """
+        分析单个API端点
+        
+        Returns:
+            dict: 状态码、耗时和是否发现视频链接，请求失败时返回None
+        """
         url = urljoin(self.base_url, endpoint)
         print(f"\n🔍 分析API端点: {endpoint}")
         
         try:
             response = self.session.get(url, timeout=10)
-            print(f"   状态码: {response.status_code}")
+            cached = getattr(response, 'from_cache', False)
+            print(f"   状态码: {response.status_code}{' (本地缓存)' if cached else ''}")
             print(f"   Content-Type: {response.headers.get('Content-Type', 'unknown')}")
             
+            found = False
             if response.status_code == 200:
                 try:
                     # 尝试解析JSON
                     data = response.json()
-                    print(f"   JSON响应: {json.dumps(data, ensure_ascii=False, indent=2)[:500]}...")
+                    print(f"   JSON响应: {preview_text(response.content, 500)}")
                     
                     # 查找可能的视频链接
-                    self.find_video_links(data, endpoint)
+                    found = self.find_video_links(data, endpoint)
                     
                 except json.JSONDecodeError:
                     # 如果不是JSON，显示文本内容
@@ -51,17 +100,21 @@ class MetasoAPIAnalyzer:
                     
             else:
                 print(f"   错误: {response.status_code}")
+            
+            return {
+                'status_code': response.status_code,
+                'latency': response.elapsed.total_seconds(),
+                'found': found,
+                'cached': cached,
+            }
                 
         except Exception as e:
             print(f"   异常: {str(e)}")
+            return None
     
     def find_video_links(self, data, endpoint):
-        """在JSON数据中查找视频链接"""
-        video_patterns = [
-            r'https?://[^\s"]+\.(?:mp4|avi|mov|wmv|flv|webm|m4v)',
-            r'[^\s"]*\.(?:mp4|avi|mov|wmv|flv|webm|m4v)',
-            r'https?://[^\s"]+/(?:video|stream|media|download)',
-        ]
+        """在JSON数据中查找视频链接，返回是否发现"""
+        found = []
         
         def search_in_value(obj, path=""):
             if isinstance(obj, dict):
@@ -79,13 +132,14 @@ class MetasoAPIAnalyzer:
                     search_in_value(item, f"{path}[{i}]")
                     
             elif isinstance(obj, str):
-                # 检查是否包含视频相关的URL
-                for pattern in video_patterns:
-                    matches = re.findall(pattern, obj, re.IGNORECASE)
-                    if matches:
-                        print(f"   🎬 发现视频链接 {path}: {matches}")
+                # 检查是否包含视频相关的URL（单次扫描）
+                matches = [m.value for m in scan_page(obj, kinds=('api', 'media', 'link'))]
+                if matches:
+                    print(f"   🎬 发现视频链接 {path}: {matches}")
+                    found.extend(matches)
         
         search_in_value(data)
+        return bool(found)
     
     def run_analysis(self):
         """运行完整分析"""
@@ -94,41 +148,24 @@ class MetasoAPIAnalyzer:
         print(f"📋 分析文件ID: {self.file_id}")
         print(f"📋 分析章节ID: {self.chapter_id}")
         
-        # 要分析的API端点列表
-        api_endpoints = [
-            f"/api/file/{self.file_id}",
-            f"/api/file/{self.file_id}/download",
-            f"/api/file/{self.file_id}/video",
-            f"/api/file/{self.file_id}/stream",
-            f"/api/file/{self.file_id}/media",
-            f"/api/file/{self.file_id}/play",
-            f"/api/file/{self.file_id}/export",
-            f"/api/file/{self.file_id}/export/video",
-            f"/api/file/{self.file_id}/generate/video",
-            f"/api/chapter/{self.chapter_id}",
-            f"/api/chapter/{self.chapter_id}/video",
-            f"/api/chapter/{self.chapter_id}/stream",
-            f"/api/chapter/{self.chapter_id}/export",
-            f"/api/video/{self.file_id}",
-            f"/api/media/{self.file_id}",
-            f"/api/stream/{self.file_id}",
-            f"/api/courseware/{self.file_id}",
-            f"/api/courseware/{self.file_id}/video",
-            f"/api/courseware/{self.file_id}/export",
-            # 新增一些可能的端点
-            f"/api/ppt/{self.file_id}/video/url",
-            f"/api/file/{self.file_id}/video/url",
-            f"/api/chapter/{self.chapter_id}/video/url",
-            f"/api/export/{self.file_id}/video",
-            f"/api/generate/{self.file_id}/video",
-        ]
+        # 按历史统计排序：收益高的端点先分析
+        templates = self.registry.order(self.REGISTRY_TYPE, self.API_ENDPOINT_TEMPLATES)
         
-        for endpoint in api_endpoints:
-            self.analyze_api_endpoint(endpoint)
+        for template in templates:
+            endpoint = template.format(file_id=self.file_id, chapter_id=self.chapter_id)
+            result = self.analyze_api_endpoint(endpoint)
+            # 本地缓存的结果没有真实耗时，不计入统计
+            if result and not result['cached']:
+                self.registry.record(self.REGISTRY_TYPE, template, result['status_code'],
+                                     result['latency'], result['found'])
+        self.registry.flush()
         
+        print("\n" + "="*80)
+        print(f"💾 HTTP缓存: 本地命中 {self.http_cache.hits}，304重新验证 {self.http_cache.revalidated}")
+        self.registry.print_stats(self.REGISTRY_TYPE)
         print("\n" + "="*80)
         print("✅ 分析完成")
 
 if __name__ == "__main__":
-    analyzer = MetasoAPIAnalyzer()
+    analyzer = MetasoAPIAnalyzer(http2='--http2' in sys.argv[1:])
     analyzer.run_analysis()
\ No newline at end of file
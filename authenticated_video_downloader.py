@@ -5,21 +5,35 @@ Metaso认证视频下载器
 使用浏览器cookies进行认证下载
 """
 
-import requests
-import json
 import os
 from urllib.parse import urljoin
+from http_session import create_session
+from http_cache import enable_http_cache
+from credential_store import CredentialStore, login_state, parse_cookie_string
+from segmented_downloader import SegmentedDownloader
+from endpoint_prober import EndpointProber
+from endpoint_cache import EndpointCache, NegativeCache
+from endpoint_registry import EndpointRegistry
+from singleflight import SingleFlight, request_key
 
 class AuthenticatedVideoDownloader:
+    # 可能的视频端点模板
+    VIDEO_ENDPOINT_TEMPLATES = [
+        "/api/ppt/{file_id}/video/url",
+        "/api/chapter/{chapter_id}/video/url",
+        "/api/export/{file_id}/video",
+        "/api/generate/{file_id}/video",
+        "/api/file/{file_id}/video/download",
+        "/api/courseware/{file_id}/video/export",
+        "/api/file/{file_id}/export/video",
+        "/api/chapter/{chapter_id}/export/video",
+    ]
+    
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Referer': 'https://metaso.cn/',
-            'Origin': 'https://metaso.cn'
-        })
+        self.session = create_session('api')
+        
+        # 元数据响应的磁盘缓存，重复运行时通过304重新验证
+        self.http_cache = enable_http_cache(self.session)
         
         # 从URL中提取的参数
         self.file_id = "8651522172447916032"
@@ -30,6 +44,22 @@ class AuthenticatedVideoDownloader:
         self.download_dir = "downloads"
         if not os.path.exists(self.download_dir):
             os.makedirs(self.download_dir)
+        
+        # 保存的Cookie，仍然有效时不再要求粘贴
+        self.credentials = CredentialStore(profile='authenticated_video_downloader')
+        self.cookie_string = None
+        
+        # 分段并发下载引擎
+        self.downloader = SegmentedDownloader(self.session)
+        
+        # 同时进行的相同请求（下载权限检查、端点探测）只发一次，共享解析结果
+        self.flights = SingleFlight()
+        
+        # 并发端点探测器：优先尝试上次成功的端点模板，其余按历史统计排序，
+        # 跳过近期返回401/403/404的端点
+        self.prober = EndpointProber(self.session, cache=EndpointCache(),
+                                     registry=EndpointRegistry(), negative_cache=NegativeCache(),
+                                     flights=self.flights)
     
     def set_cookies_from_browser(self):
         """设置从浏览器获取的cookies"""
@@ -44,17 +74,12 @@ class AuthenticatedVideoDownloader:
         cookie_string = input("\n请输入Cookie字符串: ").strip()
         
         if cookie_string:
-            # 解析cookie字符串
-            cookies = {}
-            for item in cookie_string.split(';'):
-                if '=' in item:
-                    key, value = item.strip().split('=', 1)
-                    cookies[key] = value
-            
-            # 设置cookies
-            for key, value in cookies.items():
-                self.session.cookies.set(key, value)
+            # 解析cookie字符串并设置到会话
+            cookies = parse_cookie_string(cookie_string)
+            for cookie in cookies:
+                self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path='/')
             
+            self.cookie_string = cookie_string
             print(f"✅ 已设置 {len(cookies)} 个cookies")
             return True
         else:
@@ -62,7 +87,12 @@ class AuthenticatedVideoDownloader:
             return False
     
     def test_authentication(self):
-        """测试认证状态"""
+        """
+        测试认证状态
+        
+        Returns:
+            True表示有下载权限，False表示明确未登录或没有权限，None表示无法判断（网络错误、5xx等）
+        """
         print("\n🔐 测试认证状态...")
         
         # 测试下载权限
@@ -70,104 +100,65 @@ class AuthenticatedVideoDownloader:
         url = urljoin(self.base_url, download_url)
         
         try:
-            response = self.session.get(url, timeout=10)
-            data = response.json()
-            
-            if data.get('errCode') == -1 and '权限' in data.get('errMsg', ''):
-                print("❌ 认证失败，仍然没有权限")
-                return False
-            elif data.get('errCode') == 0 or 'url' in data:
-                print("✅ 认证成功，有下载权限")
-                return True
-            else:
-                print(f"⚠️ 未知状态: {data}")
-                return False
-                
+            # no-store：认证结果必须来自服务器，不能用磁盘缓存中的旧响应
+            response = self.flights.do(request_key(self.session, url),
+                                       lambda: self.session.get(url, headers={'Cache-Control': 'no-store'},
+                                                                timeout=10))
         except Exception as e:
             print(f"❌ 测试认证时出错: {str(e)}")
-            return False
+            return None
+        
+        state = login_state(response)
+        if state:
+            print("✅ 认证成功，有下载权限")
+        elif state is False:
+            print("❌ 认证失败，仍然没有权限")
+        else:
+            print(f"⚠️ 无法确认认证状态: HTTP {response.status_code} {response.text[:200]}")
+        return state
     
     def try_video_endpoints(self):
         """尝试各种视频端点"""
         print("\n🎬 尝试获取视频下载链接...")
         
-        # 可能的视频端点
-        video_endpoints = [
-            f"/api/ppt/{self.file_id}/video/url",
-            f"/api/chapter/{self.chapter_id}/video/url", 
-            f"/api/export/{self.file_id}/video",
-            f"/api/generate/{self.file_id}/video",
-            f"/api/file/{self.file_id}/video/download",
-            f"/api/courseware/{self.file_id}/video/export",
-            f"/api/file/{self.file_id}/export/video",
-            f"/api/chapter/{self.chapter_id}/export/video",
-        ]
-        
-        for endpoint in video_endpoints:
-            url = urljoin(self.base_url, endpoint)
-            print(f"\n🔍 尝试: {endpoint}")
-            
-            try:
-                response = self.session.get(url, timeout=10)
-                print(f"   状态码: {response.status_code}")
-                
-                if response.status_code == 200:
-                    try:
-                        data = response.json()
-                        print(f"   响应: {json.dumps(data, ensure_ascii=False, indent=2)[:300]}...")
-                        
-                        # 检查是否有视频URL
-                        if self.extract_video_url(data, endpoint):
-                            return True
-                            
-                    except json.JSONDecodeError:
-                        print(f"   非JSON响应: {response.text[:200]}...")
-                        
-            except Exception as e:
-                print(f"   错误: {str(e)}")
-        
-        return False
-    
-    def extract_video_url(self, data, endpoint):
-        """从响应数据中提取视频URL"""
-        video_url = None
-        
-        # 检查常见的视频URL字段
-        url_fields = ['url', 'videoUrl', 'downloadUrl', 'streamUrl', 'playUrl', 'mediaUrl']
-        
-        def find_url_in_data(obj, path=""):
-            nonlocal video_url
-            
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    if key.lower() in [f.lower() for f in url_fields]:
-                        if isinstance(value, str) and ('http' in value or value.startswith('/')):
-                            print(f"   🎯 发现视频URL字段 {path}.{key}: {value}")
-                            video_url = value
-                            return True
-                    
-                    if find_url_in_data(value, f"{path}.{key}" if path else key):
-                        return True
-                        
-            elif isinstance(obj, list):
-                for i, item in enumerate(obj):
-                    if find_url_in_data(item, f"{path}[{i}]"):
-                        return True
-                        
-            elif isinstance(obj, str):
-                # 检查是否是视频文件URL
-                if any(ext in obj.lower() for ext in ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm']):
-                    print(f"   🎬 发现视频文件URL {path}: {obj}")
-                    video_url = obj
+        # 并发探测，按返回顺序依次尝试下载，成功后取消其余请求
+        results = self.prober.probe_templates(
+            'chapter', self.VIDEO_ENDPOINT_TEMPLATES, self.classify_endpoint_response,
+            base_url=self.base_url, file_id=self.file_id, chapter_id=self.chapter_id)
+        try:
+            for result in results:
+                if self.download_video(result['url'], result['endpoint']):
                     return True
-                    
-            return False
-        
-        if find_url_in_data(data):
-            return self.download_video(video_url, endpoint)
+        finally:
+            results.close()
         
         return False
     
+    def classify_endpoint_response(self, url, response):
+        """从端点响应中查找视频URL"""
+        endpoint = url.replace(self.base_url, '', 1)
+        print(f"\n🔍 {endpoint} 状态码: {response.status_code}")
+        
+        if response.status_code not in (200, 206):
+            return None
+        
+        if response.kind != 'json':
+            print(f"   非JSON响应: {response.head[:200].decode('utf-8', errors='replace')}...")
+            return None
+        
+        print(f"   响应: {response.preview(300)}")
+        
+        scan = response.scan_video_urls()
+        if scan['error']:
+            print("   JSON解析失败")
+            return None
+        
+        best = scan['best']
+        if best:
+            print(f"   🎯 发现视频URL字段 {best['path']}: {best['url']} (置信度 {best['score']:.2f})")
+            return {'url': best['url'], 'endpoint': endpoint}
+        return None
+    
     def download_video(self, video_url, source_endpoint):
         """下载视频文件"""
         print(f"\n📥 开始下载视频: {video_url}")
@@ -177,16 +168,17 @@ class AuthenticatedVideoDownloader:
             video_url = urljoin(self.base_url, video_url)
         
         try:
-            # 获取文件信息
-            response = self.session.head(video_url, timeout=10)
+            # 获取文件信息（同时探测是否支持分段下载）
+            info = self.downloader.probe(video_url)
             
-            if response.status_code != 200:
-                print(f"❌ 无法访问视频URL，状态码: {response.status_code}")
+            if info['status_code'] not in (200, 206):
+                print(f"❌ 无法访问视频URL，状态码: {info['status_code']}")
+                self.downloader.release(info)
                 return False
             
             # 获取文件大小
-            file_size = int(response.headers.get('Content-Length', 0))
-            content_type = response.headers.get('Content-Type', '')
+            file_size = info['total_size']
+            content_type = info['content_type']
             
             print(f"   文件大小: {file_size / 1024 / 1024:.2f} MB")
             print(f"   内容类型: {content_type}")
@@ -198,26 +190,12 @@ class AuthenticatedVideoDownloader:
             # 下载文件
             print(f"   保存到: {filepath}")
             
-            response = self.session.get(video_url, stream=True, timeout=30)
-            
-            if response.status_code == 200:
-                with open(filepath, 'wb') as f:
-                    downloaded = 0
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            
-                            # 显示进度
-                            if file_size > 0:
-                                progress = (downloaded / file_size) * 100
-                                print(f"\r   下载进度: {progress:.1f}%", end='', flush=True)
-                
-                print(f"\n✅ 视频下载成功: {filepath}")
+            if self.downloader.download(video_url, filepath, info=info):
+                print(f"✅ 视频下载成功: {filepath}")
                 print(f"   来源端点: {source_endpoint}")
                 return True
             else:
-                print(f"❌ 下载失败，状态码: {response.status_code}")
+                print(f"❌ 下载失败: {filepath}")
                 return False
                 
         except Exception as e:
@@ -231,15 +209,20 @@ class AuthenticatedVideoDownloader:
         print(f"📋 文件ID: {self.file_id}")
         print(f"📋 章节ID: {self.chapter_id}")
         
-        # 设置cookies
-        if not self.set_cookies_from_browser():
-            print("❌ 无法继续，需要有效的cookies")
-            return False
-        
-        # 测试认证
-        if not self.test_authentication():
-            print("❌ 认证失败，请检查cookies是否正确")
-            return False
+        # 保存的cookies仍然有效时跳过输入（验证即认证测试）
+        if self.credentials.restore(self.session, lambda session: self.test_authentication()):
+            print("✅ 使用已保存的cookies")
+        else:
+            # 设置cookies
+            if not self.set_cookies_from_browser():
+                print("❌ 无法继续，需要有效的cookies")
+                return False
+            
+            # 测试认证
+            if not self.test_authentication():
+                print("❌ 认证失败，请检查cookies是否正确")
+                return False
+            self.credentials.save_cookie_string(self.cookie_string)
         
         # 尝试下载视频
         if self.try_video_endpoints():
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio批量下载引擎
+把MetasoVideoDownloader.download_from_url拆成 解析 -> 探测 -> 下载 三个阶段，
+每个阶段用独立的信号量限制并发，所有任务共享同一个会话的连接池，
+一个进程内可以同时处理成百上千个书架条目
+
+现有下载逻辑基于阻塞的requests，这里由asyncio负责调度、限流和取消，
+实际请求放到共享线程池中执行；取消时通知下载引擎在下一个数据块处停止并保存续传进度
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from http_session import resize_pool
+
+
+class AsyncBatchDownloader:
+    """基于asyncio的批量视频下载调度器"""
+
+    def __init__(self, downloader, resolve_concurrency=32, probe_concurrency=64, download_concurrency=8):
+        """
+        初始化批量下载器
+
+        Args:
+            downloader: MetasoVideoDownloader实例，所有任务共享它的会话
+            resolve_concurrency: 同时解析的页面数
+            probe_concurrency: 同时探测API端点的条目数
+            download_concurrency: 同时下载的视频数
+        """
+        self.downloader = downloader
+        self.resolve_limit = asyncio.Semaphore(resolve_concurrency)
+        self.probe_limit = asyncio.Semaphore(probe_concurrency)
+        self.download_limit = asyncio.Semaphore(download_concurrency)
+        # 目标文件相同的下载（重复的URL、同名文件）依次进行，不同时写同一个 .part 文件
+        self._file_locks = {}
+
+        workers = resolve_concurrency + probe_concurrency + download_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='metaso')
+
+        # 连接池大小与并发数匹配，避免请求排队或频繁重建连接
+        resize_pool(downloader.session, workers * downloader.downloader.segments)
+
+        # 取消信号同时通知正在线程中执行的下载
+        self.cancel_event = threading.Event()
+        downloader.downloader.cancel_event = self.cancel_event
+
+    async def _run(self, limit, func, *args):
+        """在信号量限制下把阻塞调用放到线程池执行"""
+        async with limit:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    async def process(self, url):
+        """处理单个URL：解析、探测、下载"""
+        result = {'url': url, 'success': False, 'stage': 'resolve'}
+
+        resolved = await self._run(self.resolve_limit, self.downloader.resolve, url)
+        if not resolved:
+            return result
+
+        file_info = resolved['file_info']
+        result['file_id'] = file_info['file_id']
+        result['stage'] = 'probe'
+        endpoints = await self._run(self.probe_limit, self.downloader.try_video_api_endpoints, file_info)
+        if not endpoints:
+            return result
+
+        result['stage'] = 'download'
+        filename = self.downloader.video_filename(file_info)
+        async with self._file_locks.setdefault(filename, asyncio.Lock()):
+            result['success'] = await self._run(
+                self.download_limit, self.downloader.download_endpoints, file_info, endpoints)
+        return result
+
+    async def run(self, urls):
+        """
+        并发处理一批URL
+
+        Returns:
+            list: 每个URL的处理结果，顺序与输入一致
+        """
+        tasks = [asyncio.create_task(self.process(url)) for url in urls]
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            self.cancel()
+            for task in tasks:
+                task.cancel()
+            raise
+
+        summary = []
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                print(f"❌ 处理失败: {url[:80]}... ({result})")
+                result = {'url': url, 'success': False, 'stage': 'error', 'error': str(result)}
+            summary.append(result)
+        return summary
+
+    def cancel(self):
+        """取消所有进行中的任务"""
+        self.cancel_event.set()
+
+    def run_batch(self, urls):
+        """同步入口：运行整批任务并打印汇总"""
+        try:
+            results = asyncio.run(self.run(urls))
+        except KeyboardInterrupt:
+            self.cancel()
+            print("\n⚠️ 用户中断，已取消剩余任务（已下载部分可续传）")
+            return []
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+        success = sum(1 for r in results if r['success'])
+        print("\n" + "=" * 80)
+        print(f"📊 批量下载完成: 成功 {success} / {len(results)}")
+        for result in results:
+            if not result['success']:
+                print(f"   ❌ [{result['stage']}] {result['url'][:100]}")
+        return results
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面扫描器性能对比
+对同一份页面文本分别运行原来的多遍正则（find_video_apis的9个 + analyze_page的6个）
+和单次扫描的page_scanner，先确认两者找到的URL一致，再比较耗时
+
+用法:
+    python benchmark_page_scanner.py                 # 使用生成的约4MB模拟SPA脚本
+    python benchmark_page_scanner.py page.html ...   # 使用保存的页面或脚本文件
+"""
+
+import random
+import re
+import sys
+import time
+
+from page_scanner import scan_page
+
+# 原来的正则（用于对比）
+LEGACY_PATTERNS = [
+    r'/api/[^/\s]*/video[^\s"]*',
+    r'/api/[^/\s]*/stream[^\s"]*',
+    r'/api/[^/\s]*/media[^\s"]*',
+    r'/api/[^/\s]*/play[^\s"]*',
+    r'/api/[^/\s]*/export[^\s"]*',
+    r'/api/[^/\s]*/generate[^\s"]*',
+    r'videoUrl.*?(["\'])([^"\']*)\1',
+    r'streamUrl.*?(["\'])([^"\']*)\1',
+    r'downloadUrl.*?(["\'])([^"\']*)\1',
+    r'"(https?://[^"]*\.mp4[^"]*?)"',
+    r'"(https?://[^"]*video[^"]*?)"',
+    r'"(/api/[^"]*video[^"]*?)"',
+    r'videoUrl.*?["\047]([^"\047]*.mp4[^"\047]*)["\047]',
+    r'src.*?["\047]([^"\047]*.mp4[^"\047]*)["\047]',
+    r'url.*?["\047]([^"\047]*.mp4[^"\047]*)["\047]',
+]
+
+
+def legacy_scan(text):
+    """原来的做法：每个正则各扫描一遍全文"""
+    results = []
+    for pattern in LEGACY_PATTERNS:
+        results.extend(re.findall(pattern, text, re.IGNORECASE))
+    return results
+
+
+def legacy_values(results):
+    """
+    原来正则的匹配值（带分组时取最后一个分组）
+
+    videoUrl.*?(["'])([^"']*)\\1 这类模式在 "videoUrl":"..." 写法下会把键名的结束引号
+    当作值的开始，取到 ':' 之类的片段，这些不含'/'的值不参与比较
+    """
+    values = set()
+    for match in results:
+        value = match[-1] if isinstance(match, tuple) else match
+        if '/' in value:
+            values.add(value)
+    return values
+
+
+def compare_matches(legacy_result, scanner_result):
+    """返回原来的正则找到而单次扫描漏掉的URL"""
+    scanner_values = {match.value for match in scanner_result}
+    return sorted(legacy_values(legacy_result) - scanner_values)
+
+
+def generate_bundle(size=4 * 1024 * 1024, seed=42):
+    """生成模拟的压缩SPA脚本，少量夹杂视频相关的片段"""
+    rng = random.Random(seed)
+    filler = [
+        'function(e,t,n){"use strict";var r=n(12),o=n.n(r);',
+        'return e.apply(this,arguments)};',
+        'var i=Object.assign({},t,{className:"slide-page"});',
+        'fetch("/api/file/"+e+"/info").then(function(e){return e.json()});',
+        'e.prototype.render=function(){return o.a.createElement("div",null)};',
+        'url:"https://static-1.metaso.cn/_next/static/css/app.css",',
+    ]
+    hits = [
+        'fetch("/api/ppt/video?id="+e);',
+        'videoUrl:"https://cdn.metaso.cn/v/lesson.mp4",',
+        '"downloadUrl":"/api/file/8654/download",',
+        'src:"https://cdn.metaso.cn/v/intro.m3u8",',
+    ]
+    parts = []
+    total = 0
+    while total < size:
+        part = rng.choice(hits) if rng.random() < 0.002 else rng.choice(filler)
+        parts.append(part)
+        total += len(part)
+    return ''.join(parts)
+
+
+def benchmark(name, text, repeat=3):
+    """对一份文本运行两种扫描并打印结果"""
+    def best_time(func):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func(text)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    legacy_time, legacy_result = best_time(legacy_scan)
+    scanner_time, scanner_result = best_time(scan_page)
+
+    print(f"\n📄 {name} ({len(text) / 1024 / 1024:.1f} MB)")
+    print(f"   多遍正则: {legacy_time * 1000:8.1f} ms  ({len(legacy_result)} 个匹配, "
+          f"{len(legacy_values(legacy_result))} 个不同的URL)")
+    print(f"   单次扫描: {scanner_time * 1000:8.1f} ms  ({len(scanner_result)} 个去重匹配)")
+    
+    missing = compare_matches(legacy_result, scanner_result)
+    if missing:
+        print(f"   ❌ 单次扫描漏掉了 {len(missing)} 个原来能找到的URL，不比较耗时:")
+        for value in missing[:10]:
+            print(f"      {value}")
+        return None
+    print("   ✅ 原来找到的URL单次扫描都能找到")
+    print(f"   加速比: {legacy_time / scanner_time:.1f}x")
+    return legacy_time / scanner_time
+
+
+def main():
+    print("⏱️ 页面扫描器性能对比")
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                benchmark(path, f.read())
+    elif benchmark('模拟SPA脚本', generate_bundle()) is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
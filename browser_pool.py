@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chrome浏览器池
+启动Chrome并完成WebDriver握手每次要几秒，这里预先启动N个浏览器并保持运行，
+每个浏览器使用独立的 --user-data-dir，互不共享cookie和缓存
+
+页面处理时租用一个浏览器，归还时清理cookie、本地存储和多余的标签页；
+使用次数达到上限或内存占用超过阈值的浏览器会被关闭并换成新的
+"""
+
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class PooledBrowser:
+    """池中的一个浏览器实例"""
+
+    def __init__(self, driver, profile_dir):
+        self.driver = driver
+        self.profile_dir = profile_dir
+        self.uses = 0
+        self.created = time.time()
+
+
+class BrowserPool:
+    """预热的Chrome实例池"""
+
+    def __init__(self, size=2, options_factory=None, headless=True, max_uses=20, max_memory_mb=1024,
+                 chromedriver_path=None):
+        """
+        初始化浏览器池
+
+        Args:
+            size: 最多同时存在的浏览器数
+            options_factory: 无参数函数，返回调用方配置好的Options（下载目录、UA等）；
+                池会再加上独立的 --user-data-dir
+            headless: 是否以无头模式启动
+            max_uses: 每个浏览器最多被租用的次数，达到后关闭重建
+            max_memory_mb: 浏览器进程（含子进程）内存超过该值（MB）时关闭重建
+            chromedriver_path: ChromeDriver路径，为None时使用系统PATH中的
+        """
+        self.size = size
+        self.options_factory = options_factory or Options
+        self.headless = headless
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.chromedriver_path = chromedriver_path
+
+        self._condition = threading.Condition()
+        self._idle = []
+        self._leased = {}
+        # 正在启动中的浏览器数
+        self._starting = 0
+        self._closed = False
+
+    def _launch(self):
+        """启动一个使用独立配置目录的Chrome"""
+        profile_dir = tempfile.mkdtemp(prefix='metaso_chrome_')
+        options = self.options_factory()
+        options.add_argument(f"--user-data-dir={profile_dir}")
+        if self.headless and not any(a.startswith('--headless') for a in options.arguments):
+            options.add_argument("--headless=new")
+
+        try:
+            if self.chromedriver_path:
+                driver = webdriver.Chrome(service=Service(self.chromedriver_path), options=options)
+            else:
+                driver = webdriver.Chrome(options=options)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        return PooledBrowser(driver, profile_dir)
+
+    def warm(self, count=None):
+        """并行预先启动浏览器，返回成功启动的数量"""
+        with self._condition:
+            count = min(count or self.size, self.size - len(self._idle) - len(self._leased) - self._starting)
+            self._starting += max(0, count)
+        if count <= 0:
+            return 0
+
+        started = []
+
+        def start():
+            try:
+                started.append(self._launch())
+            except Exception as e:
+                print(f"⚠️ 预热浏览器失败: {e}")
+
+        threads = [threading.Thread(target=start) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with self._condition:
+            self._starting -= count
+            self._idle.extend(started)
+            self._condition.notify_all()
+        print(f"🔥 已预热 {len(started)} 个浏览器")
+        return len(started)
+
+    def acquire(self, timeout=None):
+        """
+        租用一个浏览器，没有空闲且已达上限时等待
+
+        Returns:
+            WebDriver
+
+        Raises:
+            TimeoutError: 等待超时
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("浏览器池已关闭")
+                if self._idle:
+                    browser = self._idle.pop()
+                    break
+                if len(self._leased) + self._starting < self.size:
+                    self._starting += 1
+                    browser = None
+                    break
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("等待空闲浏览器超时")
+                self._condition.wait(remaining)
+
+        if browser is None:
+            try:
+                browser = self._launch()
+            finally:
+                with self._condition:
+                    self._starting -= 1
+                    self._condition.notify_all()
+
+        browser.uses += 1
+        with self._condition:
+            self._leased[id(browser.driver)] = browser
+        return browser.driver
+
+    def release(self, driver):
+        """归还浏览器：清理状态后放回池中，需要回收时关闭"""
+        with self._condition:
+            browser = self._leased.pop(id(driver), None)
+        if browser is None:
+            return
+
+        reason = self._recycle_reason(browser)
+        if not reason:
+            try:
+                self.reset(driver)
+            except Exception as e:
+                reason = f"清理失败: {e}"
+
+        if reason:
+            print(f"♻️ 回收浏览器（{reason}）")
+            self._destroy(browser)
+            browser = None
+
+        with self._condition:
+            if browser is not None and not self._closed:
+                self._idle.append(browser)
+            elif browser is not None:
+                self._destroy(browser)
+            self._condition.notify_all()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """with pool.lease() as driver: 自动归还的租用方式"""
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def _recycle_reason(self, browser):
+        """需要回收时返回原因，否则返回None"""
+        if browser.uses >= self.max_uses:
+            return f"已使用 {browser.uses} 次"
+        memory = self.memory_mb(browser.driver)
+        if memory is not None and memory > self.max_memory_mb:
+            return f"内存 {memory:.0f} MB"
+        return None
+
+    @staticmethod
+    def memory_mb(driver):
+        """
+        浏览器占用的内存（MB）
+
+        安装了psutil时统计chromedriver及其所有子进程（Chrome主进程、渲染进程）的RSS，
+        否则用CDP读取当前页面的JS堆大小；都无法获取时返回None
+        """
+        if psutil is not None:
+            try:
+                process = psutil.Process(driver.service.process.pid)
+                processes = [process] + process.children(recursive=True)
+                total = 0
+                for p in processes:
+                    try:
+                        total += p.memory_info().rss
+                    except psutil.Error:
+                        pass
+                return total / 1024 / 1024
+            except (AttributeError, psutil.Error):
+                pass
+        try:
+            driver.execute_cdp_cmd('Performance.enable', {})
+            metrics = driver.execute_cdp_cmd('Performance.getMetrics', {})['metrics']
+            heap = next((m['value'] for m in metrics if m['name'] == 'JSHeapTotalSize'), None)
+            return heap / 1024 / 1024 if heap is not None else None
+        except Exception:
+            return None
+
+    @staticmethod
+    def reset(driver):
+        """清理浏览器状态：多余标签页、cookie、缓存和当前站点的存储"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+
+        parsed = urlparse(driver.current_url)
+        if parsed.scheme in ('http', 'https'):
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+                'origin': f"{parsed.scheme}://{parsed.netloc}",
+                'storageTypes': 'all',
+            })
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+        driver.delete_all_cookies()
+        driver.get('about:blank')
+
+    @staticmethod
+    def _destroy(browser):
+        """关闭浏览器并删除配置目录"""
+        try:
+            browser.driver.quit()
+        except Exception:
+            pass
+        shutil.rmtree(browser.profile_dir, ignore_errors=True)
+
+    def stats(self):
+        """当前空闲和租用中的浏览器数"""
+        with self._condition:
+            return {'idle': len(self._idle), 'leased': len(self._leased), 'starting': self._starting}
+
+    def close(self):
+        """关闭池中所有浏览器（租用中的浏览器在归还时关闭）"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for browser in idle:
+            self._destroy(browser)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览器等待工具
+用条件等待代替固定的time.sleep：每个等待都有截止时间，条件满足时立即返回
+
+- 页面加载：document.readyState
+- 网络空闲：根据性能日志中的CDP网络事件跟踪进行中的请求
+- 指定请求完成：某个URL的响应到达
+- 地址变化、新下载文件出现、浏览器窗口被关闭
+"""
+
+import json
+import re
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# 条件检查间隔（秒）
+POLL_INTERVAL = 0.1
+
+# 性能日志中需要处理的网络事件
+_TRACKED_EVENTS = {
+    'Network.requestWillBeSent',
+    'Network.responseReceived',
+    'Network.loadingFinished',
+    'Network.loadingFailed',
+}
+_METHOD_RE = re.compile(r'"method"\s*:\s*"([\w.]+)"')
+_REQUEST_ID_RE = re.compile(r'"requestId"\s*:\s*"([^"]+)"')
+
+
+def wait_until(condition, timeout, interval=POLL_INTERVAL):
+    """
+    反复检查条件直到满足或超时
+
+    Args:
+        condition: 无参数函数，返回真值表示条件满足
+        timeout: 最长等待时间（秒）
+        interval: 检查间隔（秒）
+
+    Returns:
+        条件满足时condition的返回值，超时返回None
+    """
+    deadline = time.time() + timeout
+    while True:
+        result = condition()
+        if result:
+            return result
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+
+
+def wait_for_page_load(driver, timeout=15):
+    """等待document.readyState变为complete，返回是否在超时前完成"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(
+            lambda d: d.execute_script("return document.readyState") == "complete")
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_url_change(driver, old_url, timeout=10):
+    """等待页面地址离开old_url，返回新地址，超时返回None"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(lambda d: d.current_url != old_url)
+        return driver.current_url
+    except TimeoutException:
+        return None
+
+
+def wait_for_new_file(directory, initial_files, timeout=10):
+    """
+    等待下载目录中出现新文件（包括Chrome下载中的.crdownload文件）
+
+    Args:
+        directory: 下载目录（pathlib.Path）
+        initial_files: 操作之前目录中的文件集合
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        list: 新出现的文件，超时为空列表
+    """
+    new_files = wait_until(lambda: list(set(directory.glob("*")) - initial_files), timeout)
+    return new_files or []
+
+
+def wait_for_window_closed(driver, timeout):
+    """等待用户关闭浏览器窗口，返回是否在超时前关闭"""
+    def closed():
+        try:
+            return not driver.window_handles
+        except WebDriverException:
+            return True
+
+    return bool(wait_until(closed, timeout, interval=0.5))
+
+
+class NetworkActivity:
+    """
+    从性能日志跟踪页面的网络请求（需要开启goog:loggingPrefs性能日志）
+
+    繁忙的页面每秒会产生大量日志，这里先用正则从原始字符串取出事件名和requestId，
+    原始字符串中包含关键词的 Network.responseReceived 才做完整的JSON解析，再按URL和MIME类型筛选
+    """
+
+    def __init__(self, driver, response_keywords=None):
+        """
+        Args:
+            driver: Chrome WebDriver
+            response_keywords: 只记录URL或MIME类型包含这些小写子串的响应，为None时记录所有响应
+        """
+        self.driver = driver
+        self.response_keywords = response_keywords
+        # 进行中请求的requestId
+        self.in_flight = set()
+        # 已收到的响应：{'url', 'status', 'mime_type', 'content_type', 'request_id'}
+        self.responses = []
+        self.last_activity = time.time()
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """读取新的性能日志并更新请求状态，返回新读取的日志数"""
+        try:
+            logs = self.driver.get_log('performance')
+        except WebDriverException:
+            return 0
+        self.process(logs)
+        return len(logs)
+
+    def process(self, logs):
+        """处理一批性能日志"""
+        for entry in logs:
+            raw = entry['message']
+            match = _METHOD_RE.search(raw)
+            if not match or match.group(1) not in _TRACKED_EVENTS:
+                continue
+            method = match.group(1)
+
+            if method == 'Network.responseReceived':
+                keywords = self.response_keywords
+                if keywords is not None:
+                    # 原始字符串中没有关键词时URL和MIME类型也不会有，不必解析JSON
+                    lowered = raw.lower()
+                    if not any(keyword in lowered for keyword in keywords):
+                        continue
+                params = json.loads(raw)['message'].get('params', {})
+                response = params.get('response', {})
+                if keywords is not None:
+                    # 响应头（如CSP的media-src）中的关键词不算
+                    target = f"{response.get('url', '')} {response.get('mimeType', '')}".lower()
+                    if not any(keyword in target for keyword in keywords):
+                        continue
+                headers = {k.lower(): v for k, v in response.get('headers', {}).items()}
+                self._add_response({
+                    'url': response.get('url', ''),
+                    'status': response.get('status'),
+                    'mime_type': response.get('mimeType', ''),
+                    'content_type': headers.get('content-type', ''),
+                    'request_id': params.get('requestId'),
+                })
+                continue
+
+            request_id = _REQUEST_ID_RE.search(raw)
+            request_id = request_id.group(1) if request_id else None
+            with self._lock:
+                if method == 'Network.requestWillBeSent':
+                    self.in_flight.add(request_id)
+                else:
+                    self.in_flight.discard(request_id)
+                self.last_activity = time.time()
+
+    def _add_response(self, response):
+        """记录一个响应"""
+        with self._lock:
+            self.responses.append(response)
+
+    def refresh(self):
+        """等待条件前更新状态"""
+        self.poll()
+
+    def is_idle(self, idle_time=0.5, max_in_flight=0):
+        """进行中的请求不超过max_in_flight，且idle_time秒内没有新的网络活动"""
+        self.refresh()
+        with self._lock:
+            return len(self.in_flight) <= max_in_flight and time.time() - self.last_activity >= idle_time
+
+    def wait_for_idle(self, timeout=10, idle_time=0.5, max_in_flight=2):
+        """
+        等待网络空闲
+
+        默认允许2个请求一直未完成（长轮询、统计上报等）
+
+        Returns:
+            bool: 是否在超时前进入空闲
+        """
+        return bool(wait_until(lambda: self.is_idle(idle_time, max_in_flight), timeout))
+
+    def wait_for_response(self, predicate, timeout=10):
+        """
+        等待满足条件的响应到达
+
+        Args:
+            predicate: predicate(response) -> bool，response为responses中的字典
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            dict: 第一个满足条件的响应，超时返回None
+        """
+        checked = 0
+
+        def arrived():
+            nonlocal checked
+            self.refresh()
+            with self._lock:
+                responses = self.responses[checked:]
+            for response in responses:
+                if predicate(response):
+                    return response
+            checked += len(responses)
+            return None
+
+        return wait_until(arrived, timeout)
+
+    def drain(self):
+        """读取剩余日志，返回之前记录的所有响应并清空"""
+        self.refresh()
+        with self._lock:
+            responses, self.responses = self.responses, []
+        return responses
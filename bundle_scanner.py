@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JS脚本包扫描
+Metaso是单页应用，视频相关的API路径通常写在JavaScript包里而不是HTML外壳中，
+这里从页面中提取 <script src> 地址，在共享会话上并发下载并用页面扫描器查找视频API
+
+扫描结果按 脚本URL / ETag / 内容哈希 缓存在 .metaso_cache/bundles.json：
+文件名带内容哈希的脚本（如 main.3f2a9c1b.js）内容不会变化，命中缓存后不再请求；
+其他脚本带 If-None-Match / If-Modified-Since 请求，返回304时直接使用缓存结果；
+URL变了但内容相同（哈希相同）的脚本也不会重新扫描
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+from endpoint_cache import DEFAULT_CACHE_DIR
+from page_scanner import scan_page
+
+SCRIPT_SRC_PATTERN = re.compile(r'''<script\b[^>]*?\bsrc\s*=\s*["']?([^"'\s>]+)''', re.IGNORECASE)
+
+# 文件名中带内容哈希的脚本，内容不会变化
+IMMUTABLE_BUNDLE_PATTERN = re.compile(r'[.\-_~][0-9a-f]{8,}(?:\.chunk)?\.m?js$', re.IGNORECASE)
+
+
+def extract_script_urls(html, base_url):
+    """提取页面中 <script src> 的绝对地址（保持出现顺序并去重）"""
+    urls = (urljoin(base_url, src) for src in SCRIPT_SRC_PATTERN.findall(html))
+    return list(dict.fromkeys(url for url in urls if url.startswith('http')))
+
+
+def is_immutable_bundle(url):
+    """脚本文件名是否带内容哈希"""
+    return bool(IMMUTABLE_BUNDLE_PATTERN.search(urlparse(url).path))
+
+
+class BundleCache:
+    """持久化的脚本包扫描结果缓存"""
+
+    def __init__(self, path=None, max_entries=500):
+        """
+        初始化缓存
+
+        Args:
+            path: 缓存文件路径，默认 .metaso_cache/bundles.json
+            max_entries: 最多保留的脚本记录数，超出时丢弃最久未使用的
+        """
+        self.path = Path(path) if path else DEFAULT_CACHE_DIR / 'bundles.json'
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self):
+        """读取缓存文件，不存在或损坏时返回空缓存"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data.setdefault('urls', {})
+        data.setdefault('hashes', {})
+        return data
+
+    def _save(self):
+        """原子写入缓存文件（调用方需持有锁）"""
+        urls = self._data['urls']
+        if len(urls) > self.max_entries:
+            keep = sorted(urls, key=lambda u: urls[u]['last_used'], reverse=True)[:self.max_entries]
+            self._data['urls'] = {u: urls[u] for u in keep}
+            used = {entry['sha256'] for entry in self._data['urls'].values()}
+            self._data['hashes'] = {h: m for h, m in self._data['hashes'].items() if h in used}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, url):
+        """返回脚本URL的缓存记录（etag/last_modified/sha256/matches），没有时返回None"""
+        with self._lock:
+            entry = self._data['urls'].get(url)
+            if not entry:
+                return None
+            return dict(entry, matches=self._data['hashes'].get(entry['sha256'], []))
+
+    def by_hash(self, sha256):
+        """返回相同内容的扫描结果，没有时返回None"""
+        with self._lock:
+            return self._data['hashes'].get(sha256)
+
+    def store(self, url, sha256, matches, etag=None, last_modified=None):
+        """记录脚本的验证信息和扫描结果"""
+        with self._lock:
+            self._data['hashes'][sha256] = matches
+            self._data['urls'][url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'sha256': sha256,
+                'last_used': time.time(),
+            }
+            self._save()
+
+    def touch(self, url):
+        """更新脚本的最近使用时间"""
+        with self._lock:
+            entry = self._data['urls'].get(url)
+            if entry:
+                entry['last_used'] = time.time()
+                self._save()
+
+
+class BundleScanner:
+    """并发下载并扫描页面引用的JS脚本包"""
+
+    def __init__(self, session, cache=None, max_workers=8, timeout=30):
+        """
+        初始化扫描器
+
+        Args:
+            session: 共享的requests.Session
+            cache: BundleCache，为None时每次都下载并扫描
+            max_workers: 同时下载的脚本数
+            timeout: 单个请求超时时间（秒）
+        """
+        self.session = session
+        self.cache = cache
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def scan_bundle(self, url):
+        """
+        获取单个脚本的扫描结果
+
+        Returns:
+            list: 脚本中找到的API路径和视频URL赋值
+        """
+        cached = self.cache.lookup(url) if self.cache else None
+        if cached and is_immutable_bundle(url):
+            self.cache.touch(url)
+            return cached['matches']
+
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            self.cache.touch(url)
+            return cached['matches']
+        response.raise_for_status()
+
+        sha256 = hashlib.sha256(response.content).hexdigest()
+        matches = self.cache.by_hash(sha256) if self.cache else None
+        if matches is None:
+            text = response.content.decode(response.encoding or 'utf-8', errors='replace')
+            matches = [match.value for match in scan_page(text, kinds=('api', 'assign'))]
+
+        if self.cache:
+            self.cache.store(url, sha256, matches, response.headers.get('ETag'),
+                             response.headers.get('Last-Modified'))
+        return matches
+
+    def scan(self, script_urls):
+        """
+        并发扫描多个脚本
+
+        Returns:
+            dict: 脚本URL -> 找到的匹配列表（失败的脚本不包含在内）
+        """
+        if not script_urls:
+            return {}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(script_urls))) as executor:
+            futures = {executor.submit(self.scan_bundle, url): url for url in script_urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    print(f"   ⚠️ 脚本扫描失败: {url} ({e})")
+        return results
+
+    def find_video_apis(self, html, base_url):
+        """
+        扫描页面引用的所有脚本
+
+        Returns:
+            list: 脚本中找到的API路径和视频URL（保持脚本顺序并去重）
+        """
+        script_urls = extract_script_urls(html, base_url)
+        if not script_urls:
+            return []
+
+        print(f"   扫描 {len(script_urls)} 个JS脚本包...")
+        results = self.scan(script_urls)
+        found = []
+        for url in script_urls:
+            found.extend(results.get(url, []))
+        return list(dict.fromkeys(found))
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+登录凭据存储
+保存浏览器登录后的cookies（driver.get_cookies()）、手动粘贴的Cookie字符串和uid/sid，
+保留cookie的domain/path/过期时间，存放在 .metaso_cache/credentials.json（仅当前用户可读写）
+
+再次运行时先把保存的凭据加载到会话，用一个请求验证是否仍然有效：
+有效时直接走HTTP请求，不再启动浏览器或要求粘贴Cookie；服务器明确返回未登录时才清除凭据、重新登录，
+网络错误、超时、5xx等无法判断的情况保留凭据
+
+每个工具使用自己的profile，一个工具验证失败不会清除其他工具的凭据
+
+多个进程可能同时读写，文件操作都在文件锁内进行
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+from requests.cookies import create_cookie
+
+from endpoint_cache import DEFAULT_CACHE_DIR
+from file_lock import FileLock
+
+# 手动粘贴的Cookie没有domain信息时使用的域名
+DEFAULT_COOKIE_DOMAIN = '.metaso.cn'
+
+
+def parse_cookie_string(cookie_string, domain=DEFAULT_COOKIE_DOMAIN):
+    """把浏览器开发者工具中复制的Cookie头解析成cookie列表"""
+    cookies = []
+    for item in cookie_string.split(';'):
+        if '=' in item:
+            name, value = item.strip().split('=', 1)
+            cookies.append({'name': name, 'value': value, 'domain': domain, 'path': '/', 'expires': None})
+    return cookies
+
+
+def normalize_browser_cookie(cookie):
+    """把Selenium的cookie字典转换为存储格式"""
+    return {
+        'name': cookie['name'],
+        'value': cookie['value'],
+        'domain': cookie.get('domain') or DEFAULT_COOKIE_DOMAIN,
+        'path': cookie.get('path') or '/',
+        'expires': cookie.get('expiry'),
+        'secure': cookie.get('secure', False),
+        'http_only': cookie.get('httpOnly', False),
+    }
+
+
+# 错误信息中出现这些词时认为是未登录或无权限
+LOGGED_OUT_KEYWORDS = ('登录', '权限', 'login', 'auth')
+
+
+def login_state(response):
+    """
+    根据验证请求的响应判断登录状态
+
+    Metaso的接口未登录或无权限时常以HTTP 200返回errCode，
+    返回200且errCode为0（或直接包含url）时认为登录有效
+
+    Returns:
+        True表示已登录；False表示明确未登录（401/403，或errMsg提示需要登录/没有权限）；
+        None表示无法判断（5xx、限流、非JSON响应等），不应据此清除凭据
+    """
+    if response.status_code in (401, 403):
+        return False
+    if response.status_code != 200:
+        return None
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if data.get('errCode') == 0 or 'url' in data:
+        return True
+    message = str(data.get('errMsg') or data.get('message') or '').lower()
+    if any(keyword in message for keyword in LOGGED_OUT_KEYWORDS):
+        return False
+    return None
+
+
+def check_login(session, url, timeout=10):
+    """
+    用一个请求检查会话是否已登录
+
+    Returns:
+        True/False/None，含义同login_state；请求失败（网络错误、超时）时返回None
+    """
+    try:
+        # no-store：不使用本地HTTP缓存中的旧结果
+        response = session.get(url, headers={'Cache-Control': 'no-store'}, timeout=timeout)
+    except Exception as e:
+        print(f"   ⚠️ 验证登录状态失败: {e}")
+        return None
+    return login_state(response)
+
+
+class CredentialStore:
+    """持久化的登录凭据，按profile分别保存"""
+
+    def __init__(self, path=None, profile='default'):
+        """
+        初始化凭据存储
+
+        Args:
+            path: 存储文件路径，默认 .metaso_cache/credentials.json
+            profile: 默认使用的凭据名称，每个工具使用自己的名称
+        """
+        self.path = Path(path) if path else DEFAULT_CACHE_DIR / 'credentials.json'
+        self.profile = profile
+        self._lock = FileLock(f"{self.path}.lock")
+
+    def _read(self):
+        """读取存储文件，不存在或损坏时返回空数据（调用方需持有锁）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data):
+        """原子写入存储文件，只允许当前用户读写（调用方需持有锁）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _update(self, profile, **fields):
+        """更新profile的字段"""
+        profile = profile or self.profile
+        with self._lock:
+            data = self._read()
+            entry = data.setdefault(profile, {})
+            entry.update(fields)
+            entry['updated'] = time.time()
+            self._write(data)
+
+    def save_browser_cookies(self, cookies, user_agent=None, profile=None):
+        """
+        保存浏览器登录后的cookies
+
+        Args:
+            cookies: driver.get_cookies()的返回值
+            user_agent: 浏览器的User-Agent，部分站点会校验cookie与UA是否匹配
+            profile: 凭据名称，默认使用创建时指定的profile
+        """
+        fields = {'cookies': [normalize_browser_cookie(c) for c in cookies]}
+        if user_agent:
+            fields['user_agent'] = user_agent
+        self._update(profile, **fields)
+        print(f"💾 已保存 {len(cookies)} 个登录cookie")
+
+    def save_cookie_string(self, cookie_string, domain=DEFAULT_COOKIE_DOMAIN, profile=None):
+        """保存手动粘贴的Cookie字符串"""
+        cookies = parse_cookie_string(cookie_string, domain)
+        self._update(profile, cookies=cookies)
+        print(f"💾 已保存 {len(cookies)} 个cookie")
+
+    def save_token(self, uid, sid, profile=None):
+        """保存uid/sid"""
+        self._update(profile, uid=uid, sid=sid)
+
+    def load(self, profile=None):
+        """
+        读取profile的凭据，已过期的cookie会被去掉
+
+        Returns:
+            dict: cookies/uid/sid/user_agent，没有可用凭据时返回None
+        """
+        with self._lock:
+            entry = self._read().get(profile or self.profile)
+        if not entry:
+            return None
+
+        now = time.time()
+        entry = dict(entry)
+        entry['cookies'] = [c for c in entry.get('cookies', []) if not c.get('expires') or c['expires'] > now]
+        if not entry['cookies'] and not (entry.get('uid') and entry.get('sid')):
+            return None
+        return entry
+
+    def token(self, profile=None):
+        """返回保存的 (uid, sid)，没有时返回 (None, None)"""
+        entry = self.load(profile) or {}
+        return entry.get('uid'), entry.get('sid')
+
+    def apply(self, session, entry):
+        """把凭据加载到会话：cookie保留domain/path/过期时间，uid/sid设置为Authorization头"""
+        for cookie in entry.get('cookies', []):
+            session.cookies.set_cookie(create_cookie(
+                cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie.get('path') or '/',
+                expires=int(cookie['expires']) if cookie.get('expires') else None,
+                secure=cookie.get('secure', False)))
+        if entry.get('uid') and entry.get('sid'):
+            session.headers['Authorization'] = f"Bearer {entry['uid']}-{entry['sid']}"
+        if entry.get('user_agent'):
+            session.headers['User-Agent'] = entry['user_agent']
+
+    def restore(self, session, validate=None, profile=None):
+        """
+        加载保存的凭据并验证
+
+        Args:
+            session: 要加载凭据的requests.Session
+            validate: validate(session) -> True/False/None，发一个请求检查登录是否有效（见login_state）；
+                为None时不验证
+            profile: 凭据名称
+
+        Returns:
+            bool: 凭据存在且有效（或暂时无法验证）；明确失效时会从会话和存储中清除
+        """
+        entry = self.load(profile)
+        if not entry:
+            return False
+
+        self.apply(session, entry)
+        state = True if validate is None else validate(session)
+        if state:
+            self._update(profile, validated=time.time())
+            return True
+        if state is None:
+            print("⚠️ 暂时无法验证登录状态，继续使用已保存的凭据")
+            return True
+
+        print("⚠️ 已保存的登录状态已失效，需要重新登录")
+        session.cookies.clear()
+        if entry.get('uid') and entry.get('sid'):
+            session.headers.pop('Authorization', None)
+        self.invalidate(profile)
+        return False
+
+    def invalidate(self, profile=None):
+        """删除profile的凭据"""
+        with self._lock:
+            data = self._read()
+            if data.pop(profile or self.profile, None) is not None:
+                self._write(data)
@@ -4,20 +4,16 @@
 直接访问视频端点尝试下载
 """
 
-import requests
 import json
 from urllib.parse import urljoin
 import os
+from http_session import create_session
+from video_url_extractor import best_video_url
+from streaming_json import preview_text
 
 class DirectVideoDownloader:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Referer': 'https://metaso.cn/'
-        })
+        self.session = create_session('api')
         
         self.file_id = "8651522172447916032"
         self.chapter_id = "8651523279591608320"
@@ -55,7 +51,7 @@ class DirectVideoDownloader:
                 elif 'json' in content_type:
                     try:
                         data = response.json()
-                        print(f"   JSON响应: {json.dumps(data, ensure_ascii=False, indent=2)[:300]}...")
+                        print(f"   JSON响应: {preview_text(response.content, 300)}")
                         
                         # 查找视频链接
                         video_url = self.extract_video_url(data)
@@ -79,32 +75,11 @@ class DirectVideoDownloader:
         
     def extract_video_url(self, data):
         """从JSON数据中提取视频URL"""
-        # 递归搜索可能的视频URL字段
-        def search_video_url(obj, path=""):
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    current_path = f"{path}.{key}" if path else key
-                    
-                    # 检查常见的视频URL字段名
-                    if key.lower() in ['url', 'video_url', 'download_url', 'stream_url', 'media_url', 'src', 'href']:
-                        if isinstance(value, str) and ('http' in value or value.startswith('/')):
-                            print(f"     发现可能的视频URL ({current_path}): {value}")
-                            return value
-                    
-                    # 递归搜索
-                    result = search_video_url(value, current_path)
-                    if result:
-                        return result
-                        
-            elif isinstance(obj, list):
-                for i, item in enumerate(obj):
-                    result = search_video_url(item, f"{path}[{i}]")
-                    if result:
-                        return result
-                        
-            return None
-            
-        return search_video_url(data)
+        best = best_video_url(data)
+        if best:
+            print(f"     发现可能的视频URL ({best['path']}): {best['url']}")
+            return best['url']
+        return None
         
     def download_from_url(self, video_url):
         """从URL下载视频"""
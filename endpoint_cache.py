@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端点模板学习缓存
+按资源类型（如pptx文件、章节）记录哪个URL模板真正返回了可用的视频地址，
+下次运行优先尝试该模板，并跳过连续失败的模板；记录带有效期，缓存的模板失败时立即失效
+
+另有按 (模板, 资源, 认证身份) 记录401/403/404结果的负缓存，
+批量运行时不再反复请求已知不可用的端点
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from file_lock import FileLock
+
+# 本地缓存目录
+DEFAULT_CACHE_DIR = Path('.metaso_cache')
+
+
+class EndpointCache:
+    """
+    持久化的端点模板缓存
+
+    记录只修改内存，flush()时在文件锁内与文件中其他进程的记录合并后写回
+
+    只有说明端点不存在的状态码才计入连续失败：5xx、网络错误、视频尚未生成（200但没有视频地址）
+    都可能是暂时的，不能让模板对所有资源失效
+    """
+
+    # 明确说明端点不存在的状态码
+    MISS_STATUS_CODES = frozenset({404, 405, 410})
+
+    def __init__(self, path=None, ttl=7 * 24 * 3600, dead_ttl=24 * 3600, dead_after=3):
+        """
+        初始化缓存
+
+        Args:
+            path: 缓存文件路径，默认 .metaso_cache/endpoints.json
+            ttl: 成功模板的有效期（秒）
+            dead_ttl: 失效模板被跳过的时长（秒）
+            dead_after: 连续失败多少次后认为模板失效
+        """
+        self.path = Path(path) if path else DEFAULT_CACHE_DIR / 'endpoints.json'
+        self.ttl = ttl
+        self.dead_ttl = dead_ttl
+        self.dead_after = dead_after
+
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{self.path}.lock")
+        # 本进程修改过的 (资源类型, 模板) 和成功模板有变化的资源类型
+        self._dirty_templates = set()
+        self._dirty_winners = set()
+        self._data = self._load()
+
+    def _load(self):
+        """读取缓存文件并去掉过期的记录，不存在或损坏时返回空缓存"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return self._prune(data)
+
+    def _prune(self, data):
+        """去掉过期的成功模板、失效期已过的模板（重新计数）和已恢复为初始状态的模板记录"""
+        now = time.time()
+        for entry in data.values():
+            winner = entry.get('winner')
+            if winner and now - winner['updated'] >= self.ttl:
+                entry['winner'] = None
+            entry['templates'] = {t: stats for t, stats in entry.get('templates', {}).items()
+                                  if stats['dead_until'] > now or (stats['failures'] and not stats['dead_until'])}
+        return {rtype: entry for rtype, entry in data.items() if entry['winner'] or entry['templates']}
+
+    def _save(self):
+        """原子写入缓存文件（调用方需持有锁）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _entry(data, resource_type):
+        return data.setdefault(resource_type, {'winner': None, 'templates': {}})
+
+    def preferred(self, resource_type):
+        """返回该资源类型仍在有效期内的成功模板"""
+        with self._lock:
+            winner = self._data.get(resource_type, {}).get('winner')
+            if winner and time.time() - winner['updated'] < self.ttl:
+                return winner['template']
+            return None
+
+    def is_dead(self, resource_type, template):
+        """模板是否处于失效跳过期"""
+        with self._lock:
+            stats = self._data.get(resource_type, {}).get('templates', {}).get(template)
+            return bool(stats) and stats.get('dead_until', 0) > time.time()
+
+    def plan(self, resource_type, templates):
+        """
+        规划探测顺序
+
+        Returns:
+            tuple: (优先模板或None, 其余未失效模板列表)
+        """
+        preferred = self.preferred(resource_type)
+        if preferred not in templates:
+            preferred = None
+
+        rest = [t for t in templates if t != preferred and not self.is_dead(resource_type, t)]
+        skipped = len(templates) - len(rest) - (1 if preferred else 0)
+        if skipped:
+            print(f"   ⏭️ 跳过 {skipped} 个近期连续失败的端点模板")
+        return preferred, rest
+
+    def record_success(self, resource_type, template):
+        """记录模板返回了可用的视频地址（调用flush()后写入文件）"""
+        with self._lock:
+            entry = self._entry(self._data, resource_type)
+            entry['winner'] = {'template': template, 'updated': time.time()}
+            entry['templates'][template] = {'failures': 0, 'dead_until': 0}
+            self._dirty_winners.add(resource_type)
+            self._dirty_templates.add((resource_type, template))
+
+    def record_failure(self, resource_type, template, status_code):
+        """
+        记录模板未返回可用结果（调用flush()后写入文件）
+
+        状态码说明端点不存在时，缓存的模板立即失效，连续失败达到dead_after次后跳过该模板；
+        其他状态码（5xx、视频尚未生成等）不计入
+        """
+        if status_code not in self.MISS_STATUS_CODES:
+            return
+        with self._lock:
+            entry = self._entry(self._data, resource_type)
+            if entry['winner'] and entry['winner']['template'] == template:
+                entry['winner'] = None
+                self._dirty_winners.add(resource_type)
+
+            stats = entry['templates'].setdefault(template, {'failures': 0, 'dead_until': 0})
+            if stats['dead_until'] and stats['dead_until'] <= time.time():
+                # 失效期已过，重新计数
+                stats['failures'] = 0
+                stats['dead_until'] = 0
+            stats['failures'] += 1
+            if stats['failures'] >= self.dead_after:
+                stats['dead_until'] = time.time() + self.dead_ttl
+            self._dirty_templates.add((resource_type, template))
+
+    def flush(self):
+        """把本进程修改过的记录合并到缓存文件，同时读入其他进程的记录"""
+        with self._file_lock, self._lock:
+            if not self._dirty_templates and not self._dirty_winners:
+                return
+            data = self._load()
+            for resource_type in self._dirty_winners:
+                self._entry(data, resource_type)['winner'] = self._data[resource_type]['winner']
+            for resource_type, template in self._dirty_templates:
+                stats = self._data[resource_type]['templates'][template]
+                self._entry(data, resource_type)['templates'][template] = dict(stats)
+            self._data = self._prune(data)
+            self._dirty_templates = set()
+            self._dirty_winners = set()
+            self._save()
+
+    def close(self):
+        """写入未保存的修改"""
+        self.flush()
+
+
+def auth_identity(session):
+    """
+    根据会话的认证信息生成身份标识
+
+    使用Authorization头和uid/sid cookie的哈希，不在缓存中保存原始凭据；
+    未认证的会话返回 'anonymous'
+    """
+    parts = [session.headers.get('Authorization', '')]
+    for name in ('uid', 'sid'):
+        parts.append(session.cookies.get(name) or '')
+    if not any(parts):
+        return 'anonymous'
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class NegativeCache:
+    """
+    401/403/404端点结果的负缓存
+
+    记录只修改内存，flush()时在文件锁内读取文件、合并本进程的修改、去掉过期记录后写回，
+    同时运行的多个进程不会覆盖彼此的记录
+    """
+
+    def __init__(self, path=None, auth_ttl=10 * 60, not_found_ttl=6 * 3600, max_entries=5000):
+        """
+        初始化负缓存
+
+        Args:
+            path: 缓存文件路径，默认 .metaso_cache/negative.json
+            auth_ttl: 401/403结果的有效期（秒），登录状态可能很快变化，保持较短
+            not_found_ttl: 404结果的有效期（秒）
+            max_entries: 最多保存的记录数，超出时丢弃最先过期的
+        """
+        self.path = Path(path) if path else DEFAULT_CACHE_DIR / 'negative.json'
+        self.ttls = {401: auth_ttl, 403: auth_ttl, 404: not_found_ttl}
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{self.path}.lock")
+        # 本进程尚未写入文件的修改：key -> 记录，None表示删除
+        self._changes = {}
+        self._data = self._load()
+
+    def _load(self):
+        """读取缓存文件并丢弃过期记录"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return self._prune(data)
+
+    def _prune(self, data):
+        """丢弃过期记录，超出上限时保留最晚过期的记录"""
+        now = time.time()
+        data = {key: entry for key, entry in data.items() if entry['expires'] > now}
+        if len(data) > self.max_entries:
+            keep = sorted(data, key=lambda key: data[key]['expires'])[-self.max_entries:]
+            data = {key: data[key] for key in keep}
+        return data
+
+    def _save(self):
+        """原子写入缓存文件（调用方需持有锁）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(template, resource, identity):
+        return f"{identity}|{resource}|{template}"
+
+    def lookup(self, template, resource, identity):
+        """返回仍在有效期内的失败状态码，没有记录时返回None"""
+        with self._lock:
+            entry = self._data.get(self._key(template, resource, identity))
+            if entry and entry['expires'] > time.time():
+                return entry['status']
+            return None
+
+    def record(self, template, resource, identity, status_code):
+        """记录端点结果：401/403/404写入负缓存，其他状态清除旧记录（调用flush()后写入文件）"""
+        key = self._key(template, resource, identity)
+        with self._lock:
+            ttl = self.ttls.get(status_code)
+            if ttl:
+                entry = {'status': status_code, 'expires': time.time() + ttl}
+                self._data[key] = entry
+                self._changes[key] = entry
+            elif self._data.pop(key, None) is not None:
+                self._changes[key] = None
+
+    def flush(self):
+        """把本进程的修改合并到缓存文件，同时读入其他进程的记录"""
+        with self._file_lock, self._lock:
+            if not self._changes:
+                return
+            data = self._load()
+            for key, entry in self._changes.items():
+                if entry is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = entry
+            self._data = self._prune(data)
+            self._changes = {}
+            self._save()
+
+    def close(self):
+        """写入未保存的修改"""
+        self.flush()
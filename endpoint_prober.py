@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发API端点探测器
+同时请求多个候选端点（按主机限制并发数），哪个端点先返回可用结果就先交给调用方，
+调用方拿到满意的结果后其余请求会被取消
+
+每个探测只请求 Range: bytes=0-4095，根据开头字节嗅探内容类型；
+JSON响应按需流式扫描剩余内容，找到可信的视频URL后即停止读取
+
+传入SingleFlight时，多个探测同时请求同一端点（相同认证身份和判断函数）只发一次请求，
+共享判断结果
+"""
+
+import functools
+import json
+import queue
+import threading
+from string import Formatter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from media_sniffer import SNIFF_SIZE, KIND_CONTENT_TYPES, sniff_media_type
+from streaming_json import CONFIDENT_SCORE, scan_video_urls, preview_text
+from endpoint_cache import auth_identity
+from singleflight import request_key
+
+# 探测被取消（而不是端点不可用）的标记，等待中的相同探测需要自己重新请求
+_CANCELLED = object()
+
+
+class ProbeResponse:
+    """
+    探测响应
+
+    提供与requests.Response相近的status_code/headers/json()/text接口，
+    但默认只持有响应开头的字节；调用json()、text或流式扫描时才按需读取剩余内容
+    """
+
+    def __init__(self, session, response, timeout, max_body_size=2 * 1024 * 1024):
+        self.session = session
+        self.response = response
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+
+        self.url = response.url
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.elapsed = response.elapsed.total_seconds()
+
+        self._chunks = response.iter_content(chunk_size=SNIFF_SIZE)
+        self._buffer = bytearray()
+        self._complete = False
+        self._continued = None
+        while len(self._buffer) < SNIFF_SIZE and self._read_chunk():
+            pass
+        self._scan = None
+
+        self.head = bytes(self._buffer[:SNIFF_SIZE])
+        self.kind = sniff_media_type(self.head)
+
+    def _read_chunk(self):
+        """读取下一块数据追加到缓冲区，没有更多数据时返回False"""
+        if self._complete or len(self._buffer) >= self.max_body_size:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._complete = True
+            if self.status_code == 206 and self._continued is None and self._has_more():
+                self._continue()
+                return self._read_chunk()
+            return False
+        self._buffer += chunk
+        return True
+
+    def _has_more(self):
+        """按Range只返回了开头部分时，资源是否还有剩余内容"""
+        content_range = self.headers.get('Content-Range', '')
+        total = content_range.rsplit('/', 1)[-1]
+        return not total.isdigit() or int(total) > len(self._buffer)
+
+    def _continue(self):
+        """请求剩余部分继续读取，服务器忽略Range时跳过已读取的字节"""
+        offset = len(self._buffer)
+        self._continued = self.session.get(self.url, headers={'Range': f'bytes={offset}-'},
+                                           stream=True, timeout=self.timeout)
+        status = self._continued.status_code
+        if status not in (200, 206):
+            return
+
+        def chunks():
+            skip = offset if status == 200 else 0
+            for chunk in self._continued.iter_content(chunk_size=SNIFF_SIZE):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk, skip = chunk[dropped:], skip - dropped
+                if chunk:
+                    yield chunk
+
+        self._chunks = chunks()
+        self._complete = False
+
+    def iter_body(self):
+        """逐块产出响应体（最多max_body_size字节），已读取的部分先产出"""
+        pos = 0
+        while True:
+            if pos < len(self._buffer):
+                chunk = bytes(self._buffer[pos:])
+                pos = len(self._buffer)
+                yield chunk
+            elif not self._read_chunk():
+                return
+
+    def close(self):
+        """关闭探测过程中打开的响应"""
+        self.response.close()
+        if self._continued is not None:
+            self._continued.close()
+
+    @property
+    def content_type(self):
+        """服务器声明的Content-Type，缺失时使用嗅探结果"""
+        return self.headers.get('Content-Type') or KIND_CONTENT_TYPES.get(self.kind, '')
+
+    @property
+    def total_size(self):
+        """资源总大小，优先从Content-Range获取"""
+        content_range = self.headers.get('Content-Range', '')
+        if '/' in content_range:
+            total = content_range.rsplit('/', 1)[-1]
+            if total.isdigit():
+                return int(total)
+        length = self.headers.get('Content-Length', '')
+        return int(length) if length.isdigit() else 0
+
+    @property
+    def content(self):
+        """完整响应体（最多max_body_size字节）"""
+        while self._read_chunk():
+            pass
+        return bytes(self._buffer[:self.max_body_size])
+
+    @property
+    def text(self):
+        """响应体文本"""
+        return self.content.decode(self.response.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        """解析JSON响应体"""
+        return json.loads(self.content)
+
+    def scan_video_urls(self, stop_score=CONFIDENT_SCORE):
+        """
+        流式扫描JSON响应体中的视频URL，找到可信候选后不再读取剩余内容
+
+        Returns:
+            dict: scan_video_urls的结果，重复调用时返回同一结果
+        """
+        if self._scan is None:
+            self._scan = scan_video_urls(self.iter_body(), stop_score)
+        return self._scan
+
+    def preview(self, limit=300):
+        """响应开头部分的文本预览"""
+        return preview_text(self.head, limit, self.response.encoding)
+
+    @property
+    def effective_status(self):
+        """
+        有效状态码
+
+        Metaso的接口常以HTTP 200返回 {"errCode": 401, ...}，
+        已扫描过的JSON响应体中带有401/403/404错误码时以错误码为准
+        """
+        if self._scan is not None:
+            err_code = self._scan['fields'].get('errCode')
+            if err_code in (401, 403, 404):
+                return err_code
+        return self.status_code
+
+
+class EndpointProber:
+    """基于共享会话的并发端点探测器"""
+
+    def __init__(self, session, max_per_host=4, max_workers=16, timeout=10, cache=None, registry=None,
+                 negative_cache=None, flights=None):
+        """
+        初始化探测器
+
+        Args:
+            session: 共享的requests.Session
+            max_per_host: 同一主机同时进行的最大请求数
+            max_workers: 探测线程数上限
+            timeout: 单个请求超时时间（秒）
+            cache: EndpointCache，按模板探测时优先尝试上次成功的模板
+            registry: EndpointRegistry，按模板探测时根据历史统计排序并记录结果
+            negative_cache: NegativeCache，按模板探测时跳过近期返回401/403/404的端点
+            flights: SingleFlight，合并同时进行的相同探测
+        """
+        self.session = session
+        self.max_per_host = max_per_host
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache
+        self.registry = registry
+        self.negative_cache = negative_cache
+        self.flights = flights
+
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+
+    def _host_limit(self, url):
+        """获取URL所在主机的并发信号量"""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_limits[host]
+
+    def _fetch_head(self, url):
+        """只请求响应开头的字节，服务器不接受该Range时退回普通请求"""
+        response = self.session.get(url, headers={'Range': f'bytes=0-{SNIFF_SIZE - 1}'},
+                                    stream=True, timeout=self.timeout)
+        if response.status_code == 416:
+            response.close()
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+        return response
+
+    def _probe(self, url, classify, stop_event):
+        """请求单个端点并交给classify判断，相同探测进行中时共享其结果"""
+        if self.flights is None:
+            result = self._probe_once(url, classify, stop_event)
+        else:
+            # 包装过的classify（如probe_templates中的统计记录）按原函数合并
+            key = request_key(self.session, url) + (getattr(classify, '__wrapped__', classify),)
+            while True:
+                result = self.flights.do(key, lambda: self._probe_once(url, classify, stop_event))
+                # 发起请求的一方被取消时，未取消的等待者自己重新探测
+                if result is not _CANCELLED or stop_event.is_set():
+                    break
+        return None if result is _CANCELLED else result
+
+    def _probe_once(self, url, classify, stop_event):
+        """请求单个端点并交给classify判断，已取消时返回_CANCELLED"""
+        if stop_event.is_set():
+            return _CANCELLED
+
+        with self._host_limit(url):
+            if stop_event.is_set():
+                return _CANCELLED
+            try:
+                response = self._fetch_head(url)
+                probe = ProbeResponse(self.session, response, self.timeout)
+            except Exception as e:
+                print(f"   {url} 请求失败: {e}")
+                return None
+
+        try:
+            if stop_event.is_set():
+                return _CANCELLED
+            return classify(url, probe)
+        except Exception as e:
+            print(f"   {url} 处理响应失败: {e}")
+            return None
+        finally:
+            probe.close()
+
+    def probe_iter(self, urls, classify):
+        """
+        并发探测所有端点，按完成顺序逐个产出可用结果
+
+        Args:
+            urls: 候选端点URL列表，靠前的会先发出请求
+            classify: classify(url, probe_response) -> 结果或None，
+                probe_response为ProbeResponse
+
+        生成器被关闭（调用方break或return）时，未开始的请求会被取消，
+        进行中请求的结果会被丢弃。
+        """
+        if not urls:
+            return
+
+        stop_event = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls)))
+        futures = [executor.submit(self._probe, url, classify, stop_event) for url in urls]
+
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                if result:
+                    yield result
+        finally:
+            stop_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def probe_stream(self, url_source, classify):
+        """
+        边发现边探测：url_source逐个产出URL（如边下载边扫描的页面），
+        每个新URL立即提交探测，按完成顺序逐个产出可用结果
+
+        url_source在后台线程中迭代；生成器被关闭后不再提交新的探测，
+        url_source在产出下一个URL时结束，有close()时由后台线程关闭
+        """
+        stop_event = threading.Event()
+        completed = queue.Queue()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        submitted = []
+        # 提交和关闭线程池互斥，关闭后不会再提交
+        submit_lock = threading.Lock()
+
+        def feed():
+            seen = set()
+            try:
+                for url in url_source:
+                    if stop_event.is_set():
+                        break
+                    if url in seen:
+                        continue
+                    seen.add(url)
+                    with submit_lock:
+                        if stop_event.is_set():
+                            break
+                        future = executor.submit(self._probe, url, classify, stop_event)
+                        submitted.append(future)
+                    future.add_done_callback(completed.put)
+            except Exception as e:
+                print(f"   ❌ 读取候选URL失败: {e}")
+            finally:
+                # None表示不会再有新的探测
+                completed.put(None)
+                # 生成器只能由迭代它的线程关闭
+                close = getattr(url_source, 'close', None)
+                if close:
+                    close()
+
+        feeder = threading.Thread(target=feed, name='probe-feeder', daemon=True)
+        feeder.start()
+
+        feeding = True
+        finished = 0
+        try:
+            while feeding or finished < len(submitted):
+                future = completed.get()
+                if future is None:
+                    feeding = False
+                    continue
+                finished += 1
+                result = None if future.cancelled() else future.result()
+                if result:
+                    yield result
+        finally:
+            with submit_lock:
+                stop_event.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def probe_first(self, urls, classify):
+        """返回第一个可用结果，其余请求立即取消"""
+        results = self.probe_iter(urls, classify)
+        try:
+            return next(results, None)
+        finally:
+            results.close()
+
+    def probe_all(self, urls, classify):
+        """并发探测所有端点，返回全部可用结果（按完成顺序）"""
+        return list(self.probe_iter(urls, classify))
+
+    def probe_templates(self, resource_type, templates, classify, base_url='', **params):
+        """
+        按URL模板探测端点，按完成顺序逐个产出可用结果
+
+        有缓存时先单独探测该资源类型上次成功的模板，未命中再并发探测其余模板，
+        并跳过近期连续失败的模板；有统计时其余模板按历史得分排序；
+        有负缓存时跳过当前资源和认证身份下近期返回401/403/404的模板。
+        每个模板的结果都会写回缓存和统计，生成器结束或被关闭时统一写入文件。
+
+        Args:
+            resource_type: 资源类型，如 'pptx'、'chapter'
+            templates: URL模板列表，如 '/api/file/{file_id}/video'
+            classify: classify(url, probe_response) -> 结果或None
+            base_url: 模板为相对路径时拼接的前缀
+            **params: 填充模板的参数，参数为空的模板会被跳过
+        """
+        def resource(template):
+            return base_url + template.format(**params)
+
+        templates = [t for t in templates if self._params_ready(t, params)]
+        url_templates = {resource(t): t for t in templates}
+        identity = auth_identity(self.session)
+
+        if self.negative_cache:
+            known_bad = [t for t in templates if self.negative_cache.lookup(t, resource(t), identity)]
+            if known_bad:
+                print(f"   ⏭️ 跳过 {len(known_bad)} 个近期返回401/403/404的端点")
+                templates = [t for t in templates if t not in known_bad]
+
+        @functools.wraps(classify)
+        def tracked(url, response):
+            result = classify(url, response)
+            template = url_templates[url]
+            if self.cache:
+                if result:
+                    self.cache.record_success(resource_type, template)
+                else:
+                    self.cache.record_failure(resource_type, template, response.effective_status)
+            if self.registry:
+                self.registry.record(resource_type, template, response.status_code,
+                                     response.elapsed, bool(result))
+            if self.negative_cache:
+                status = 200 if result else response.effective_status
+                self.negative_cache.record(template, url, identity, status)
+            return result
+
+        if self.cache:
+            preferred, rest = self.cache.plan(resource_type, templates)
+        else:
+            preferred, rest = None, templates
+
+        if self.registry:
+            rest = self.registry.order(resource_type, rest)
+
+        try:
+            if preferred:
+                print(f"   ⚡ 优先尝试缓存的端点模板: {preferred}")
+                yield from self.probe_iter([resource(preferred)], tracked)
+
+            yield from self.probe_iter([resource(t) for t in rest], tracked)
+        finally:
+            # 每批探测结束时写入一次文件，而不是每个结果写一次
+            if self.cache:
+                self.cache.flush()
+            if self.registry:
+                self.registry.flush()
+            if self.negative_cache:
+                self.negative_cache.flush()
+
+    @staticmethod
+    def _params_ready(template, params):
+        """模板用到的参数是否都有值"""
+        try:
+            return all(params[name] for name in _template_fields(template))
+        except KeyError:
+            return False
+
+
+def _template_fields(template):
+    """返回模板中的占位符名称"""
+    return [name for _, name, _, _ in Formatter().parse(template) if name]
+
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端点模板统计与自适应排序
+记录每个URL模板的成功率、响应耗时和状态码分布，
+按UCB（上置信界）策略排序：成功率高、响应快的模板排在前面，
+很少尝试的模板保留一定探索机会，持续返回403/404的模板自动降级
+
+记录只修改内存，flush()时在文件锁内把本进程新增的计数累加到文件中，
+同时运行的多个进程的统计不会互相覆盖
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+from endpoint_cache import DEFAULT_CACHE_DIR
+from file_lock import FileLock
+
+
+def _empty_stats():
+    return {'attempts': 0, 'successes': 0, 'total_latency': 0.0, 'status_codes': {}, 'last_used': 0}
+
+
+class EndpointRegistry:
+    """持久化的端点模板统计"""
+
+    def __init__(self, path=None, exploration=0.2, max_age=90 * 24 * 3600):
+        """
+        初始化统计
+
+        Args:
+            path: 统计文件路径，默认 .metaso_cache/endpoint_stats.json
+            exploration: 探索系数，越大越倾向于尝试样本少的模板
+            max_age: 超过该时长（秒）未使用的模板统计会被删除
+        """
+        self.path = Path(path) if path else DEFAULT_CACHE_DIR / 'endpoint_stats.json'
+        self.exploration = exploration
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{self.path}.lock")
+        # 本进程尚未写入文件的增量：(资源类型, 模板) -> 统计
+        self._pending = {}
+        self._data = self._load()
+
+    def _load(self):
+        """读取统计文件并删除长期未使用的模板，不存在或损坏时返回空统计"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        cutoff = time.time() - self.max_age
+        data = {rtype: {t: s for t, s in templates.items() if s.get('last_used', 0) >= cutoff}
+                for rtype, templates in data.items()}
+        return {rtype: templates for rtype, templates in data.items() if templates}
+
+    def _save(self):
+        """原子写入统计文件（调用方需持有锁）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _add(stats, status_code, latency, success, used):
+        """把一次结果累加到统计"""
+        stats['attempts'] += 1
+        stats['successes'] += 1 if success else 0
+        stats['total_latency'] += latency
+        codes = stats['status_codes']
+        codes[str(status_code)] = codes.get(str(status_code), 0) + 1
+        stats['last_used'] = max(stats['last_used'], used)
+
+    def record(self, resource_type, template, status_code, latency, success):
+        """
+        记录一次探测结果
+
+        调用flush()后写入文件
+
+        Args:
+            resource_type: 资源类型
+            template: URL模板
+            status_code: HTTP状态码
+            latency: 响应耗时（秒）
+            success: 是否得到了可用的视频地址
+        """
+        now = time.time()
+        with self._lock:
+            stats = self._data.setdefault(resource_type, {}).setdefault(template, _empty_stats())
+            self._add(stats, status_code, latency, success, now)
+            pending = self._pending.setdefault((resource_type, template), _empty_stats())
+            self._add(pending, status_code, latency, success, now)
+
+    def flush(self):
+        """把本进程新增的计数累加到统计文件，同时读入其他进程的统计"""
+        with self._file_lock, self._lock:
+            if not self._pending:
+                return
+            data = self._load()
+            for (resource_type, template), pending in self._pending.items():
+                stats = data.setdefault(resource_type, {}).setdefault(template, _empty_stats())
+                stats['attempts'] += pending['attempts']
+                stats['successes'] += pending['successes']
+                stats['total_latency'] += pending['total_latency']
+                for code, count in pending['status_codes'].items():
+                    stats['status_codes'][code] = stats['status_codes'].get(code, 0) + count
+                stats['last_used'] = max(stats['last_used'], pending['last_used'])
+            self._data = data
+            self._pending = {}
+            self._save()
+
+    def close(self):
+        """写入未保存的统计"""
+        self.flush()
+
+    def _score(self, stats, total_attempts, default_latency=0.0):
+        """计算模板得分：带探索项的成功率，按拒绝率和耗时折算"""
+        attempts = stats['attempts']
+        # 先验偏悲观：大多数猜测的端点并不存在
+        success_rate = (stats['successes'] + 1) / (attempts + 4)
+        bonus = self.exploration * math.sqrt(2 * math.log(total_attempts + 1) / (attempts + 1))
+
+        codes = stats['status_codes']
+        denied = (codes.get('403', 0) + codes.get('404', 0)) / attempts if attempts else 0.0
+        latency = stats['total_latency'] / attempts if attempts else default_latency
+
+        return (success_rate + bonus) * (1 - 0.5 * denied) / (1 + latency)
+
+    def order(self, resource_type, templates):
+        """按得分从高到低排列模板，未记录过的模板视为零样本"""
+        with self._lock:
+            known = self._data.get(resource_type, {})
+            total = sum(s['attempts'] for s in known.values())
+            # 没有样本的模板按已知模板的平均耗时估算
+            default_latency = sum(s['total_latency'] for s in known.values()) / total if total else 0.0
+            empty = {'attempts': 0, 'successes': 0, 'total_latency': 0.0, 'status_codes': {}}
+            scores = {t: self._score(known.get(t, empty), total, default_latency) for t in templates}
+
+        # sorted是稳定排序，得分相同时保持原有顺序
+        return sorted(templates, key=lambda t: -scores[t])
+
+    def stats(self, resource_type=None):
+        """
+        导出统计数据
+
+        Returns:
+            list: 每个模板一条记录，按资源类型和得分排序
+        """
+        rows = []
+        with self._lock:
+            for rtype, templates in self._data.items():
+                if resource_type and rtype != resource_type:
+                    continue
+                total = sum(s['attempts'] for s in templates.values())
+                for template, s in templates.items():
+                    rows.append({
+                        'resource_type': rtype,
+                        'template': template,
+                        'attempts': s['attempts'],
+                        'successes': s['successes'],
+                        'success_rate': s['successes'] / s['attempts'] if s['attempts'] else 0.0,
+                        'avg_latency': s['total_latency'] / s['attempts'] if s['attempts'] else 0.0,
+                        'status_codes': dict(s['status_codes']),
+                        'score': self._score(s, total),
+                    })
+        rows.sort(key=lambda r: (r['resource_type'], -r['score']))
+        return rows
+
+    def print_stats(self, resource_type=None):
+        """打印各端点模板的统计信息"""
+        rows = self.stats(resource_type)
+        if not rows:
+            print("📊 暂无端点统计数据")
+            return
+
+        print("📊 端点模板统计:")
+        current_type = None
+        for row in rows:
+            if row['resource_type'] != current_type:
+                current_type = row['resource_type']
+                print(f"\n   [{current_type}]")
+            codes = ', '.join(f"{code}×{n}" for code, n in sorted(row['status_codes'].items()))
+            print(f"   {row['template']:<45} 成功 {row['successes']}/{row['attempts']} "
+                  f"({row['success_rate'] * 100:.0f}%)  平均 {row['avg_latency'] * 1000:.0f}ms  "
+                  f"得分 {row['score']:.3f}  状态码: {codes}")
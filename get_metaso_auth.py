@@ -5,32 +5,21 @@ Metaso认证信息获取指南
 根据搜索结果，需要从浏览器获取uid和sid来进行API认证
 """
 
-import requests
 import json
 from urllib.parse import urljoin
 import os
+from http_session import create_session
+from video_url_extractor import best_video_url
+from streaming_json import preview_text
 
 class MetasoAuthenticatedDownloader:
     def __init__(self, uid=None, sid=None):
-        self.session = requests.Session()
-        
         # 如果提供了认证信息，设置Authorization头
+        headers = {}
         if uid and sid:
             token = f"{uid}-{sid}"
-            self.session.headers.update({
-                'Authorization': f'Bearer {token}',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Referer': 'https://metaso.cn/'
-            })
-        else:
-            self.session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Referer': 'https://metaso.cn/'
-            })
+            headers['Authorization'] = f'Bearer {token}'
+        self.session = create_session('api', headers=headers)
         
         self.file_id = "8651522172447916032"
         self.chapter_id = "8651523279591608320"
@@ -120,7 +109,7 @@ class MetasoAuthenticatedDownloader:
                     elif 'json' in content_type:
                         try:
                             data = response.json()
-                            print(f"   JSON响应: {json.dumps(data, ensure_ascii=False, indent=2)[:300]}...")
+                            print(f"   JSON响应: {preview_text(response.content, 300)}")
                             
                             # 检查是否有错误
                             if 'errCode' in data:
@@ -151,23 +140,8 @@ class MetasoAuthenticatedDownloader:
         
     def extract_video_url(self, data):
         """从JSON数据中提取视频URL"""
-        def search_video_url(obj):
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    if key.lower() in ['url', 'video_url', 'download_url', 'stream_url', 'media_url', 'src', 'href']:
-                        if isinstance(value, str) and ('http' in value or value.startswith('/')):
-                            return value
-                    result = search_video_url(value)
-                    if result:
-                        return result
-            elif isinstance(obj, list):
-                for item in obj:
-                    result = search_video_url(item)
-                    if result:
-                        return result
-            return None
-            
-        return search_video_url(data)
+        best = best_video_url(data)
+        return best['url'] if best else None
         
     def download_from_url(self, video_url):
         """从URL下载视频"""
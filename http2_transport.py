@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可选的HTTP/2传输
+探测端点时会向metaso.cn发出大量小JSON请求，HTTP/1.1下每个连接同时只能处理一个请求。
+这里用httpx（需安装 httpx[http2]）实现一个requests适配器挂载到共享会话上，
+对指定前缀的请求走HTTP/2，多个探测和元数据请求在同一连接上多路复用；
+其余代码仍然使用requests接口，无需修改
+
+与HTTP/1.1适配器一样按Retry-After和指数退避重试，并共享熔断器和磁盘缓存
+
+未安装httpx或h2时enable_http2返回False，会话保持HTTP/1.1
+"""
+
+import http.client
+import time
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout, Timeout
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from http_cache import HTTPCacheMixin
+from http_retry import RETRY_STATUS_CODES, CircuitOpenError, backoff_delay, build_retry, parse_retry_after
+from http_session import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, TunedHTTPAdapter, get_breaker
+
+try:
+    import httpx
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+# 默认走HTTP/2的前缀：只有API请求，页面和视频文件仍走HTTP/1.1连接池
+DEFAULT_HTTP2_PREFIXES = ('https://metaso.cn/api/',)
+
+
+class _StreamingBody:
+    """把httpx的流式响应包装成requests可以读取的raw对象"""
+
+    def __init__(self, response):
+        self._response = response
+        self._iterator = None
+        self._buffer = b''
+        # requests从 _original_response.msg 中提取Set-Cookie
+        msg = http.client.HTTPMessage()
+        for name, value in response.headers.multi_items():
+            msg[name] = value
+        self._original_response = SimpleNamespace(msg=msg)
+
+    def stream(self, chunk_size=65536, decode_content=True):
+        """requests的iter_content会调用此方法"""
+        if self._buffer:
+            data, self._buffer = self._buffer, b''
+            yield data
+        yield from self._chunks(chunk_size)
+
+    def _chunks(self, chunk_size):
+        if self._iterator is None:
+            # httpx按Content-Encoding解压后产出数据
+            self._iterator = self._response.iter_bytes(chunk_size)
+        for chunk in self._iterator:
+            if chunk:
+                yield chunk
+
+    def read(self, amt=None, decode_content=True):
+        """读取最多amt字节，amt为None时读到结束"""
+        chunks = self._chunks(amt or 65536)
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if amt is None:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self._response.close()
+
+
+class HTTP2Adapter(BaseAdapter):
+    """基于httpx的requests适配器，同一主机的请求在一个HTTP/2连接上多路复用"""
+
+    def __init__(self, max_connections=16, verify=True, http1=True,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 max_retries=None, breaker=None):
+        """
+        初始化适配器
+
+        Args:
+            max_connections: 连接池的最大连接数
+            verify: 是否校验TLS证书
+            http1: 是否允许服务器不支持HTTP/2时退回HTTP/1.1；
+                为False时对明文http使用HTTP/2直连（h2c prior knowledge），便于本地测试
+            connect_timeout: 连接超时（秒）
+            read_timeout: 调用方未指定timeout时的读取超时（秒）
+            max_retries: urllib3 Retry，默认使用build_retry()，只使用其中的次数、方法、状态码和退避参数
+            breaker: CircuitBreaker，通常与会话的HTTP/1.1适配器共享
+        """
+        if not HTTP2_AVAILABLE:
+            raise RuntimeError("HTTP/2模式需要安装: pip install 'httpx[http2]'")
+        super().__init__()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries if max_retries is not None else build_retry()
+        self.breaker = breaker
+        # Cookie、重定向由requests会话处理，httpx只负责传输
+        self.client = httpx.Client(
+            http2=True, http1=http1, verify=verify, follow_redirects=False,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+
+    def _timeout(self, timeout):
+        """把requests风格的timeout转换成httpx.Timeout"""
+        if timeout is None:
+            connect, read = self.connect_timeout, self.read_timeout
+        elif isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect, read = self.connect_timeout, timeout
+        return httpx.Timeout(connect=connect, read=read, write=read, pool=read)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        host = urlparse(request.url).netloc
+        if self.breaker and not self.breaker.allow(host):
+            raise CircuitOpenError(f"{host} 熔断中，暂不发送请求", request=request)
+
+        try:
+            response = self._send_with_retries(request, self._timeout(timeout))
+        except BaseException:
+            # 任何异常都要记录结果，否则半开状态的试探请求不会结束，主机会一直被拒绝
+            if self.breaker:
+                self.breaker.record(host, False)
+            raise
+
+        if self.breaker:
+            failed = response.status_code in RETRY_STATUS_CODES
+            self.breaker.record(host, not failed, parse_retry_after(response) if failed else None)
+        if not stream:
+            # 与requests一致：非流式请求立即读取全部内容
+            response.content
+        return response
+
+    def _send_with_retries(self, request, timeout):
+        """按max_retries重试连接错误和429/5xx响应，用完次数后返回最后一个响应"""
+        retry = self.max_retries
+        attempt = 0
+        while True:
+            try:
+                response = self._send_once(request, timeout)
+            except (ConnectionError, Timeout):
+                if attempt >= (retry.total or 0) or not self._method_retryable(request.method):
+                    raise
+                delay = self._backoff(attempt + 1)
+            else:
+                has_retry_after = 'Retry-After' in response.headers
+                if attempt >= (retry.total or 0) or not retry.is_retry(
+                        request.method, response.status_code, has_retry_after):
+                    return response
+                delay = parse_retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt + 1)
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def _send_once(self, request, timeout):
+        httpx_request = self.client.build_request(
+            request.method, request.url, headers=list(request.headers.items()), content=request.body or b'',
+            timeout=timeout)
+        try:
+            httpx_response = self.client.send(httpx_request, stream=True)
+        except httpx.TransportError as e:
+            if isinstance(e, httpx.ConnectTimeout):
+                raise ConnectTimeout(e, request=request)
+            if isinstance(e, httpx.ReadTimeout):
+                raise ReadTimeout(e, request=request)
+            raise ConnectionError(e, request=request)
+        return self.build_response(request, httpx_response)
+
+    def _method_retryable(self, method):
+        allowed = self.max_retries.allowed_methods
+        return allowed is None or method.upper() in allowed
+
+    def _backoff(self, attempt):
+        """与urllib3相同参数的退避时间"""
+        retry = self.max_retries
+        return backoff_delay(attempt, retry.backoff_factor, retry.backoff_jitter, retry.backoff_max)
+
+    def settings(self):
+        """重建适配器时需要保留的参数"""
+        return {'connect_timeout': self.connect_timeout, 'read_timeout': self.read_timeout,
+                'max_retries': self.max_retries, 'breaker': self.breaker}
+
+    @staticmethod
+    def build_response(request, httpx_response):
+        """把httpx响应转换成requests.Response"""
+        response = Response()
+        response.status_code = httpx_response.status_code
+        # httpx已经解压了响应体，去掉编码头避免requests再次解压
+        headers = CaseInsensitiveDict(httpx_response.headers)
+        headers.pop('Content-Encoding', None)
+        response.headers = headers
+        response.encoding = get_encoding_from_headers(headers)
+        response.raw = _StreamingBody(httpx_response)
+        response.reason = httpx_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = None
+        # 记录实际使用的协议版本，便于确认是否走了HTTP/2
+        response.http_version = httpx_response.http_version
+        return response
+
+    def close(self):
+        self.client.close()
+
+
+class CachingHTTP2Adapter(HTTPCacheMixin, HTTP2Adapter):
+    """带磁盘缓存的HTTP2Adapter，与HTTP/1.1适配器共享同一个HTTPCache"""
+
+
+def enable_http2(session, prefixes=DEFAULT_HTTP2_PREFIXES, **kwargs):
+    """
+    为会话中指定前缀的请求启用HTTP/2
+
+    沿用会话原适配器的超时、重试和熔断设置；已调用enable_http_cache时同样使用磁盘缓存，
+    所以应在enable_http_cache之后调用
+
+    Args:
+        session: requests.Session
+        prefixes: 走HTTP/2的URL前缀
+        **kwargs: 传给HTTP2Adapter的参数
+
+    Returns:
+        bool: 是否已启用（未安装httpx[http2]时返回False）
+    """
+    if not HTTP2_AVAILABLE:
+        print("⚠️ 未安装httpx[http2]，继续使用HTTP/1.1")
+        return False
+
+    # 与HTTP/1.1适配器共享超时、重试、熔断状态和缓存
+    current = session.get_adapter('https://')
+    if isinstance(current, TunedHTTPAdapter):
+        for name, value in current.settings().items():
+            kwargs.setdefault(name, value)
+    kwargs.setdefault('breaker', get_breaker(session))
+    adapter_class = CachingHTTP2Adapter if 'cache' in kwargs else HTTP2Adapter
+    adapter = adapter_class(**kwargs)
+    for prefix in prefixes:
+        session.mount(prefix, adapter)
+    return True
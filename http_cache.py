@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+磁盘HTTP响应缓存
+缓存GET请求得到的页面HTML和API JSON等元数据响应，保存在 .metaso_cache/http/，
+总大小有上限，超出时按最近使用时间淘汰
+
+按 Cache-Control / Expires 判断是否新鲜，新鲜的响应直接从本地返回；
+过期但带ETag/Last-Modified的响应用 If-None-Match / If-Modified-Since 重新验证，
+服务器返回304时使用本地内容。视频等媒体内容、流式请求、Range请求和
+调用方自带条件请求头的请求不经过缓存
+"""
+
+import email.utils
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from endpoint_cache import DEFAULT_CACHE_DIR
+from file_lock import FileLock
+from http_session import TunedHTTPAdapter, mount_adapter
+
+# 不缓存的内容类型（媒体文件）
+MEDIA_TYPE_PREFIXES = ('video/', 'audio/', 'image/', 'application/octet-stream',
+                       'application/vnd.apple.mpegurl', 'application/x-mpegurl')
+
+# 可以缓存的状态码
+CACHEABLE_STATUS = (200, 203, 404, 410)
+
+# 不保存的响应头：Set-Cookie不能重放，内容已解压保存
+_DROP_HEADERS = ('set-cookie', 'content-encoding', 'transfer-encoding', 'connection', 'content-length')
+
+# 只有Last-Modified时的启发式有效期上限（秒）
+MAX_HEURISTIC_TTL = 24 * 3600
+
+_DIRECTIVE_PATTERN = re.compile(r'([\w-]+)\s*(?:=\s*"?([^",]*)"?)?')
+
+
+def parse_cache_control(value):
+    """解析Cache-Control头，返回 {指令: 值或None}"""
+    return {name.lower(): arg for name, arg in _DIRECTIVE_PATTERN.findall(value or '')}
+
+
+def _parse_date(value):
+    """解析HTTP日期，失败时返回None"""
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, now=None):
+    """
+    计算响应的过期时间（时间戳）
+
+    Returns:
+        float: 过期时间；0表示每次使用前都要重新验证
+    """
+    now = now or time.time()
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return 0
+
+    try:
+        age = float(headers.get('Age') or 0)
+    except ValueError:
+        age = 0
+
+    max_age = directives.get('max-age')
+    if max_age is not None:
+        try:
+            return now + max(0, int(max_age) - age)
+        except ValueError:
+            return 0
+
+    date = _parse_date(headers.get('Date')) or now
+    expires = headers.get('Expires')
+    if expires is not None:
+        expires_at = _parse_date(expires)
+        return now + max(0, expires_at - date) if expires_at else 0
+
+    # 只有Last-Modified时，按距上次修改时间的10%估计有效期
+    last_modified = _parse_date(headers.get('Last-Modified'))
+    if last_modified:
+        return now + min(MAX_HEURISTIC_TTL, max(0, (date - last_modified) * 0.1))
+    return 0
+
+
+def request_identity(request):
+    """
+    请求的认证身份
+
+    与endpoint_cache.auth_identity一致，只取Authorization头和uid/sid cookie，
+    其他统计类cookie变化时缓存仍然可用
+    """
+    parts = [request.headers.get('Authorization', '')]
+    cookies = dict(item.strip().split('=', 1) for item in (request.headers.get('Cookie') or '').split(';')
+                   if '=' in item)
+    for name in ('uid', 'sid'):
+        parts.append(cookies.get(name, ''))
+    return '|'.join(parts)
+
+
+class HTTPCache:
+    """
+    磁盘上的HTTP响应缓存，按最近使用时间淘汰
+
+    多个进程可能共用同一个缓存目录：写入索引时在文件锁内重新读取索引，
+    合并本进程的修改后再淘汰和写回，不会丢掉其他进程的记录或留下没有记录的响应体文件
+    """
+
+    def __init__(self, path=None, max_size=100 * 1024 * 1024, max_entry_size=5 * 1024 * 1024):
+        """
+        初始化缓存
+
+        Args:
+            path: 缓存目录，默认 .metaso_cache/http
+            max_size: 所有响应体的总大小上限（字节）
+            max_entry_size: 单个响应体的大小上限（字节），更大的响应不缓存
+        """
+        self.path = Path(path) if path else DEFAULT_CACHE_DIR / 'http'
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self.index_path = self.path / 'index.json'
+
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{self.index_path}.lock")
+        # 命中后更新的最近使用时间，下次写入索引时一起保存
+        self._touched = {}
+        self._index = self._load()
+        self._remove_orphans()
+        self.hits = 0
+        self.revalidated = 0
+
+    def _load(self):
+        """读取索引文件，不存在或损坏时返回空索引"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        """原子写入索引文件（调用方需持有锁）"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+
+    def _remove_orphans(self):
+        """删除索引中没有记录的响应体文件（进程中断或旧版本留下的）"""
+        if not self.path.is_dir():
+            return
+        with self._file_lock, self._lock:
+            self._index = self._load()
+            for body_path in self.path.glob('*.body'):
+                if body_path.stem not in self._index:
+                    body_path.unlink(missing_ok=True)
+
+    def _commit(self, changes):
+        """
+        读取最新的索引，合并本进程的修改后淘汰并写回（调用方需持有文件锁和线程锁）
+
+        Args:
+            changes: key -> 记录，None表示删除
+        """
+        index = self._load()
+        for key, entry in changes.items():
+            if entry is None:
+                index.pop(key, None)
+            else:
+                index[key] = entry
+        for key, last_used in self._touched.items():
+            if key in index:
+                index[key]['last_used'] = max(index[key]['last_used'], last_used)
+        self._touched = {}
+        self._index = index
+        self._evict()
+        self._save()
+
+    @staticmethod
+    def key(request):
+        """缓存键：方法、URL和认证身份的哈希"""
+        raw = '\n'.join((request.method, request.url, request_identity(request)))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return self.path / f"{key}.body"
+
+    def lookup(self, key):
+        """返回缓存记录和响应体，不存在时返回 (None, None)"""
+        with self._lock:
+            entry = self._index.get(key)
+            if not entry:
+                return None, None
+            try:
+                body = self._body_path(key).read_bytes()
+            except OSError:
+                # 响应体已被其他进程淘汰，下次写入索引时会读到删除后的索引
+                del self._index[key]
+                return None, None
+            entry['last_used'] = self._touched[key] = time.time()
+            return dict(entry), body
+
+    def store(self, key, response, body):
+        """保存响应，内容过大时不保存"""
+        if len(body) > self.max_entry_size:
+            return
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in _DROP_HEADERS}
+        entry = {
+            'url': response.url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': headers,
+            'expires': freshness_lifetime(response.headers),
+            'size': len(body),
+            'stored': time.time(),
+            'last_used': time.time(),
+        }
+        with self._file_lock, self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            body_path = self._body_path(key)
+            tmp_path = f"{body_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, body_path)
+            self._commit({key: entry})
+
+    def refresh(self, key, response):
+        """304后用新的响应头更新有效期和验证信息"""
+        with self._file_lock, self._lock:
+            # 其他进程可能已淘汰这条记录
+            entry = self._load().get(key)
+            if not entry:
+                return
+            # HTTP/2响应的头名称是小写的，按不区分大小写合并
+            headers = CaseInsensitiveDict(entry['headers'])
+            for name in ('ETag', 'Last-Modified', 'Cache-Control', 'Expires', 'Date'):
+                if name in response.headers:
+                    headers[name] = response.headers[name]
+            entry['headers'] = dict(headers)
+            headers['Age'] = response.headers.get('Age', '0')
+            entry['expires'] = freshness_lifetime(headers)
+            entry['last_used'] = time.time()
+            self._commit({key: entry})
+
+    def remove(self, key):
+        """删除缓存记录"""
+        with self._file_lock, self._lock:
+            self._body_path(key).unlink(missing_ok=True)
+            self._commit({key: None})
+
+    def _evict(self):
+        """总大小超出上限时删除最久未使用的记录（调用方需持有锁）"""
+        total = sum(entry['size'] for entry in self._index.values())
+        if total <= self.max_size:
+            return
+        for key in sorted(self._index, key=lambda k: self._index[k]['last_used']):
+            total -= self._index.pop(key)['size']
+            self._body_path(key).unlink(missing_ok=True)
+            if total <= self.max_size:
+                break
+
+    def total_size(self):
+        """已缓存响应体的总大小（字节）"""
+        with self._lock:
+            return sum(entry['size'] for entry in self._index.values())
+
+
+class HTTPCacheMixin:
+    """
+    给requests适配器加上磁盘缓存，只缓存非流式的GET元数据请求
+
+    放在适配器类之前继承，send()在缓存未命中时调用下一个适配器的send()
+    """
+
+    def __init__(self, cache=None, **kwargs):
+        """
+        初始化适配器
+
+        Args:
+            cache: HTTPCache，默认使用 .metaso_cache/http
+            **kwargs: 传给适配器的参数
+        """
+        self.cache = cache if cache is not None else HTTPCache()
+        super().__init__(**kwargs)
+
+    def settings(self):
+        return dict(super().settings(), cache=self.cache)
+
+    @staticmethod
+    def cacheable_request(request, stream):
+        """是否可以使用缓存"""
+        if request.method != 'GET' or stream:
+            return False
+        headers = request.headers
+        if any(name in headers for name in ('Range', 'If-None-Match', 'If-Modified-Since', 'If-Range')):
+            return False
+        return 'no-store' not in parse_cache_control(headers.get('Cache-Control'))
+
+    @staticmethod
+    def cacheable_response(response):
+        """响应是否可以保存"""
+        if response.status_code not in CACHEABLE_STATUS:
+            return False
+        content_type = response.headers.get('Content-Type', '').lower()
+        if content_type.startswith(MEDIA_TYPE_PREFIXES):
+            return False
+        directives = parse_cache_control(response.headers.get('Cache-Control'))
+        if 'no-store' in directives:
+            return False
+        # 既没有有效期也没有验证信息的响应每次都要重新请求，保存没有意义
+        return (freshness_lifetime(response.headers) > time.time()
+                or 'ETag' in response.headers or 'Last-Modified' in response.headers)
+
+    def send(self, request, stream=False, **kwargs):
+        if not self.cacheable_request(request, stream):
+            return super().send(request, stream=stream, **kwargs)
+
+        key = self.cache.key(request)
+        entry, body = self.cache.lookup(key)
+        if entry and time.time() < entry['expires']:
+            self.cache.hits += 1
+            return self.build_cached_response(request, entry, body)
+
+        if entry:
+            headers = CaseInsensitiveDict(entry['headers'])
+            etag = headers.get('ETag')
+            last_modified = headers.get('Last-Modified')
+            if etag:
+                request.headers['If-None-Match'] = etag
+            if last_modified:
+                request.headers['If-Modified-Since'] = last_modified
+
+        response = super().send(request, stream=stream, **kwargs)
+
+        if response.status_code == 304 and entry:
+            self.cache.revalidated += 1
+            self.cache.refresh(key, response)
+            cached = self.build_cached_response(request, entry, body)
+            # 读完（空的）304响应体并归还连接，否则这个连接一直不会回到连接池
+            response.content
+            response.raw.release_conn()
+            # 304中可能带有新的cookie（会话从raw的响应头中提取）
+            cached.raw = response.raw
+            return cached
+
+        if self.cacheable_response(response):
+            self.cache.store(key, response, response.content)
+        elif entry:
+            self.cache.remove(key)
+        return response
+
+    @staticmethod
+    def build_cached_response(request, entry, body):
+        """用缓存内容构造requests.Response"""
+        response = Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers['Content-Length'] = str(len(body))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response._content_consumed = True
+        response.url = entry['url']
+        response.request = request
+        response.connection = None
+        # 标记来自缓存，便于调用方和统计区分
+        response.from_cache = True
+        return response
+
+
+class CachingHTTPAdapter(HTTPCacheMixin, TunedHTTPAdapter):
+    """带磁盘缓存的TunedHTTPAdapter"""
+
+
+def enable_http_cache(session, cache=None):
+    """
+    为会话启用磁盘缓存，保留原适配器的连接池、超时、重试和熔断设置
+
+    Returns:
+        HTTPCache
+    """
+    current = session.get_adapter('https://')
+    settings = current.settings() if isinstance(current, TunedHTTPAdapter) else {}
+    if cache is not None:
+        settings['cache'] = cache
+    adapter = mount_adapter(session, CachingHTTPAdapter(**settings))
+    return adapter.cache
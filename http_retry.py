@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP重试策略和按主机的熔断器
+超时、连接中断、429/5xx等暂时性错误在连接池层自动重试：指数退避加随机抖动，
+429/503带Retry-After时按服务器要求等待；只重试幂等请求（GET/HEAD/OPTIONS），
+POST等请求只在连接尚未建立时重试
+
+同一主机短时间内错误率过高时熔断器打开，后续请求直接失败而不再发出，
+冷却后放行一个试探请求，成功则恢复
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+from requests.exceptions import ConnectionError
+from urllib3.util.retry import Retry
+
+# 可以安全重试的方法
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+# 视为暂时性错误、需要重试的状态码
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class BackoffRetry(Retry):
+    """限制Retry-After最长等待时间的Retry"""
+
+    # 服务器要求的等待时间超过该值（秒）时按该值等待，避免单个请求挂起过久
+    MAX_RETRY_AFTER = 30
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.MAX_RETRY_AFTER)
+
+
+def build_retry(total=3, backoff_factor=0.5, backoff_jitter=0.5, backoff_max=20):
+    """
+    创建连接池使用的重试策略
+
+    Args:
+        total: 最多重试次数
+        backoff_factor: 退避基数，第n次重试前等待 backoff_factor * 2^(n-1) 秒
+        backoff_jitter: 每次等待额外增加的随机时间上限（秒），错开并发请求的重试
+        backoff_max: 单次等待的上限（秒）
+
+    Returns:
+        BackoffRetry
+    """
+    return BackoffRetry(
+        total=total,
+        connect=total,
+        read=total,
+        status=total,
+        redirect=None,
+        allowed_methods=IDEMPOTENT_METHODS,
+        status_forcelist=RETRY_STATUS_CODES,
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        backoff_max=backoff_max,
+        respect_retry_after_header=True,
+        # 重试用完后返回最后一个响应，由调用方按状态码处理
+        raise_on_status=False,
+    )
+
+
+def backoff_delay(attempt, backoff_factor=0.5, backoff_jitter=0.5, backoff_max=20):
+    """第attempt次重试（从1开始）前的等待时间，与build_retry的退避方式一致"""
+    delay = backoff_factor * (2 ** (attempt - 1)) + random.random() * backoff_jitter
+    return min(backoff_max, delay)
+
+
+def parse_retry_after(response, limit=BackoffRetry.MAX_RETRY_AFTER):
+    """读取响应的Retry-After（秒），没有或无法解析时返回None"""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return min(limit, BackoffRetry().parse_retry_after(value))
+    except Exception:
+        return None
+
+
+class CircuitOpenError(ConnectionError):
+    """熔断器打开时拒绝请求"""
+
+
+class CircuitBreaker:
+    """
+    按主机统计最近请求的结果，错误率过高时暂停向该主机发请求
+
+    状态：closed（正常）-> open（拒绝请求）-> 冷却结束后half-open（放行一个试探请求）
+    -> 试探成功回到closed，失败重新open
+    """
+
+    def __init__(self, window=20, min_failures=5, failure_rate=0.5, cooldown=30):
+        """
+        初始化熔断器
+
+        Args:
+            window: 每个主机统计的最近请求数
+            min_failures: 窗口内至少有这么多次失败才会打开
+            failure_rate: 窗口内失败比例达到该值时打开
+            cooldown: 打开后的冷却时间（秒）
+        """
+        self.window = window
+        self.min_failures = min_failures
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, host):
+        """返回主机的状态记录（调用方需持有锁）"""
+        state = self._hosts.get(host)
+        if state is None:
+            state = {'results': deque(maxlen=self.window), 'open_until': 0, 'trial': False}
+            self._hosts[host] = state
+        return state
+
+    def allow(self, host):
+        """是否允许向主机发请求；冷却结束后只放行一个试探请求"""
+        with self._lock:
+            state = self._host(host)
+            if not state['open_until']:
+                return True
+            if time.time() < state['open_until'] or state['trial']:
+                return False
+            state['trial'] = True
+            return True
+
+    def record(self, host, ok, retry_after=None):
+        """
+        记录一次请求结果
+
+        Args:
+            host: 主机名
+            ok: 请求是否成功（主机正常响应）
+            retry_after: 服务器要求的等待时间（秒），熔断至少持续这么久
+        """
+        with self._lock:
+            state = self._host(host)
+            if state['open_until'] and not state['trial']:
+                # 熔断前已发出的请求，结果不再计入
+                return
+            if state['trial']:
+                # 试探请求的结果决定恢复还是继续熔断
+                state['trial'] = False
+                if ok:
+                    state['open_until'] = 0
+                    state['results'].clear()
+                else:
+                    self._open(host, state, retry_after)
+                return
+
+            state['results'].append(ok)
+            failures = state['results'].count(False)
+            if (failures >= self.min_failures
+                    and failures / len(state['results']) >= self.failure_rate):
+                self._open(host, state, retry_after)
+
+    def _open(self, host, state, retry_after):
+        """打开熔断器（调用方需持有锁）"""
+        already_open = state['open_until'] > 0
+        state['open_until'] = time.time() + max(self.cooldown, retry_after or 0)
+        state['results'].clear()
+        if not already_open:
+            print(f"   ⛔ {host} 错误率过高，暂停请求 {max(self.cooldown, retry_after or 0):.0f} 秒")
+
+    def is_open(self, host):
+        """主机当前是否处于熔断状态"""
+        with self._lock:
+            state = self._hosts.get(host)
+            return bool(state and state['open_until'])
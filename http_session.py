@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享HTTP会话工厂
+所有下载器和分析脚本通过create_session创建会话：
+统一的请求头配置、按主机的连接池大小、连接复用（keep-alive），以及分开的连接/读取超时。
+并发任务共享同一个会话时复用已建立的TLS连接，不必每个请求重新握手
+
+适配器带重试策略（指数退避、Retry-After）和按主机的熔断器，见http_retry
+"""
+
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_retry import RETRY_STATUS_CODES, CircuitBreaker, CircuitOpenError, build_retry, parse_retry_after
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+# 请求头配置
+# Accept-Encoding不声明br：requests只有安装了brotli才能解压，服务器返回br时会得到乱码
+HEADER_PROFILES = {
+    # 打开页面（模拟浏览器导航）
+    'page': {
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'Referer': 'https://metaso.cn/',
+        'Origin': 'https://metaso.cn',
+    },
+    # 调用JSON接口（模拟页面中的XHR请求）
+    'api': {
+        'User-Agent': USER_AGENT,
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'Referer': 'https://metaso.cn/',
+        'Origin': 'https://metaso.cn',
+    },
+}
+
+# 默认超时（秒）：连接超时短，尽快发现不可达的主机；读取超时按请求类型由调用方指定
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+
+class TunedHTTPAdapter(HTTPAdapter):
+    """
+    带连接池配置、默认超时、重试和熔断的HTTPAdapter
+
+    调用方只传一个数字作为timeout时，把它当作读取超时，连接超时使用connect_timeout；
+    没有传timeout时使用 (connect_timeout, read_timeout)，避免请求无限期挂起
+    """
+
+    def __init__(self, pool_connections=16, pool_maxsize=32, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, max_retries=None, breaker=None, **kwargs):
+        """
+        初始化适配器
+
+        Args:
+            pool_connections: 缓存连接池的主机数
+            pool_maxsize: 每个主机连接池保留的最大连接数
+            connect_timeout: 连接超时（秒）
+            read_timeout: 默认读取超时（秒）
+            max_retries: urllib3 Retry，默认使用build_retry()
+            breaker: CircuitBreaker，为None时不熔断
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.breaker = breaker
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                         max_retries=max_retries if max_retries is not None else build_retry(), **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = (self.connect_timeout, self.read_timeout)
+        elif isinstance(timeout, (int, float)):
+            timeout = (self.connect_timeout, timeout)
+
+        if self.breaker is None:
+            return super().send(request, timeout=timeout, **kwargs)
+
+        host = urlparse(request.url).netloc
+        if not self.breaker.allow(host):
+            raise CircuitOpenError(f"{host} 熔断中，暂不发送请求", request=request)
+        try:
+            response = super().send(request, timeout=timeout, **kwargs)
+        except BaseException:
+            # 任何异常都要记录结果，否则半开状态的试探请求不会结束，主机会一直被拒绝
+            self.breaker.record(host, False)
+            raise
+        failed = response.status_code in RETRY_STATUS_CODES
+        self.breaker.record(host, not failed, parse_retry_after(response) if failed else None)
+        return response
+
+    def settings(self):
+        """重建适配器（如调整连接池大小）时需要保留的参数"""
+        return {'connect_timeout': self.connect_timeout, 'read_timeout': self.read_timeout,
+                'max_retries': self.max_retries, 'breaker': self.breaker}
+
+
+def mount_adapter(session, adapter):
+    """把适配器挂载到会话的http和https前缀"""
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
+
+
+def resize_pool(session, pool_maxsize, pool_connections=16):
+    """
+    按并发数重新配置会话的连接池，保留原适配器的类型和设置（超时、重试、熔断、缓存）
+
+    并发worker数大于连接池大小时，多出的连接用完即关闭，无法复用
+    """
+    current = session.get_adapter('https://')
+    if isinstance(current, TunedHTTPAdapter):
+        adapter = type(current)(pool_connections=pool_connections, pool_maxsize=pool_maxsize, **current.settings())
+    else:
+        adapter = TunedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    return mount_adapter(session, adapter)
+
+
+def get_breaker(session):
+    """返回会话使用的熔断器，没有时返回None"""
+    return getattr(session.get_adapter('https://'), 'breaker', None)
+
+
+def create_session(profile='page', headers=None, cookies=None, pool_connections=16, pool_maxsize=32,
+                   connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                   retries=None, breaker=True):
+    """
+    创建配置好的会话
+
+    Args:
+        profile: 请求头配置名，见HEADER_PROFILES
+        headers: 额外的请求头，覆盖配置中的同名项
+        cookies: 额外的cookie字典
+        pool_connections: 缓存连接池的主机数
+        pool_maxsize: 每个主机保留的最大连接数，应不小于同时请求同一主机的线程数
+        connect_timeout: 连接超时（秒）
+        read_timeout: 未指定timeout的请求使用的读取超时（秒）
+        retries: urllib3 Retry，默认使用build_retry()；传0关闭重试
+        breaker: True使用新的CircuitBreaker，也可以传入多个会话共享的实例，False不熔断
+
+    Returns:
+        requests.Session
+    """
+    session = requests.Session()
+    session.headers.update(HEADER_PROFILES[profile])
+    if headers:
+        session.headers.update(headers)
+    if cookies:
+        for name, value in cookies.items():
+            session.cookies.set(name, value)
+
+    if breaker is True:
+        breaker = CircuitBreaker()
+    mount_adapter(session, TunedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                            connect_timeout=connect_timeout, read_timeout=read_timeout,
+                                            max_retries=retries, breaker=breaker or None))
+    return session
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+精简浏览器模式
+查找视频API只需要页面文档、脚本和XHR请求，图片、字体、样式表和统计脚本都用不到。
+精简模式下Chrome不解码图片，并通过CDP的 Network.setBlockedURLs 直接拦截这些请求，
+页面加载到发现视频API的时间明显缩短
+
+视频文件本身不拦截：网络日志需要看到它们的响应
+"""
+
+
+def _extension_patterns(*extensions):
+    """
+    生成按扩展名拦截的通配符
+
+    通配符要匹配整个URL，*.css 匹配不到 a.css?v=1，所以每个扩展名再加一个带查询参数的形式
+    """
+    return [pattern for ext in extensions for pattern in (f'*.{ext}', f'*.{ext}?*')]
+
+
+# 拦截的资源（Network.setBlockedURLs的通配符模式）
+IMAGE_PATTERNS = _extension_patterns('png', 'jpg', 'jpeg', 'gif', 'webp', 'svg', 'ico', 'bmp', 'avif')
+FONT_PATTERNS = _extension_patterns('woff', 'woff2', 'ttf', 'otf', 'eot')
+STYLESHEET_PATTERNS = _extension_patterns('css')
+
+# 拦截的统计和广告域名
+BLOCKED_ANALYTICS_PATTERNS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+    '*hm.baidu.com*',
+    '*cnzz.com*',
+    '*umeng.com*',
+    '*growingio.com*',
+    '*sensorsdata.cn*',
+    '*clarity.ms*',
+    '*sentry.io*',
+]
+
+LEAN_BLOCKED_URLS = IMAGE_PATTERNS + FONT_PATTERNS + STYLESHEET_PATTERNS + BLOCKED_ANALYTICS_PATTERNS
+
+# 需要用户在页面上操作时保留样式表，否则页面无法正常使用
+INTERACTIVE_BLOCKED_URLS = IMAGE_PATTERNS + FONT_PATTERNS + BLOCKED_ANALYTICS_PATTERNS
+
+# 精简模式的启动参数
+LEAN_ARGUMENTS = [
+    "--blink-settings=imagesEnabled=false",
+    "--window-size=1280,800",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--no-first-run",
+]
+
+
+def enable_performance_log(options):
+    """开启性能日志（driver.get_log('performance')读取网络事件需要）"""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    return options
+
+
+def apply_lean_options(options):
+    """
+    给Chrome启动选项加上精简模式的设置：不加载图片、较小的窗口、关闭后台网络请求
+
+    在已有的prefs上合并，不覆盖下载目录等设置
+    """
+    # 替换调用方设置的窗口大小
+    options.arguments[:] = [a for a in options.arguments if not a.startswith('--window-size=')]
+    for argument in LEAN_ARGUMENTS:
+        if argument not in options.arguments:
+            options.add_argument(argument)
+
+    prefs = dict(options.experimental_options.get('prefs', {}))
+    prefs['profile.managed_default_content_settings.images'] = 2
+    prefs['profile.default_content_setting_values.notifications'] = 2
+    options.add_experimental_option('prefs', prefs)
+
+    # DOMContentLoaded后driver.get()即返回，后台网络捕获可以更早开始读取日志
+    options.page_load_strategy = 'eager'
+    return enable_performance_log(options)
+
+
+def enable_resource_blocking(driver, patterns=None):
+    """
+    通过CDP拦截图片、字体、样式表和统计请求
+
+    只作用于当前标签页，对之后发起的请求生效
+
+    Args:
+        driver: Chrome WebDriver
+        patterns: 拦截的URL通配符列表，默认 LEAN_BLOCKED_URLS
+
+    Returns:
+        bool: 是否设置成功（非Chrome浏览器不支持CDP）
+    """
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns or LEAN_BLOCKED_URLS})
+        return True
+    except Exception as e:
+        print(f"⚠️ 无法启用资源拦截: {e}")
+        return False
@@ -6,34 +6,50 @@ Metaso视频手动下载工具
 避免Selenium配置问题
 """
 
-import requests
-import json
 import os
-import time
+import hashlib
 from urllib.parse import urlparse, parse_qs
 import re
+from http_session import create_session
+from segmented_downloader import SegmentedDownloader
+from endpoint_prober import EndpointProber
+from endpoint_cache import EndpointCache, NegativeCache
+from endpoint_registry import EndpointRegistry
+from media_sniffer import is_video_kind
+from page_scanner import scan_page
 
 class ManualVideoDownloader:
+    # 可能的视频API端点模板
+    API_ENDPOINT_TEMPLATES = [
+        "/api/file/{file_id}/video",
+        "/api/file/{file_id}/video/url",
+        "/api/ppt/{file_id}/video",
+        "/api/ppt/{file_id}/video/url",
+        "/api/export/{file_id}/video",
+        "/api/generate/{file_id}/video",
+        "/api/chapter/{file_id}/video",
+        "/api/chapter/{file_id}/video/url",
+    ]
+    
     def __init__(self, uid=None, sid=None):
         self.uid = uid
         self.sid = sid
-        self.session = requests.Session()
-        
         # 设置请求头，模拟浏览器
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
+        self.session = create_session('page', headers={'Upgrade-Insecure-Requests': '1'})
         
         # 如果提供了认证信息，设置Cookie
         if uid and sid:
             self.session.cookies.set('uid', uid)
             self.session.cookies.set('sid', sid)
             print(f"✅ 已设置认证信息: uid={uid[:10]}..., sid={sid[:10]}...")
+        
+        # 分段下载引擎，写入.part文件并支持断点续传
+        self.downloader = SegmentedDownloader(self.session)
+        
+        # 并发端点探测器：优先尝试上次成功的端点模板，其余按历史统计排序，
+        # 跳过近期返回401/403/404的端点
+        self.prober = EndpointProber(self.session, cache=EndpointCache(),
+                                     registry=EndpointRegistry(), negative_cache=NegativeCache())
     
     def analyze_page(self, url):
         """分析页面内容，查找视频相关信息"""
@@ -51,25 +67,17 @@ class ManualVideoDownloader:
                 f.write(response.text)
             print("💾 页面内容已保存到 page_content.html")
             
-            # 查找视频相关的URL模式
-            video_patterns = [
-                r'"(https?://[^"]*\.mp4[^"]*?)"',
-                r'"(https?://[^"]*video[^"]*?)"',
-                r'"(/api/[^"]*video[^"]*?)"',
-                r'videoUrl.*?["\047]([^"\047]*.mp4[^"\047]*)["\047]',
-                r'src.*?["\047]([^"\047]*.mp4[^"\047]*)["\047]',
-                r'url.*?["\047]([^"\047]*.mp4[^"\047]*)["\047]',
-            ]
-            
-            found_urls = set()
-            for pattern in video_patterns:
-                matches = re.findall(pattern, response.text, re.IGNORECASE)
-                for match in matches:
-                    if match.startswith('/'):
-                        # 相对URL，转换为绝对URL
-                        base_url = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
-                        match = base_url + match
-                    found_urls.add(match)
+            # 单次扫描查找API路径、视频URL赋值和视频文件URL
+            base_url = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
+            found_urls = {}
+            for match in scan_page(response.text):
+                video_url = match.value
+                if video_url.startswith('//'):
+                    video_url = f"{urlparse(url).scheme}:{video_url}"
+                elif video_url.startswith('/'):
+                    # 相对URL，转换为绝对URL
+                    video_url = base_url + video_url
+                found_urls[video_url] = match.kind
             
             if found_urls:
                 print(f"\n🎯 找到 {len(found_urls)} 个可能的视频URL:")
@@ -84,16 +92,27 @@ class ManualVideoDownloader:
             print(f"❌ 页面分析失败: {e}")
             return []
     
+    @staticmethod
+    def stable_filename(video_url):
+        """
+        从URL生成文件名
+        
+        同一个视频每次运行得到相同的文件名，重新运行时能找到上次的 .part 文件继续下载；
+        URL中没有mp4文件名时用路径的哈希（不含查询参数，签名参数每次可能不同）
+        """
+        parsed = urlparse(video_url)
+        filename = os.path.basename(parsed.path)
+        if filename and filename.endswith('.mp4'):
+            return filename
+        digest = hashlib.sha1(f"{parsed.netloc}{parsed.path}".encode('utf-8')).hexdigest()[:12]
+        return f"video_{digest}.mp4"
+    
     def try_download_video(self, video_url, filename=None):
         """尝试下载视频"""
         print(f"\n📥 尝试下载: {video_url}")
         
         if not filename:
-            # 从URL生成文件名
-            parsed = urlparse(video_url)
-            filename = os.path.basename(parsed.path)
-            if not filename or not filename.endswith('.mp4'):
-                filename = f"video_{int(time.time())}.mp4"
+            filename = self.stable_filename(video_url)
         
         try:
             # 发送HEAD请求检查资源
@@ -111,13 +130,9 @@ class ManualVideoDownloader:
                     # 看起来是视频文件，尝试下载
                     print("🎬 检测到视频内容，开始下载...")
                     
-                    response = self.session.get(video_url, stream=True)
-                    response.raise_for_status()
-                    
-                    with open(filename, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
+                    if not self.downloader.download(video_url, filename):
+                        print(f"❌ 下载未完成: {filename}")
+                        return False
                     
                     file_size = os.path.getsize(filename)
                     print(f"✅ 视频下载成功: {filename} ({file_size} bytes)")
@@ -136,95 +151,66 @@ class ManualVideoDownloader:
         """尝试各种API端点"""
         print(f"\n🔧 尝试API端点，文件ID: {file_id}")
         
-        api_endpoints = [
-            f"https://metaso.cn/api/file/{file_id}/video",
-            f"https://metaso.cn/api/file/{file_id}/video/url",
-            f"https://metaso.cn/api/ppt/{file_id}/video",
-            f"https://metaso.cn/api/ppt/{file_id}/video/url",
-            f"https://metaso.cn/api/export/{file_id}/video",
-            f"https://metaso.cn/api/generate/{file_id}/video",
-            f"https://metaso.cn/api/chapter/{file_id}/video",
-            f"https://metaso.cn/api/chapter/{file_id}/video/url",
-        ]
-        
-        for endpoint in api_endpoints:
-            print(f"\n🔗 测试: {endpoint}")
-            
-            try:
-                response = self.session.get(endpoint)
-                print(f"📋 状态码: {response.status_code}")
-                
-                if response.status_code == 200:
-                    content_type = response.headers.get('Content-Type', '')
-                    print(f"📋 内容类型: {content_type}")
-                    
-                    if 'application/json' in content_type or 'text/json' in content_type:
-                        # JSON响应，查看内容
-                        try:
-                            data = response.json()
-                            print(f"📋 完整JSON响应: {json.dumps(data, ensure_ascii=False, indent=2)}")
-                            
-                            # 特殊处理：如果errCode是401但errMsg包含URL，尝试提取
-                            if data.get('errCode') == 401 and 'errMsg' in data:
-                                err_msg = data['errMsg']
-                                if 'http' in err_msg:
-                                    print(f"🎯 从错误消息中提取到可能的视频URL: {err_msg}")
-                                    if self.try_download_video(err_msg):
-                                        return True
-                            
-                            # 查找JSON中的视频URL
-                            video_url = self.extract_video_url_from_json(data)
-                            if video_url:
-                                print(f"🎯 从JSON中提取到视频URL: {video_url}")
-                                if self.try_download_video(video_url):
-                                    return True
-                        except json.JSONDecodeError:
-                            print("⚠️ 无法解析JSON响应")
-                            print(f"📋 原始响应内容: {response.text[:500]}...")
-                    
-                    elif 'video' in content_type:
-                        # 直接是视频内容
-                        filename = f"video_from_api_{int(time.time())}.mp4"
-                        with open(filename, 'wb') as f:
-                            f.write(response.content)
-                        
+        # 并发探测，按返回顺序依次尝试下载，成功后取消其余请求
+        results = self.prober.probe_templates(
+            'file', self.API_ENDPOINT_TEMPLATES, self.classify_api_response,
+            base_url="https://metaso.cn", file_id=file_id)
+        # 按文件ID命名，重新运行时从上次的 .part 文件续传（续传前会校验大小和ETag）
+        filename = f"video_{file_id}.mp4"
+        try:
+            for result in results:
+                if result['kind'] == 'video':
+                    # 端点直接返回视频内容
+                    if self.downloader.download(result['url'], filename):
                         file_size = os.path.getsize(filename)
                         print(f"✅ 直接下载视频成功: {filename} ({file_size} bytes)")
                         return True
-                    
-                    else:
-                        # 其他内容类型，显示部分内容
-                        print(f"📋 响应内容预览: {response.text[:200]}...")
-                
-            except Exception as e:
-                print(f"❌ API请求失败: {e}")
+                elif self.try_download_video(result['url'], filename):
+                    return True
+        finally:
+            results.close()
         
         return False
     
-    def extract_video_url_from_json(self, data):
-        """从JSON数据中提取视频URL"""
-        if isinstance(data, dict):
-            # 查找常见的视频URL字段
-            url_fields = ['url', 'videoUrl', 'video_url', 'downloadUrl', 'download_url', 'src', 'href']
+    def classify_api_response(self, endpoint, response):
+        """分析API响应，返回视频地址信息或None"""
+        print(f"\n🔗 {endpoint} 状态码: {response.status_code}")
+        
+        if response.status_code not in (200, 206):
+            return None
+        
+        content_type = response.content_type
+        print(f"📋 内容类型: {content_type}")
+        
+        if 'video' in content_type or is_video_kind(response.kind):
+            # 直接是视频内容
+            return {'kind': 'video', 'url': endpoint}
+        
+        elif 'application/json' in content_type or 'text/json' in content_type or response.kind == 'json':
+            # JSON响应，查看内容
+            print(f"📋 JSON响应: {response.preview(500)}")
+            
+            scan = response.scan_video_urls()
+            if scan['error']:
+                print("⚠️ 无法解析JSON响应")
+                return None
             
-            for field in url_fields:
-                if field in data and data[field]:
-                    url = data[field]
-                    if isinstance(url, str) and ('http' in url or url.endswith('.mp4')):
-                        return url
+            # 特殊处理：如果errCode是401但errMsg包含URL，尝试提取
+            fields = scan['fields']
+            err_msg = fields.get('errMsg')
+            if fields.get('errCode') == 401 and isinstance(err_msg, str) and 'http' in err_msg:
+                print(f"🎯 从错误消息中提取到可能的视频URL: {err_msg}")
+                return {'kind': 'url', 'url': err_msg}
             
-            # 递归查找嵌套对象
-            for value in data.values():
-                if isinstance(value, (dict, list)):
-                    result = self.extract_video_url_from_json(value)
-                    if result:
-                        return result
+            # 查找JSON中的视频URL
+            if scan['best']:
+                video_url = scan['best']['url']
+                print(f"🎯 从JSON中提取到视频URL: {video_url}")
+                return {'kind': 'url', 'url': video_url}
         
-        elif isinstance(data, list):
-            for item in data:
-                result = self.extract_video_url_from_json(item)
-                if result:
-                    return result
+        else:
+            # 其他内容类型，显示开头部分内容
+            print(f"📋 响应内容预览: {response.head[:200].decode('utf-8', errors='replace')}...")
         
         return None
     
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+媒体类型嗅探
+根据响应开头的几个字节判断内容类型（MP4 / WebM / FLV / HLS播放列表 / JSON / HTML），
+探测端点时只需要请求前4KB，不必下载整个响应体
+"""
+
+# 探测时请求的字节数
+SNIFF_SIZE = 4096
+
+# 可以直接作为视频源的类型
+VIDEO_KINDS = ('mp4', 'webm', 'flv', 'hls')
+
+# 各类型对应的Content-Type，服务器没有给出正确类型时使用
+KIND_CONTENT_TYPES = {
+    'mp4': 'video/mp4',
+    'webm': 'video/webm',
+    'flv': 'video/x-flv',
+    'hls': 'application/vnd.apple.mpegurl',
+    'json': 'application/json',
+    'html': 'text/html',
+}
+
+# MP4/MOV文件开头常见的box类型
+_MP4_BOXES = (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide')
+
+
+def sniff_media_type(head):
+    """
+    根据内容开头字节判断类型
+
+    Args:
+        head: 响应体开头的字节
+
+    Returns:
+        str: 'mp4' / 'webm' / 'flv' / 'hls' / 'json' / 'html'，无法识别时返回None
+    """
+    if not head:
+        return None
+
+    # MP4: 第一个box的类型位于第4-8字节
+    if len(head) >= 8 and head[4:8] in _MP4_BOXES:
+        return 'mp4'
+
+    # WebM/Matroska: EBML头
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'webm'
+
+    # FLV: 'FLV' + 版本号1
+    if head.startswith(b'FLV\x01'):
+        return 'flv'
+
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+
+    if text.startswith(b'#EXTM3U'):
+        return 'hls'
+
+    if text[:1] in (b'{', b'['):
+        return 'json'
+
+    if text[:1] == b'<':
+        return 'html'
+
+    return None
+
+
+def is_video_kind(kind):
+    """判断嗅探结果是否是视频内容"""
+    return kind in VIDEO_KINDS
@@ -8,12 +8,22 @@ Metaso视频下载器
 import sys
 import os
 import re
-import json
-import time
-import requests
-from urllib.parse import urlparse, parse_qs, unquote
-from bs4 import BeautifulSoup
+import codecs
+from urllib.parse import urlparse, parse_qs, unquote, urljoin
+from bs4 import BeautifulSoup, SoupStrainer, FeatureNotFound
 from pathlib import Path
+from http_session import create_session
+from http2_transport import enable_http2
+from http_cache import enable_http_cache
+from segmented_downloader import SegmentedDownloader
+from endpoint_prober import EndpointProber
+from endpoint_cache import EndpointCache, NegativeCache
+from endpoint_registry import EndpointRegistry
+from media_sniffer import is_video_kind
+from page_scanner import scan_page, StreamingPageScanner, VideoElementParser
+from bundle_scanner import BundleScanner, BundleCache
+from singleflight import SingleFlight, request_key
+from credential_store import CredentialStore, check_login
 
 # 添加src目录到Python路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
@@ -21,20 +31,36 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 class MetasoVideoDownloader:
     """Metaso视频下载器"""
     
-    def __init__(self, download_dir="downloads", uid=None, sid=None):
+    # 可能的视频API端点模板
+    API_ENDPOINT_TEMPLATES = [
+        "/api/file/{file_id}/video",
+        "/api/file/{file_id}/stream",
+        "/api/file/{file_id}/media",
+        "/api/file/{file_id}/play",
+        "/api/file/{file_id}/export/video",
+        "/api/file/{file_id}/generate/video",
+        "/api/chapter/{chapter_id}/video",
+        "/api/chapter/{chapter_id}/stream",
+        "/api/chapter/{chapter_id}/export",
+        "/api/video/{file_id}",
+        "/api/media/{file_id}",
+        "/api/stream/{file_id}",
+        "/api/ppt/{file_id}/video",
+        "/api/courseware/{file_id}/video",
+    ]
+    
+    # find_video_elements只关心这几种标签，解析时只保留它们（及其子元素）
+    VIDEO_ELEMENT_TAGS = ['video', 'source', 'iframe']
+    
+    # JSON中视频URL的最低置信度：只接受videoUrl/streamUrl/downloadUrl等明确字段，
+    # 或者指向视频文件的地址
+    MIN_URL_SCORE = 0.8
+    
+    def __init__(self, download_dir="downloads", uid=None, sid=None, segments=4, http2=False):
         self.download_dir = Path(download_dir)
         self.download_dir.mkdir(exist_ok=True)
         
-        self.session = requests.Session()
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Referer': 'https://metaso.cn/',
-            'Origin': 'https://metaso.cn'
-        }
+        headers = {}
         
         # 如果提供了认证信息，添加Authorization头
         if uid and sid:
@@ -42,7 +68,30 @@ class MetasoVideoDownloader:
             headers['Authorization'] = f'Bearer {token}'
             print(f"🔐 已设置认证信息: {uid[:10]}...")
         
-        self.session.headers.update(headers)
+        # 连接池按探测并发（每主机4个）和分段下载并发留足余量
+        self.session = create_session('page', headers=headers, pool_maxsize=max(32, segments * 8))
+        
+        # 页面HTML和元数据响应的磁盘缓存（探测和分段下载使用Range请求，不经过缓存）
+        self.http_cache = enable_http_cache(self.session)
+        
+        # 可选：API探测请求走HTTP/2，在同一连接上多路复用
+        if http2 and enable_http2(self.session):
+            print("⚡ 已为metaso.cn API请求启用HTTP/2")
+        
+        # 分段并发下载引擎，共享同一会话的连接池和认证信息
+        self.downloader = SegmentedDownloader(self.session, segments=segments)
+        
+        # 批量处理同一文件的多个章节时，同时进行的相同请求（页面、端点探测）只发一次
+        self.flights = SingleFlight()
+        
+        # 并发端点探测器，同一主机最多同时4个请求
+        # 优先尝试上次成功的端点模板，其余按历史统计排序，跳过近期返回401/403/404的端点
+        self.prober = EndpointProber(self.session, max_per_host=4, cache=EndpointCache(),
+                                     registry=EndpointRegistry(), negative_cache=NegativeCache(),
+                                     flights=self.flights)
+        
+        # 视频API通常写在SPA的JS脚本包里，扫描结果按URL/ETag/内容哈希缓存
+        self.bundle_scanner = BundleScanner(self.session, cache=BundleCache())
     
     def parse_url_info(self, url):
         """解析URL中的文件信息"""
@@ -65,52 +114,109 @@ class MetasoVideoDownloader:
         return info
     
     def get_page_content(self, url):
-        """获取页面内容"""
-        try:
-            print(f"📄 正在获取页面内容: {url}")
+        """获取页面内容，同一页面同时只请求和解析一次"""
+        def fetch():
             response = self.session.get(url, timeout=30)
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            return soup, response.text
+            return self.parse_video_elements(response.text), response.text
+        
+        try:
+            print(f"📄 正在获取页面内容: {url}")
+            return self.flights.do(request_key(self.session, url), fetch)
             
         except Exception as e:
             print(f"❌ 获取页面内容失败: {e}")
             return None, None
     
+    def parse_video_elements(self, html):
+        """
+        只解析视频相关标签
+        
+        使用lxml解析器并用SoupStrainer过滤，其余标签不建树，
+        解析书架页面时耗时和内存都远小于完整的html.parser文档树；
+        未安装lxml时退回html.parser
+        """
+        strainer = SoupStrainer(self.VIDEO_ELEMENT_TAGS)
+        try:
+            return BeautifulSoup(html, 'lxml', parse_only=strainer)
+        except FeatureNotFound:
+            return BeautifulSoup(html, 'html.parser', parse_only=strainer)
+    
     def find_video_apis(self, page_content):
-        """在页面内容中查找视频相关的API端点"""
+        """在页面内容中查找视频相关的API端点和视频URL变量"""
         video_apis = []
         
-        # 查找可能的视频API模式 - 使用简化的正则表达式
-        patterns = [
-            r'/api/[^/\s]*/video[^\s"]*',  # 视频API
-            r'/api/[^/\s]*/stream[^\s"]*',  # 流媒体API
-            r'/api/[^/\s]*/media[^\s"]*',   # 媒体API
-            r'/api/[^/\s]*/play[^\s"]*',    # 播放API
-            r'/api/[^/\s]*/export[^\s"]*',  # 导出API
-            r'/api/[^/\s]*/generate[^\s"]*', # 生成API
-            r'videoUrl.*?(["\'])([^"\']*)\1',     # videoUrl变量
-            r'streamUrl.*?(["\'])([^"\']*)\1',    # streamUrl变量
-            r'downloadUrl.*?(["\'])([^"\']*)\1',  # downloadUrl变量
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, page_content, re.IGNORECASE)
-            for match in matches:
-                if isinstance(match, tuple):
-                    # 对于带分组的匹配，取最后一个分组
-                    match = match[-1]
-                
-                if match and not match.startswith('http'):
-                    # 补全URL
-                    full_url = f"https://metaso.cn{match}" if match.startswith('/') else f"https://metaso.cn/{match}"
-                    video_apis.append(full_url)
-                elif match and match.startswith('http'):
-                    video_apis.append(match)
-        
-        # 去重
-        return list(set(video_apis))
+        # 单次扫描同时匹配API路径和videoUrl/streamUrl/downloadUrl赋值
+        for match in scan_page(page_content, kinds=('api', 'assign')):
+            video_apis.append(self.absolute_api_url(match.value))
+        
+        # 去重（保持出现顺序）
+        return list(dict.fromkeys(video_apis))
+    
+    @staticmethod
+    def absolute_api_url(value):
+        """补全页面中找到的相对地址"""
+        if value.startswith('http'):
+            return value
+        return f"https://metaso.cn{value}" if value.startswith('/') else f"https://metaso.cn/{value}"
+    
+    def stream_page(self, url, page):
+        """
+        流式获取页面，边下载边扫描，逐个产出发现的候选URL
+        
+        每段数据到达后立即用增量扫描器查找API路径和视频URL赋值，
+        同时增量解析video/source/iframe标签；发现的线索记录到
+        page['video_apis']和page['video_elements']，页面读完后page['complete']为True；
+        调用方把page['cancelled']设为True后，在下一个数据块处停止读取
+        """
+        print(f"📄 正在流式获取页面内容: {url}")
+        try:
+            response = self.session.get(url, stream=True, timeout=30)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"❌ 获取页面内容失败: {e}")
+            return
+        
+        # 未声明编码时按UTF-8解码（requests对text/html默认ISO-8859-1）
+        content_type = response.headers.get('Content-Type', '').lower()
+        encoding = response.encoding if 'charset' in content_type else 'utf-8'
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        scanner = StreamingPageScanner(kinds=('api', 'assign'))
+        parser = VideoElementParser()
+        
+        def candidates(text, final=False):
+            for match in scanner.feed(text, final):
+                api_url = self.absolute_api_url(match.value)
+                print(f"   - 发现视频API: {api_url}")
+                page['video_apis'].append(api_url)
+                yield api_url
+            for element in parser.feed_elements(text, final):
+                print(f"   - 发现{element['type']}: {element['src']}")
+                page['video_elements'].append(element)
+                yield urljoin(url, element['src'])
+        
+        try:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if page.get('cancelled'):
+                    return
+                yield from candidates(decoder.decode(chunk))
+            yield from candidates(decoder.decode(b'', final=True), final=True)
+            page['complete'] = True
+            
+            # 页面读完后并发扫描其引用的JS脚本包
+            script_urls = [urljoin(url, src) for src in parser.script_urls]
+            if script_urls and not page.get('cancelled'):
+                print(f"   扫描 {len(script_urls)} 个JS脚本包...")
+                for matches in self.bundle_scanner.scan(list(dict.fromkeys(script_urls))).values():
+                    for value in matches:
+                        api_url = self.absolute_api_url(value)
+                        print(f"   - 发现视频API（脚本）: {api_url}")
+                        page['video_apis'].append(api_url)
+                        yield api_url
+        except Exception as e:
+            print(f"❌ 读取页面内容失败: {e}")
+        finally:
+            response.close()
     
     def find_video_elements(self, soup):
         """查找页面中的视频元素"""
@@ -151,111 +257,78 @@ class MetasoVideoDownloader:
         
         return video_elements
     
-    def try_video_api_endpoints(self, file_info):
-        """尝试各种可能的视频API端点"""
+    def try_video_api_endpoints(self, file_info, first_success=True):
+        """
+        并发尝试各种可能的视频API端点
+        
+        Args:
+            file_info: parse_url_info()返回的文件信息
+            first_success: 为True时拿到第一个可用视频源就取消其余请求，
+                为False时等待全部端点返回并收集所有可用视频源
+        """
         file_id = file_info['file_id']
         chapter_id = file_info['chapter_id']
+        resource_type = 'chapter' if chapter_id else (file_info['file_type'] or 'file')
+        
+        print(f"🔍 并发探测 {len(self.API_ENDPOINT_TEMPLATES)} 个API端点模板...")
+        results = self.prober.probe_templates(
+            resource_type, self.API_ENDPOINT_TEMPLATES, self.classify_endpoint_response,
+            base_url="https://metaso.cn", file_id=file_id, chapter_id=chapter_id)
         
-        # 可能的视频API端点
-        api_endpoints = [
-            f"/api/file/{file_id}/video",
-            f"/api/file/{file_id}/stream",
-            f"/api/file/{file_id}/media",
-            f"/api/file/{file_id}/play",
-            f"/api/file/{file_id}/export/video",
-            f"/api/file/{file_id}/generate/video",
-            f"/api/chapter/{chapter_id}/video",
-            f"/api/chapter/{chapter_id}/stream",
-            f"/api/chapter/{chapter_id}/export",
-            f"/api/video/{file_id}",
-            f"/api/media/{file_id}",
-            f"/api/stream/{file_id}",
-            f"/api/ppt/{file_id}/video",
-            f"/api/courseware/{file_id}/video",
-        ]
-        
-        successful_endpoints = []
-        
-        for endpoint in api_endpoints:
-            full_url = f"https://metaso.cn{endpoint}"
+        if first_success:
             try:
-                print(f"🔍 尝试API端点: {endpoint}")
-                response = self.session.get(full_url, timeout=10)
-                
-                print(f"   状态码: {response.status_code}")
-                print(f"   Content-Type: {response.headers.get('content-type', 'unknown')}")
-                
-                if response.status_code == 200:
-                    content_type = response.headers.get('content-type', '')
-                    
-                    # 检查是否是视频文件
-                    if content_type.startswith('video/'):
-                        print(f"✅ 找到视频文件: {endpoint}")
-                        successful_endpoints.append({
-                            'url': full_url,
-                            'content_type': content_type,
-                            'size': response.headers.get('content-length', 'unknown')
-                        })
-                    
-                    # 检查是否是JSON响应
-                    elif content_type.startswith('application/json'):
-                        try:
-                            data = response.json()
-                            print(f"   JSON响应: {json.dumps(data, ensure_ascii=False, indent=2)[:200]}...")
-                            
-                            # 查找JSON中的视频URL
-                            video_url = self.extract_video_url_from_json(data)
-                            if video_url:
-                                print(f"✅ 在JSON中找到视频URL: {video_url}")
-                                successful_endpoints.append({
-                                    'url': video_url,
-                                    'source': 'json_response',
-                                    'api_endpoint': full_url
-                                })
-                        except:
-                            pass
-                    
-                    # 检查响应内容长度
-                    elif len(response.content) > 1000:  # 可能是视频文件
-                        print(f"⚠️ 大文件响应，可能是视频: {len(response.content)} bytes")
-                        successful_endpoints.append({
-                            'url': full_url,
-                            'content_type': content_type,
-                            'size': len(response.content)
-                        })
+                result = next(results, None)
+            finally:
+                results.close()
+            return [result] if result else []
+        
+        return list(results)
+    
+    def classify_endpoint_response(self, full_url, response):
+        """根据探测响应（开头4KB）判断端点是否提供了视频，返回视频源信息或None"""
+        endpoint = full_url.replace("https://metaso.cn", "", 1)
+        print(f"   {endpoint} 状态码: {response.status_code}, "
+              f"Content-Type: {response.headers.get('content-type', 'unknown')}")
+        
+        if response.status_code in (200, 206):
+            content_type = response.content_type
+            
+            # 检查是否是视频文件（Content-Type或文件头）
+            if content_type.startswith('video/') or is_video_kind(response.kind):
+                print(f"✅ 找到视频文件: {endpoint} ({response.kind or content_type})")
+                return {
+                    'url': full_url,
+                    'content_type': content_type,
+                    'size': response.total_size or 'unknown'
+                }
+            
+            # 检查是否是JSON响应
+            elif content_type.startswith('application/json') or response.kind == 'json':
+                print(f"   JSON响应: {response.preview(200)}")
                 
-                elif response.status_code == 401:
-                    print(f"   需要认证")
-                elif response.status_code == 403:
-                    print(f"   权限不足")
-                elif response.status_code == 404:
-                    print(f"   端点不存在")
-                else:
-                    print(f"   其他错误: {response.status_code}")
-                    
-            except Exception as e:
-                print(f"   请求失败: {e}")
+                # 流式查找JSON中的视频URL，找到可信候选即停止读取
+                best = response.scan_video_urls()['best']
+                if best and best['score'] >= self.MIN_URL_SCORE:
+                    video_url = best['url']
+                    print(f"✅ 在JSON中找到视频URL: {video_url}")
+                    return {
+                        'url': video_url,
+                        'source': 'json_response',
+                        'api_endpoint': full_url
+                    }
             
-            time.sleep(0.5)  # 避免请求过于频繁
+            else:
+                print(f"   未识别的内容: {response.head[:50]!r}")
+        
+        elif response.status_code == 401:
+            print(f"   {endpoint} 需要认证")
+        elif response.status_code == 403:
+            print(f"   {endpoint} 权限不足")
+        elif response.status_code == 404:
+            print(f"   {endpoint} 端点不存在")
+        else:
+            print(f"   {endpoint} 其他错误: {response.status_code}")
         
-        return successful_endpoints
-    
-    def extract_video_url_from_json(self, data):
-        """从JSON数据中提取视频URL"""
-        if isinstance(data, dict):
-            for key, value in data.items():
-                if key.lower() in ['video_url', 'videourl', 'stream_url', 'streamurl', 'media_url', 'mediaurl', 'download_url', 'downloadurl']:
-                    if isinstance(value, str) and (value.startswith('http') or value.startswith('/')):
-                        return value
-                elif isinstance(value, (dict, list)):
-                    result = self.extract_video_url_from_json(value)
-                    if result:
-                        return result
-        elif isinstance(data, list):
-            for item in data:
-                result = self.extract_video_url_from_json(item)
-                if result:
-                    return result
         return None
     
     def download_video(self, video_url, filename):
@@ -264,49 +337,48 @@ class MetasoVideoDownloader:
             print(f"📥 开始下载视频: {filename}")
             print(f"   URL: {video_url}")
             
-            response = self.session.get(video_url, stream=True, timeout=60)
-            response.raise_for_status()
+            info = self.downloader.probe(video_url)
+            if info['status_code'] not in (200, 206):
+                print(f"❌ 下载失败，状态码: {info['status_code']}")
+                self.downloader.release(info)
+                return False
             
             # 检查内容类型
-            content_type = response.headers.get('content-type', '')
+            content_type = info['content_type']
             print(f"   Content-Type: {content_type}")
             
             # 检查文件大小
-            total_size = int(response.headers.get('content-length', 0))
-            print(f"   文件大小: {total_size} bytes ({total_size / 1024 / 1024:.2f} MB)")
+            total_size = info['total_size']
+            if total_size:
+                print(f"   文件大小: {total_size} bytes ({total_size / 1024 / 1024:.2f} MB)")
+            else:
+                print("   文件大小: 未知")
             
-            if total_size < 1000:  # 文件太小，可能是错误信息
-                content = response.content.decode('utf-8', errors='ignore')
-                print(f"   响应内容: {content}")
+            # 大小已知且很小，可能是错误信息；大小为0表示未知（分块传输），照常下载
+            if 0 < total_size < 1000:
+                # 直接读取探测响应，不再发第二个请求
+                response = info.get('response')
+                if response is not None:
+                    content = next(response.iter_content(1000), b'').decode('utf-8', errors='ignore')
+                    print(f"   响应内容: {content}")
+                self.downloader.release(info)
                 return False
             
             filepath = self.download_dir / filename
-            downloaded_size = 0
             
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        
-                        if total_size > 0:
-                            progress = (downloaded_size / total_size) * 100
-                            print(f"\r   下载进度: {progress:.1f}%", end='', flush=True)
+            if not self.downloader.download(video_url, filepath, info=info):
+                print(f"❌ 下载失败: {filepath}")
+                return False
             
-            print(f"\n✅ 视频下载完成: {filepath}")
+            print(f"✅ 视频下载完成: {filepath}")
             return True
             
         except Exception as e:
             print(f"❌ 下载失败: {e}")
             return False
     
-    def download_from_url(self, url):
-        """从Metaso URL下载视频"""
-        print("=" * 80)
-        print("🎬 Metaso视频下载器")
-        print("=" * 80)
-        
-        # 解析URL信息
+    def describe_url(self, url):
+        """解析并打印URL中的文件信息，无法提取文件ID时返回None"""
         file_info = self.parse_url_info(url)
         print(f"\n📋 文件信息:")
         for key, value in file_info.items():
@@ -315,16 +387,26 @@ class MetasoVideoDownloader:
         
         if not file_info['file_id']:
             print("❌ 无法从URL中提取文件ID")
-            return False
+            return None
+        return file_info
+    
+    def resolve(self, url):
+        """解析URL并分析页面，返回文件信息和页面中发现的视频线索"""
+        # 解析URL信息
+        file_info = self.describe_url(url)
+        if not file_info:
+            return None
         
         # 获取页面内容
         soup, page_content = self.get_page_content(url)
-        if not soup:
-            return False
+        if soup is None:
+            return None
         
         # 查找页面中的视频API
         print(f"\n🔍 查找视频API端点...")
         video_apis = self.find_video_apis(page_content)
+        bundle_apis = self.bundle_scanner.find_video_apis(page_content, url)
+        video_apis = list(dict.fromkeys(video_apis + [self.absolute_api_url(api) for api in bundle_apis]))
         if video_apis:
             print(f"   找到 {len(video_apis)} 个可能的视频API:")
             for api in video_apis:
@@ -338,27 +420,98 @@ class MetasoVideoDownloader:
             for element in video_elements:
                 print(f"   - {element['type']}: {element['src']}")
         
-        # 尝试各种API端点
-        print(f"\n🚀 尝试视频API端点...")
-        successful_endpoints = self.try_video_api_endpoints(file_info)
-        
-        if successful_endpoints:
-            print(f"\n✅ 找到 {len(successful_endpoints)} 个可用的视频源:")
-            for i, endpoint in enumerate(successful_endpoints):
-                print(f"   {i+1}. {endpoint['url']}")
-                if 'content_type' in endpoint:
-                    print(f"      类型: {endpoint['content_type']}")
-                if 'size' in endpoint:
-                    print(f"      大小: {endpoint['size']}")
-                
-                # 尝试下载第一个找到的视频
-                if i == 0:
-                    filename = f"{file_info['title']}.mp4" if file_info['title'] else f"video_{file_info['file_id']}.mp4"
-                    filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-                    
-                    success = self.download_video(endpoint['url'], filename)
-                    if success:
-                        return True
+        return {
+            'file_info': file_info,
+            'video_apis': video_apis,
+            'video_elements': video_elements,
+        }
+    
+    def resolve_streaming(self, url, first_success=True):
+        """
+        流式解析：边下载页面边把发现的视频API和视频元素交给探测器，
+        探测与页面传输同时进行，慢速页面上能更早拿到第一个候选
+        
+        Returns:
+            dict: 与resolve()相同的字段，另有endpoints（页面线索中探测成功的视频源）
+        """
+        file_info = self.describe_url(url)
+        if not file_info:
+            return None
+        
+        print(f"\n🔍 边下载页面边探测视频线索...")
+        page = {'video_apis': [], 'video_elements': [], 'complete': False, 'cancelled': False}
+        results = self.prober.probe_stream(self.stream_page(url, page), self.classify_endpoint_response)
+        endpoints = []
+        try:
+            for result in results:
+                endpoints.append(result)
+                if first_success:
+                    break
+        finally:
+            # 已拿到结果时不再读取页面剩余部分
+            page['cancelled'] = True
+            results.close()
+        
+        return {
+            'file_info': file_info,
+            'video_apis': list(page['video_apis']),
+            'video_elements': list(page['video_elements']),
+            'endpoints': endpoints,
+        }
+    
+    def video_filename(self, file_info):
+        """
+        根据文件信息生成安全的视频文件名
+
+        同一书架文件的各章节标题和file_id相同，文件名中加上chapter_id，
+        并发下载时各章节写入各自的 .part 文件
+        """
+        name = file_info['title'] or f"video_{file_info['file_id']}"
+        if file_info.get('chapter_id'):
+            name = f"{name}_{file_info['chapter_id']}"
+        return re.sub(r'[<>:"/\\|?*]', '_', f"{name}.mp4")
+    
+    def download_endpoints(self, file_info, successful_endpoints):
+        """列出可用的视频源并下载第一个"""
+        print(f"\n✅ 找到 {len(successful_endpoints)} 个可用的视频源:")
+        for i, endpoint in enumerate(successful_endpoints):
+            print(f"   {i+1}. {endpoint['url']}")
+            if 'content_type' in endpoint:
+                print(f"      类型: {endpoint['content_type']}")
+            if 'size' in endpoint:
+                print(f"      大小: {endpoint['size']}")
+        
+        # 尝试下载第一个找到的视频
+        return self.download_video(successful_endpoints[0]['url'], self.video_filename(file_info))
+    
+    def download_from_url(self, url, streaming=False):
+        """
+        从Metaso URL下载视频
+        
+        Args:
+            url: Metaso页面URL
+            streaming: 为True时边下载页面边探测页面中发现的线索，
+                都不可用时再尝试API端点模板
+        """
+        print("=" * 80)
+        print("🎬 Metaso视频下载器")
+        print("=" * 80)
+        
+        if streaming:
+            resolved = self.resolve_streaming(url)
+        else:
+            resolved = self.resolve(url)
+        if not resolved:
+            return False
+        
+        successful_endpoints = resolved.get('endpoints')
+        if not successful_endpoints:
+            # 尝试各种API端点
+            print(f"\n🚀 尝试视频API端点...")
+            successful_endpoints = self.try_video_api_endpoints(resolved['file_info'])
+        
+        if successful_endpoints and self.download_endpoints(resolved['file_info'], successful_endpoints):
+            return True
         
         print("\n❌ 未找到可下载的视频文件")
         print("\n💡 建议:")
@@ -374,12 +527,28 @@ def main():
     # 解析命令行参数
     uid = None
     sid = None
+    batch_file = None
+    concurrency = 8
+    streaming = False
+    http2 = False
     
     for arg in sys.argv[1:]:
         if arg.startswith('--uid='):
             uid = arg.split('=', 1)[1]
         elif arg.startswith('--sid='):
             sid = arg.split('=', 1)[1]
+        elif arg.startswith('--batch='):
+            batch_file = arg.split('=', 1)[1]
+        elif arg.startswith('--concurrency='):
+            concurrency = int(arg.split('=', 1)[1])
+        elif arg == '--stream':
+            streaming = True
+        elif arg == '--http2':
+            http2 = True
+        elif arg == '--endpoint-stats':
+            # 只查看各端点模板的历史统计
+            EndpointRegistry().print_stats()
+            return
     
     # 用户提供的URL
     target_url = "https://metaso.cn/bookshelf?displayUrl=%2Fapi%2Ffile%2F8651522172447916032%2Fpreview&url=%2Fapi%2Ffile%2F8651522172447916032%2Fpreview&page=1&totalPage=44&file_path=&_id=8651522172447916032&title=%E3%80%90%E8%AF%BE%E4%BB%B6%E3%80%91%E7%AC%AC1%E7%AB%A0_%E5%A4%A7%E8%AF%AD%E8%A8%80%E6%A8%A1%E5%9E%8B%E6%A6%82%E8%BF%B0.pptx&snippet=undefined&sessionId=null&tag=%E6%9C%AC%E5%9C%B0%E6%96%87%E4%BB%B6%E4%B8%8A%E4%BC%A0%E5%88%B0%E4%B9%A6%E6%9E%B6%E4%B8%93%E7%94%A8%E4%B8%93%E9%A2%98654ce6f986a91de24c79b52f&author=&publishDate=undefined&showFront=false&downloadUrl=%2Fapi%2Ffile%2F8651522172447916032%2Fdownload&previewUrl=%2Fapi%2Ffile%2F8651522172447916032%2Fpreview&internalFile=true&topicId=undefined&type=pptx&readMode=false&chapterId=8651523279591608320&level=3&scene=%E9%BB%98%E8%AE%A4&voiceLanguage=cn&pptLanguage=cn&ttsTimbre=uk_woman16&voiceSpeed=100&showCaptions=true"
@@ -388,14 +557,45 @@ def main():
     print("🎬 Metaso视频下载器 (带认证支持)")
     print("="*80)
     
+    # 命令行提供的uid/sid保存下来，下次运行不必再输入
+    credentials = CredentialStore(profile='metaso_video_downloader')
+    if uid and sid:
+        credentials.save_token(uid, sid)
+    
+    downloader = MetasoVideoDownloader(uid=uid, sid=sid, http2=http2)
+    
+    if not (uid and sid):
+        # 保存的uid/sid先用一个请求验证，服务器明确返回未登录时清除
+        file_id = downloader.parse_url_info(target_url)['file_id']
+        check_url = f"https://metaso.cn/api/file/{file_id}/download"
+        if credentials.restore(downloader.session, lambda session: check_login(session, check_url)):
+            uid, sid = credentials.token()
+            if uid and sid:
+                print("🔐 使用已保存的认证信息")
+    
     if uid and sid:
         print(f"🔐 使用认证信息: UID={uid[:10]}..., SID={sid[:10]}...")
     else:
         print("⚠️ 未提供认证信息，将尝试无认证下载")
         print("💡 如需认证，请使用: python metaso_video_downloader.py --uid=你的uid --sid=你的sid")
+    print("💡 批量下载: python metaso_video_downloader.py --batch=urls.txt [--concurrency=8]")
+    print("💡 端点统计: python metaso_video_downloader.py --endpoint-stats")
+    print("💡 流式模式（边下载页面边探测）: python metaso_video_downloader.py --stream")
+    print("💡 HTTP/2探测（需安装httpx[http2]）: python metaso_video_downloader.py --http2")
+    
+    if batch_file:
+        # 批量模式：文件中每行一个URL
+        from batch_download_engine import AsyncBatchDownloader
+        
+        with open(batch_file, 'r', encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        print(f"📦 批量模式: {len(urls)} 个URL，下载并发 {concurrency}")
+        
+        batch = AsyncBatchDownloader(downloader, download_concurrency=concurrency)
+        batch.run_batch(urls)
+        return
     
-    downloader = MetasoVideoDownloader(uid=uid, sid=sid)
-    downloader.download_from_url(target_url)
+    downloader.download_from_url(target_url, streaming=streaming)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台网络捕获
+后台线程持续读取浏览器性能日志，不等页面加载结束；URL或MIME类型匹配关键词的响应
+放入队列，下载器在等待页面时就可以取出处理
+
+日志先按原始字符串过滤，只有匹配的响应才做JSON解析（见 browser_waits.NetworkActivity）
+
+注意：ChromeDriver按顺序执行同一会话的命令，driver.get()阻塞期间读不到日志，
+精简模式使用eager页面加载策略以便尽早开始读取
+"""
+
+import queue
+import threading
+
+from browser_waits import NetworkActivity
+
+# 默认捕获的响应：视频文件、流媒体清单和接口请求
+DEFAULT_CAPTURE_KEYWORDS = ['video', '.mp4', '.m3u8', 'stream', 'media', 'download', 'export', '/api/']
+
+
+def is_video_response(response):
+    """响应本身是否是视频文件"""
+    content_type = response['mime_type'] or response['content_type']
+    return content_type.startswith('video/') or response['url'].split('?', 1)[0].endswith(('.mp4', '.m3u8'))
+
+
+class NetworkCapture(NetworkActivity):
+    """在后台线程中读取性能日志的NetworkActivity，匹配的响应同时放入队列"""
+
+    def __init__(self, driver, keywords=None, interval=0.2):
+        """
+        Args:
+            driver: Chrome WebDriver
+            keywords: 捕获URL或MIME类型包含这些小写子串的响应，默认 DEFAULT_CAPTURE_KEYWORDS
+            interval: 读取日志的间隔（秒）
+        """
+        super().__init__(driver, response_keywords=keywords or DEFAULT_CAPTURE_KEYWORDS)
+        self.interval = interval
+        self.queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _add_response(self, response):
+        super()._add_response(response)
+        self.queue.put(response)
+
+    def start(self):
+        """启动后台读取线程"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='network-capture', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ 读取网络日志失败: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        """停止后台线程，并读取最后一批日志"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.poll()
+
+    def refresh(self):
+        # 后台线程运行时状态由它更新
+        if self._thread is None:
+            self.poll()
+
+    def get(self, timeout=None):
+        """
+        取出下一个捕获的响应
+
+        Args:
+            timeout: 最长等待时间（秒），为0时不等待
+
+        Returns:
+            dict: 响应信息，超时返回None
+        """
+        try:
+            if timeout == 0:
+                return self.queue.get_nowait()
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def pending(self):
+        """取出队列中当前所有的响应"""
+        responses = []
+        while True:
+            response = self.get(0)
+            if response is None:
+                return responses
+            responses.append(response)
+
+    def discard(self):
+        """丢弃已捕获的响应（例如租用的浏览器中上一个页面留下的）"""
+        self.drain()
+        self.pending()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面视频线索扫描器
+把原来分散的多个正则合并成一个预编译的扫描器，对页面文本只扫描一遍，
+同时找出API路径、videoUrl/streamUrl/downloadUrl赋值、带视频扩展名的URL
+和地址中含video/stream/media/download的绝对URL，返回带类型的匹配结果
+
+扫描分两步：先用一个只含字面量的交替模式在小写文本上定位线索
+（/api/、变量名、视频扩展名、http(s)://），再在每个线索附近用锚定的模式取出完整的值。
+字面量交替可以走正则引擎的快速路径，不会像带IGNORECASE的复杂模式那样逐字符回溯
+"""
+
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+
+# kind: 'api'（API路径）、'assign'（视频URL变量赋值）、'media'（视频文件URL）、
+#       'link'（地址中含视频关键词的其他绝对URL）
+# name: assign类型的变量名，其他类型为None
+# start/end: 匹配在文本中的起止位置
+PageMatch = namedtuple('PageMatch', ['kind', 'value', 'name', 'start', 'end'])
+
+MATCH_KINDS = ('api', 'assign', 'media', 'link')
+
+MEDIA_EXTENSIONS = ('mp4', 'm3u8', 'webm', 'flv', 'mov', 'avi', 'wmv', 'm4v')
+
+# 第一步：在小写文本上定位线索
+# 不使用捕获组（捕获组会让正则引擎放弃字面量前缀优化），按首字符判断线索类型
+TRIGGER_PATTERN = re.compile(
+    r'/api/|videourl|streamurl|downloadurl|playurl|https?://'
+    r'|\.(?:' + '|'.join(MEDIA_EXTENSIONS) + r')(?!\w)'
+)
+_TRIGGER_KINDS = {'/': 'api', '.': 'media', 'h': 'link'}
+
+# 文本小写后长度改变（极少数Unicode字符）时，退回原文上的忽略大小写匹配
+_TRIGGER_PATTERN_IGNORECASE = re.compile(TRIGGER_PATTERN.pattern, re.IGNORECASE)
+
+# 第二步：在线索处取出完整的值
+_URL_CHARS = r'''[^\s"'<>\\]'''
+_API_PATTERN = re.compile(
+    r'/api/(?:[^/\s"\'<>\\]*/){1,3}?(?:video|stream|media|play|export|generate)' + _URL_CHARS + '*',
+    re.IGNORECASE)
+_HOST_PREFIX = re.compile(r'https?://[^/\s"\'<>\\]+$', re.IGNORECASE)
+_ASSIGN_PATTERN = re.compile(
+    r'(?P<name>videoUrl|streamUrl|downloadUrl|playUrl)["\']?\s*[:=]\s*(?P<quote>["\'])(?P<value>[^"\'\n]*)(?P=quote)',
+    re.IGNORECASE)
+_QUERY_PATTERN = re.compile(r'\?' + _URL_CHARS + '*')
+_DELIMITER = re.compile(r'''[\s"'<>\\]''')
+_LINK_PATTERN = re.compile(r'https?://' + _URL_CHARS + '+', re.IGNORECASE)
+_LINK_KEYWORDS = ('video', 'stream', 'media', 'download')
+_MEDIA_IN_URL = re.compile(r'\.(?:' + '|'.join(MEDIA_EXTENSIONS) + r')(?!\w)', re.IGNORECASE)
+_FILENAME_CHARS = re.compile(r'[\w.-]+$')
+
+# 向前查找URL起点的最大距离
+_MAX_URL_LENGTH = 2048
+
+
+def _expand_api(text, pos):
+    """取出以pos处 /api/ 开头的API路径，前面紧跟主机名时一并取出"""
+    match = _API_PATTERN.match(text, pos)
+    if not match:
+        return None, pos
+    host = _HOST_PREFIX.search(text, max(0, pos - 256), pos)
+    start = host.start() if host else pos
+    return text[start:match.end()], match.end()
+
+
+def _expand_assign(text, pos):
+    """取出以pos处变量名开头的赋值"""
+    match = _ASSIGN_PATTERN.match(text, pos)
+    if not match:
+        return None, None, pos
+    return match.group('value'), match.group('name'), match.end()
+
+
+def _expand_media(text, pos, end):
+    """以pos处的扩展名为终点向前找出完整的视频URL"""
+    window_start = max(0, pos - _MAX_URL_LENGTH)
+    delimiter = _DELIMITER.search(text[window_start:pos][::-1])
+    token_start = pos - delimiter.start() if delimiter else window_start
+
+    token = text[token_start:pos]
+    if not token.lower().startswith(('http://', 'https://')):
+        # 与原来的模式一致：相对地址从第一个斜杠开始，没有斜杠时取文件名
+        slash = token.find('/')
+        if slash >= 0:
+            token_start += slash
+        else:
+            filename = _FILENAME_CHARS.search(token)
+            if not filename:
+                return None, None, end
+            token_start += filename.start()
+
+    query = _QUERY_PATTERN.match(text, end)
+    if query:
+        end = query.end()
+    return text[token_start:end], token_start, end
+
+
+def _expand_link(text, pos):
+    """
+    取出以pos处 http(s):// 开头、地址中含视频关键词的URL
+
+    含视频扩展名或可识别的API路径的URL留给media/api线索处理
+    """
+    match = _LINK_PATTERN.match(text, pos)
+    if not match:
+        return None, pos
+    value = match.group()
+    lowered = value.lower()
+    if _MEDIA_IN_URL.search(value):
+        return None, pos
+    api = lowered.find('/api/')
+    if api >= 0 and _API_PATTERN.match(text, pos + api):
+        return None, pos
+    if not any(keyword in lowered for keyword in _LINK_KEYWORDS):
+        return None, pos
+    return value, match.end()
+
+
+def iter_page_matches(text, kinds=MATCH_KINDS):
+    """
+    扫描页面文本，逐个产出匹配
+
+    Args:
+        text: 页面HTML或脚本文本
+        kinds: 需要的匹配类型
+
+    Yields:
+        PageMatch
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        triggers = TRIGGER_PATTERN.finditer(lowered)
+    else:
+        triggers = _TRIGGER_PATTERN_IGNORECASE.finditer(text)
+
+    # 已输出匹配的结束位置，落在其中的线索不再重复处理
+    covered = 0
+    for trigger in triggers:
+        kind = _TRIGGER_KINDS.get(trigger.group()[0], 'assign')
+        pos = trigger.start()
+        if pos < covered or kind not in kinds:
+            continue
+
+        name = None
+        start = pos
+        if kind == 'api':
+            value, end = _expand_api(text, pos)
+            if value and value[0] != '/':
+                start = end - len(value)
+        elif kind == 'assign':
+            value, name, end = _expand_assign(text, pos)
+        elif kind == 'link':
+            value, end = _expand_link(text, pos)
+        else:
+            value, start, end = _expand_media(text, pos, trigger.end())
+            if start is not None and start < covered:
+                continue
+
+        if value:
+            covered = end
+            yield PageMatch(kind, value, name, start, end)
+
+
+def scan_page(text, kinds=MATCH_KINDS):
+    """扫描页面文本，返回去重后的匹配列表（保持出现顺序）"""
+    seen = set()
+    results = []
+    for match in iter_page_matches(text, kinds):
+        key = (match.kind, match.value)
+        if key not in seen:
+            seen.add(key)
+            results.append(match)
+    return results
+
+
+class StreamingPageScanner:
+    """
+    增量页面扫描器
+
+    页面边下载边输入，每段数据到达后立即扫描；
+    末尾OVERLAP个字符留到下一段一起扫描，跨越数据块边界的匹配不会被截断
+    """
+
+    # 保留的末尾字符数，需要大于单个匹配的最大长度
+    OVERLAP = 4096
+
+    def __init__(self, kinds=MATCH_KINDS):
+        self.kinds = kinds
+        self._buffer = ''
+        # _buffer[0]在整个页面中的位置
+        self._offset = 0
+        # 已输出匹配覆盖到的位置
+        self._scanned = 0
+        self._seen = set()
+
+    def feed(self, text, final=False):
+        """
+        输入一段页面文本，返回新发现的匹配（位置为整个页面中的位置）
+
+        Args:
+            text: 新到达的文本
+            final: 是否是最后一段
+        """
+        self._buffer += text
+        safe = len(self._buffer) if final else len(self._buffer) - self.OVERLAP
+        if safe <= 0:
+            return []
+
+        found = []
+        keep = safe
+        for match in iter_page_matches(self._buffer, self.kinds):
+            if self._offset + match.start < self._scanned:
+                continue
+            if match.end > safe:
+                # 匹配可能被截断，连同它的起点一起留到下一段
+                keep = min(keep, match.start)
+                break
+            self._scanned = self._offset + match.end
+            if (match.kind, match.value) not in self._seen:
+                self._seen.add((match.kind, match.value))
+                found.append(match._replace(start=self._offset + match.start, end=self._scanned))
+
+        self._buffer = self._buffer[keep:]
+        self._offset += keep
+        return found
+
+
+class VideoElementParser(HTMLParser):
+    """
+    增量解析video/source/iframe标签
+
+    输出与MetasoVideoDownloader.find_video_elements相同格式的元素，
+    可以在页面下载过程中逐段输入
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._video_depth = 0
+        self._found = []
+        # 页面引用的 <script src> 地址，供扫描JS脚本包
+        self.script_urls = []
+
+    def handle_starttag(self, tag, attrs):
+        attributes = {name: value or '' for name, value in attrs}
+        src = attributes.get('src')
+
+        if tag == 'video':
+            self._video_depth += 1
+            if src:
+                self._found.append({'type': 'video_tag', 'src': src, 'attributes': attributes})
+        elif tag == 'source' and self._video_depth and src:
+            self._found.append({'type': 'source_tag', 'src': src, 'attributes': attributes})
+        elif tag == 'iframe' and src and any(word in src.lower() for word in ('video', 'stream', 'play')):
+            self._found.append({'type': 'iframe', 'src': src, 'attributes': attributes})
+        elif tag == 'script' and src:
+            self.script_urls.append(src)
+
+    def handle_endtag(self, tag):
+        if tag == 'video' and self._video_depth:
+            self._video_depth -= 1
+
+    def feed_elements(self, text, final=False):
+        """输入一段页面文本，返回新发现的视频元素"""
+        self.feed(text)
+        if final:
+            self.close()
+        found, self._found = self._found, []
+        return found
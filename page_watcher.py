@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面状态监视
+在页面中注入监视脚本：MutationObserver监视DOM变化，同时包装fetch和XMLHttpRequest，
+页面出现<video>、下载链接、错误信息或视频文件响应时立即记录结果
+
+Python端用一次execute_async_script等待结果，不再轮询查找元素、读取page_source
+
+注意：ChromeDriver按顺序执行同一会话的命令，异步脚本等待期间其他命令（包括后台读取网络日志）
+都会排队，所以每次只等待一小段时间
+"""
+
+import json
+
+from selenium.common.exceptions import WebDriverException
+
+_WATCHER_SCRIPT = """
+(function (config) {
+    if (window.__metasoWatcher) return;
+    var watcher = window.__metasoWatcher = {state: null, callbacks: []};
+
+    function signal(state) {
+        if (watcher.state) return;
+        watcher.state = state;
+        var callbacks = watcher.callbacks;
+        watcher.callbacks = [];
+        callbacks.forEach(function (callback) { callback(state); });
+    }
+
+    function check() {
+        if (watcher.state || !document.documentElement) return;
+        if (document.querySelector('video')) return signal({type: 'video'});
+        for (var i = 0; i < config.selectors.length; i++) {
+            if (document.querySelector(config.selectors[i])) {
+                return signal({type: 'download', selector: config.selectors[i]});
+            }
+        }
+        var text = document.body ? (document.body.innerText || '').toLowerCase() : '';
+        for (var j = 0; j < config.errors.length; j++) {
+            if (text.indexOf(config.errors[j]) !== -1) return signal({type: 'error', text: config.errors[j]});
+        }
+    }
+    watcher.check = check;
+
+    // 连续的DOM变化合并为一次检查
+    var scheduled = false;
+    function scheduleCheck() {
+        if (scheduled || watcher.state) return;
+        scheduled = true;
+        setTimeout(function () { scheduled = false; check(); }, config.debounce);
+    }
+
+    new MutationObserver(scheduleCheck).observe(document, {
+        childList: true, subtree: true, characterData: true,
+        attributes: true, attributeFilter: ['href', 'src', 'class', 'data-action']
+    });
+
+    function onResponse(url, status, contentType) {
+        contentType = contentType || '';
+        if (contentType.indexOf('video/') === 0 || /\\.(mp4|m3u8)(\\?|$)/i.test(url || '')) {
+            signal({type: 'network', url: url, status: status, content_type: contentType});
+        } else {
+            // 接口返回后页面通常会更新，提前检查一次
+            scheduleCheck();
+        }
+    }
+
+    if (window.fetch) {
+        var originalFetch = window.fetch;
+        window.fetch = function () {
+            return originalFetch.apply(this, arguments).then(function (response) {
+                try { onResponse(response.url, response.status, response.headers.get('content-type')); } catch (e) {}
+                return response;
+            });
+        };
+    }
+
+    var originalOpen = XMLHttpRequest.prototype.open;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        this.addEventListener('loadend', function () {
+            try { onResponse(this.responseURL || String(url), this.status, this.getResponseHeader('content-type')); } catch (e) {}
+        });
+        return originalOpen.apply(this, arguments);
+    };
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', check);
+    } else {
+        check();
+    }
+})(%s);
+"""
+
+_WAIT_SCRIPT = """
+var timeout = arguments[0];
+var done = arguments[arguments.length - 1];
+var watcher = window.__metasoWatcher;
+if (!watcher) return done({type: 'missing'});
+watcher.check();
+if (watcher.state) return done(watcher.state);
+
+var callback = function (state) { clearTimeout(timer); done(state); };
+var timer = setTimeout(function () {
+    var index = watcher.callbacks.indexOf(callback);
+    if (index !== -1) watcher.callbacks.splice(index, 1);
+    done(null);
+}, timeout);
+watcher.callbacks.push(callback);
+"""
+
+
+class PageWatcher:
+    """注入页面的视频生成状态监视器"""
+
+    def __init__(self, driver, download_selectors, error_texts, debounce_ms=100):
+        """
+        Args:
+            driver: Chrome WebDriver
+            download_selectors: 出现即表示视频可下载的CSS选择器
+            error_texts: 页面文本中出现即表示生成失败的关键词（小写）
+            debounce_ms: 合并DOM变化的时间窗口（毫秒）
+        """
+        self.driver = driver
+        self.script = _WATCHER_SCRIPT % json.dumps({
+            'selectors': list(download_selectors),
+            'errors': [text.lower() for text in error_texts],
+            'debounce': debounce_ms,
+        }, ensure_ascii=False)
+        self._script_id = None
+
+    def register(self):
+        """
+        让之后打开的每个页面在页面脚本之前加载监视脚本，最早的fetch/XHR也能被记录
+
+        Returns:
+            bool: 是否注册成功（非Chrome浏览器不支持CDP，等待时再注入）
+        """
+        try:
+            result = self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': self.script})
+            self._script_id = result.get('identifier')
+            return True
+        except Exception:
+            return False
+
+    def unregister(self):
+        """取消注册（租用的浏览器归还前调用）"""
+        if self._script_id is None:
+            return
+        try:
+            self.driver.execute_cdp_cmd('Page.removeScriptToEvaluateOnNewDocument', {'identifier': self._script_id})
+        except Exception:
+            pass
+        self._script_id = None
+
+    def install(self):
+        """在当前页面注入监视脚本（已注入时不重复）"""
+        self.driver.execute_script(self.script)
+
+    def wait(self, timeout):
+        """
+        等待页面出现视频、下载链接、错误信息或视频响应
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            dict: {'type': 'video'|'download'|'error'|'network', ...}，超时或页面跳转时返回None
+        """
+        self.driver.set_script_timeout(timeout + 5)
+        try:
+            state = self.driver.execute_async_script(_WAIT_SCRIPT, int(timeout * 1000))
+            if state and state.get('type') == 'missing':
+                self.install()
+                state = self.driver.execute_async_script(_WAIT_SCRIPT, int(timeout * 1000))
+        except WebDriverException as e:
+            # 页面跳转会中断等待，新页面在下次等待时重新检查
+            if 'unload' in str(e).lower():
+                return None
+            raise
+        return state
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段并发下载引擎
+探测服务器是否支持Range请求，支持时按字节区间并发下载，
+每个分段直接写入预分配输出文件的对应偏移处；不支持时退回单连接流式下载
+
+下载过程中数据写入 <文件名>.part，已完成的字节区间和服务器的ETag/Last-Modified
+记录在 <文件名>.part.json 中；中断后重新运行只补齐缺失区间（Range + If-Range），
+全部完成后原子重命名为最终文件
+
+分段连接中断、超时或返回429/5xx时，从已写入的位置重新请求剩余区间（指数退避，
+遵循Retry-After），不会重新下载整个分段
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_retry import RETRY_STATUS_CODES, backoff_delay, parse_retry_after
+
+
+class DownloadState:
+    """断点续传状态，保存在.part文件旁边的JSON中"""
+
+    def __init__(self, path, url='', total_size=0, etag='', last_modified=''):
+        self.path = str(path)
+        self.url = url
+        self.total_size = total_size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.completed = []  # 已完成的闭区间 [start, end]，保持有序且不重叠
+
+    @classmethod
+    def load(cls, path):
+        """读取状态文件，不存在或损坏时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        state = cls(path, data.get('url', ''), data.get('total_size', 0),
+                    data.get('etag', ''), data.get('last_modified', ''))
+        for start, end in data.get('completed', []):
+            state.add(start, end)
+        return state
+
+    @property
+    def validator(self):
+        """用于If-Range的校验值，优先使用强ETag"""
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+        return self.last_modified
+
+    def matches(self, info):
+        """判断状态是否对应服务器上的同一个文件版本"""
+        if self.total_size != info['total_size']:
+            return False
+        if self.etag or info['etag']:
+            return self.etag == info['etag']
+        return bool(self.last_modified) and self.last_modified == info['last_modified']
+
+    def add(self, start, end):
+        """记录一个已完成的区间，并与相邻区间合并"""
+        if end < start:
+            return
+        merged = []
+        for s, e in self.completed:
+            if e + 1 < start or s > end + 1:
+                merged.append([s, e])
+            else:
+                start, end = min(s, start), max(e, end)
+        merged.append([start, end])
+        merged.sort()
+        self.completed = merged
+
+    def completed_bytes(self):
+        """已完成的字节数"""
+        return sum(e - s + 1 for s, e in self.completed)
+
+    def missing(self):
+        """返回尚未下载的区间列表"""
+        gaps = []
+        position = 0
+        for s, e in self.completed:
+            if s > position:
+                gaps.append((position, s - 1))
+            position = max(position, e + 1)
+        if position < self.total_size:
+            gaps.append((position, self.total_size - 1))
+        return gaps
+
+    def save(self):
+        """原子写入状态文件"""
+        data = {
+            'url': self.url,
+            'total_size': self.total_size,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'completed': self.completed,
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """删除状态文件"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SegmentedDownloader:
+    """基于requests会话的多连接分段下载器"""
+
+    def __init__(self, session, segments=4, min_segment_size=1024 * 1024,
+                 chunk_size=64 * 1024, timeout=60, checkpoint_size=4 * 1024 * 1024,
+                 cancel_event=None, segment_retries=3):
+        """
+        初始化分段下载器
+
+        Args:
+            session: 共享的requests.Session，分段请求复用其连接池和认证信息
+            segments: 并发分段数
+            min_segment_size: 单个分段的最小字节数，文件较小时自动减少分段
+            chunk_size: 每次读取的块大小
+            timeout: 请求超时时间（秒）
+            checkpoint_size: 每下载多少字节写一次续传状态
+            cancel_event: threading.Event，置位后正在进行的下载会在下一个块处停止并保存进度
+            segment_retries: 单个分段中断后从断点重试的次数
+        """
+        self.session = session
+        self.segments = max(1, segments)
+        self.min_segment_size = min_segment_size
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.checkpoint_size = checkpoint_size
+        self.cancel_event = cancel_event
+        self.segment_retries = segment_retries
+
+        self._lock = threading.Lock()
+
+    def probe(self, url, headers=None):
+        """
+        探测远程文件信息
+
+        发送 Range: bytes=0-0 的GET请求：服务器返回206说明支持分段，
+        可从Content-Range得到总大小；返回200说明不支持Range，
+        此时保留响应对象，单连接下载直接复用，不会多发一次请求。
+        """
+        request_headers = dict(headers or {})
+        request_headers['Range'] = 'bytes=0-0'
+
+        response = self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout)
+
+        info = {
+            'url': response.url,
+            'status_code': response.status_code,
+            'content_type': response.headers.get('Content-Type', ''),
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+            'total_size': 0,
+            'accept_ranges': False,
+            'response': None,
+        }
+
+        if response.status_code == 206:
+            content_range = response.headers.get('Content-Range', '')
+            total = content_range.rsplit('/', 1)[-1] if '/' in content_range else ''
+            if total.isdigit():
+                info['total_size'] = int(total)
+                info['accept_ranges'] = True
+            response.close()
+        else:
+            info['total_size'] = int(response.headers.get('Content-Length', 0) or 0)
+            info['response'] = response
+
+        return info
+
+    def download(self, url, filepath, headers=None, info=None, restart_on_change=True):
+        """
+        下载文件到指定路径，支持断点续传
+
+        Args:
+            url: 文件URL
+            filepath: 输出文件路径
+            headers: 额外请求头
+            info: probe()的结果，已探测过时传入以避免重复请求
+            restart_on_change: 续传过程中发现远程文件已变化时是否从头重新下载一次
+
+        Returns:
+            bool: 下载是否成功
+        """
+        if info is None:
+            info = self.probe(url, headers)
+
+        if info['status_code'] not in (200, 206):
+            print(f"❌ 下载失败，状态码: {info['status_code']}")
+            self.release(info)
+            return False
+
+        filepath = str(filepath)
+        part_path = filepath + '.part'
+        state_path = part_path + '.json'
+
+        if not info['accept_ranges']:
+            # 不支持Range时无法续传，从头下载到.part
+            DownloadState(state_path).remove()
+            print("   服务器不支持分段，使用单连接下载")
+            if not self._download_single(info['url'], part_path, info['total_size'], headers, info.get('response')):
+                if self.cancelled:
+                    os.remove(part_path)
+                return False
+            os.replace(part_path, filepath)
+            return True
+
+        state = self._load_state(state_path, part_path, info)
+        result = self._download_ranges(info['url'], part_path, state, headers)
+
+        if result == 'changed':
+            # 服务器上的文件已变化（If-Range不匹配），丢弃旧数据后重新下载
+            state.remove()
+            os.remove(part_path)
+            if not restart_on_change:
+                print("\n❌ 远程文件在下载过程中发生变化")
+                return False
+            print("\n⚠️ 远程文件已变化，重新开始下载")
+            return self.download(url, filepath, headers, restart_on_change=False)
+
+        if result == 'cancelled':
+            print(f"⚠️ 下载已取消，已保存进度: {part_path}")
+            return False
+
+        if result != 'ok' or state.missing():
+            print(f"⚠️ 下载未完成，已保存进度: {part_path}")
+            return False
+
+        os.replace(part_path, filepath)
+        state.remove()
+        return True
+
+    def _load_state(self, state_path, part_path, info):
+        """读取可用的续传状态，无效时新建并预分配.part文件"""
+        state = DownloadState.load(state_path)
+        if state and os.path.exists(part_path) and state.matches(info):
+            print(f"   断点续传: 已完成 {state.completed_bytes()} / {state.total_size} bytes")
+            return state
+
+        state = DownloadState(state_path, info['url'], info['total_size'],
+                              info['etag'], info['last_modified'])
+        with open(part_path, 'wb') as f:
+            f.truncate(info['total_size'])
+        state.save()
+        return state
+
+    def _plan_ranges(self, state):
+        """把缺失区间切分成适合并发下载的分段"""
+        gaps = state.missing()
+        missing_bytes = sum(e - s + 1 for s, e in gaps)
+        piece_size = max(self.min_segment_size, -(-missing_bytes // self.segments))
+
+        ranges = []
+        for start, end in gaps:
+            while start <= end:
+                piece_end = min(end, start + piece_size - 1)
+                ranges.append((start, piece_end))
+                start = piece_end + 1
+        return ranges
+
+    def _download_ranges(self, url, part_path, state, headers):
+        """并发下载所有缺失区间，返回 'ok' / 'failed' / 'changed' / 'cancelled'"""
+        ranges = self._plan_ranges(state)
+        if not ranges:
+            return 'ok'
+
+        workers = min(self.segments, len(ranges))
+        if workers > 1:
+            print(f"   分段下载: {workers} 个连接")
+        else:
+            print("   文件较小，使用单连接下载")
+
+        progress = {'done': state.completed_bytes(), 'total': state.total_size}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._fetch_range, url, part_path, state, start, end, headers, progress)
+                for start, end in ranges
+            ]
+            results = [future.result() for future in futures]
+
+        print()
+        if 'changed' in results:
+            return 'changed'
+        if 'cancelled' in results:
+            return 'cancelled'
+        return 'ok' if all(r == 'ok' for r in results) else 'failed'
+
+    def _fetch_range(self, url, part_path, state, start, end, headers, progress):
+        """下载单个字节区间，中断时从已写入的位置继续，返回 'ok' / 'failed' / 'changed' / 'cancelled'"""
+        position = start
+        retry_after = None
+        for attempt in range(self.segment_retries + 1):
+            if attempt:
+                delay = retry_after if retry_after is not None else backoff_delay(attempt)
+                print(f"\n   🔁 分段 {position}-{end} 第{attempt}次重试（{delay:.1f}秒后）")
+                if self._sleep(delay):
+                    return 'cancelled'
+
+            result, position, retry_after = self._fetch_range_once(
+                url, part_path, state, position, end, headers, progress)
+            if result != 'retry':
+                return result
+
+        print(f"\n❌ 分段 {start}-{end} 重试{self.segment_retries}次后仍失败，已下载到 {position}")
+        return 'failed'
+
+    def _fetch_range_once(self, url, part_path, state, start, end, headers, progress):
+        """
+        请求一次字节区间并写入.part文件对应位置，定期记录进度
+
+        Returns:
+            tuple: (结果, 下一个待下载的位置, Retry-After秒数)；
+                结果为 'retry' 表示暂时性错误，可以从该位置重试
+        """
+        request_headers = dict(headers or {})
+        request_headers['Range'] = f'bytes={start}-{end}'
+        if state.validator:
+            request_headers['If-Range'] = state.validator
+
+        if self.cancelled:
+            return 'cancelled', start, None
+
+        position = start
+        checkpoint = start
+        try:
+            response = self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout)
+            if response.status_code == 200 and state.validator:
+                response.close()
+                return 'changed', position, None
+            if response.status_code in RETRY_STATUS_CODES:
+                print(f"\n⚠️ 分段 {start}-{end} 暂时不可用，状态码: {response.status_code}")
+                response.close()
+                return 'retry', position, parse_retry_after(response)
+            if response.status_code != 206:
+                print(f"\n❌ 分段 {start}-{end} 请求失败，状态码: {response.status_code}")
+                response.close()
+                return 'failed', position, None
+
+            with open(part_path, 'r+b') as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if self.cancelled:
+                        break
+                    if not chunk:
+                        continue
+                    chunk = chunk[:end + 1 - position]
+                    f.write(chunk)
+                    position += len(chunk)
+                    self._report(progress, len(chunk))
+
+                    if position - checkpoint >= self.checkpoint_size:
+                        f.flush()
+                        self._checkpoint(state, checkpoint, position - 1)
+                        checkpoint = position
+                    if position > end:
+                        break
+                response.close()
+
+            if position <= end:
+                if self.cancelled:
+                    return 'cancelled', position, None
+                print(f"\n⚠️ 分段 {start}-{end} 连接中断，已下载到 {position}")
+                return 'retry', position, None
+            return 'ok', position, None
+
+        except Exception as e:
+            print(f"\n⚠️ 分段 {start}-{end} 下载出错: {e}")
+            return 'retry', position, None
+
+        finally:
+            # 无论成功与否都记录已写入的部分，下次只补齐剩余区间
+            self._checkpoint(state, checkpoint, position - 1)
+
+    def _sleep(self, seconds):
+        """等待重试，期间收到取消信号时返回True"""
+        if self.cancel_event is not None:
+            return self.cancel_event.wait(seconds)
+        time.sleep(seconds)
+        return False
+
+    def _checkpoint(self, state, start, end):
+        """记录已写入的区间并保存状态"""
+        with self._lock:
+            state.add(start, end)
+            state.save()
+
+    def _download_single(self, url, filepath, total_size, headers, response=None):
+        """单连接流式下载"""
+        if response is None:
+            response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            if response.status_code != 200:
+                print(f"❌ 下载失败，状态码: {response.status_code}")
+                response.close()
+                return False
+
+        progress = {'done': 0, 'total': total_size}
+        with open(filepath, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if self.cancelled:
+                    response.close()
+                    print("\n⚠️ 下载已取消")
+                    return False
+                if chunk:
+                    f.write(chunk)
+                    self._report(progress, len(chunk))
+
+        print()
+        return True
+
+    @property
+    def cancelled(self):
+        """是否已收到取消信号"""
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _report(self, progress, size):
+        """累计单次下载的字节数并打印进度"""
+        with self._lock:
+            progress['done'] += size
+            if progress['total'] > 0:
+                percent = (progress['done'] / progress['total']) * 100
+                print(f"\r   下载进度: {percent:.1f}%", end='', flush=True)
+
+    @staticmethod
+    def release(info):
+        """关闭探测时保留的响应"""
+        if info.get('response') is not None:
+            info['response'].close()
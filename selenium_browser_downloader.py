@@ -6,8 +6,10 @@
 
 import time
 import os
-import json
+import re
+import hashlib
 from pathlib import Path
+from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -15,25 +17,52 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import requests
+from http_session import create_session
+from browser_pool import BrowserPool
+from browser_waits import wait_for_new_file, wait_for_window_closed
+from network_capture import NetworkCapture, is_video_response
+from page_watcher import PageWatcher
+from lean_browser import apply_lean_options, enable_performance_log, enable_resource_blocking
 
 class MetasoSeleniumDownloader:
-    def __init__(self, chromedriver_path=None, headless=False):
+    # 出现即表示视频已可下载的元素
+    GENERATION_SELECTORS = [
+        "[href*='download']",
+        "[href*='video']",
+        "button[class*='download']",
+        "a[class*='download']",
+        "[data-action='download']"
+    ]
+    # 页面文本中表示生成失败的关键词
+    ERROR_TEXTS = ["生成失败", "错误", "error", "failed"]
+    # 每次在页面中等待的时长（秒），等待期间浏览器不执行其他命令
+    WATCH_SLICE = 10
+    
+    def __init__(self, chromedriver_path=None, headless=False, pool=None, lean=False, download_dir=None):
         """
         初始化Selenium下载器
         
         Args:
             chromedriver_path: ChromeDriver路径，如果为None则使用系统PATH中的
             headless: 是否使用无头模式
+            pool: BrowserPool，提供时从池中租用已启动的浏览器，关闭时归还
+            lean: 精简模式，无头运行，不加载图片、字体、样式表和统计脚本
+            download_dir: 下载和截图保存目录，默认 downloads
         """
         self.driver = None
         self.chromedriver_path = chromedriver_path
-        self.headless = headless
-        self.download_dir = Path("downloads")
-        self.download_dir.mkdir(exist_ok=True)
+        self.headless = headless or lean
+        self.pool = pool
+        self.lean = lean
+        self.network = None
+        self.watcher = None
+        # 等待期间从网络请求中发现的视频响应
+        self.video_responses = []
+        self.download_dir = Path(download_dir) if download_dir else Path("downloads")
+        self.download_dir.mkdir(parents=True, exist_ok=True)
         
-    def setup_driver(self):
-        """设置Chrome浏览器"""
+    def build_options(self):
+        """Chrome启动选项，也作为浏览器池的options_factory"""
         chrome_options = Options()
         
         # 设置下载目录
@@ -57,12 +86,39 @@ class MetasoSeleniumDownloader:
         # 设置User-Agent
         chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
         
+        # 读取网络日志需要性能日志
+        enable_performance_log(chrome_options)
+        if self.lean:
+            apply_lean_options(chrome_options)
+        
+        return chrome_options
+    
+    def prepare_driver(self):
+        """浏览器就绪后：精简模式下拦截不需要的资源，开始在后台捕获网络请求"""
+        if self.lean:
+            enable_resource_blocking(self.driver)
+        self.network = NetworkCapture(self.driver)
+        # 租用的浏览器可能还有上一个页面的日志
+        self.network.discard()
+        self.network.start()
+        # 页面状态监视脚本在之后打开的页面中先于页面脚本加载
+        self.watcher = PageWatcher(self.driver, self.GENERATION_SELECTORS, self.ERROR_TEXTS)
+        self.watcher.register()
+    
+    def setup_driver(self):
+        """设置Chrome浏览器"""
+        if self.pool:
+            return self.lease_driver()
+        
+        chrome_options = self.build_options()
+        
         try:
             if self.chromedriver_path:
                 service = Service(self.chromedriver_path)
                 self.driver = webdriver.Chrome(service=service, options=chrome_options)
             else:
                 self.driver = webdriver.Chrome(options=chrome_options)
+            self.prepare_driver()
             
             print("✅ Chrome浏览器启动成功")
             return True
@@ -71,6 +127,21 @@ class MetasoSeleniumDownloader:
             print(f"❌ Chrome浏览器启动失败: {e}")
             return False
     
+    def lease_driver(self):
+        """从浏览器池租用浏览器，并把下载目录指向本下载器的目录"""
+        try:
+            self.driver = self.pool.acquire()
+            self.driver.execute_cdp_cmd('Browser.setDownloadBehavior', {
+                'behavior': 'allow',
+                'downloadPath': str(self.download_dir.absolute()),
+            })
+            self.prepare_driver()
+            print("✅ 已从浏览器池租用Chrome")
+            return True
+        except Exception as e:
+            print(f"❌ 租用浏览器失败: {e}")
+            return False
+    
     def navigate_to_metaso(self, url):
         """导航到Metaso页面"""
         try:
@@ -93,51 +164,59 @@ class MetasoSeleniumDownloader:
             return False
     
     def wait_for_video_generation(self, max_wait_time=300):
-        """等待视频生成完成"""
+        """等待视频生成完成：页面内的监视脚本在出现视频、下载链接或错误信息时立即返回"""
         print(f"⏳ 等待视频生成完成（最多等待{max_wait_time}秒）...")
         
         start_time = time.time()
         while time.time() - start_time < max_wait_time:
+            # 后台捕获到视频文件时不必再等页面
+            if self.wait_for_network_video(0):
+                return True
+            
             try:
-                # 查找可能的视频元素
-                video_elements = self.driver.find_elements(By.TAG_NAME, "video")
-                if video_elements:
-                    print("🎬 发现视频元素!")
-                    return True
-                
-                # 查找下载按钮或链接
-                download_selectors = [
-                    "[href*='download']",
-                    "[href*='video']", 
-                    "button[class*='download']",
-                    "a[class*='download']",
-                    "[data-action='download']"
-                ]
-                
-                for selector in download_selectors:
-                    elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                    if elements:
-                        print(f"📥 发现下载元素: {selector}")
-                        return True
-                
-                # 检查页面是否有错误信息
-                error_texts = ["生成失败", "错误", "error", "failed"]
-                page_text = self.driver.page_source.lower()
-                for error_text in error_texts:
-                    if error_text in page_text:
-                        print(f"❌ 页面显示错误: {error_text}")
-                        return False
-                
-                print(f"⏳ 等待中... ({int(time.time() - start_time)}s)")
-                time.sleep(5)
-                
+                remaining = max_wait_time - (time.time() - start_time)
+                state = self.watcher.wait(min(self.WATCH_SLICE, remaining))
             except Exception as e:
                 print(f"⚠️ 检查过程中出现异常: {e}")
-                time.sleep(5)
+                time.sleep(1)
+                continue
+            
+            if state is None:
+                print(f"⏳ 等待中... ({int(time.time() - start_time)}s)")
+            elif state['type'] == 'video':
+                print("🎬 发现视频元素!")
+                return True
+            elif state['type'] == 'download':
+                print(f"📥 发现下载元素: {state['selector']}")
+                return True
+            elif state['type'] == 'network':
+                print(f"🎬 从页面请求发现视频: {state['url']}")
+                self.video_responses.append({
+                    'url': state['url'],
+                    'status': state.get('status'),
+                    'mime_type': '',
+                    'content_type': state.get('content_type', ''),
+                })
+                return True
+            elif state['type'] == 'error':
+                print(f"❌ 页面显示错误: {state['text']}")
+                return False
         
         print("⏰ 等待超时")
         return False
     
+    def wait_for_network_video(self, timeout):
+        """消费捕获的网络响应，timeout秒内发现视频文件时返回True"""
+        deadline = time.time() + timeout
+        while True:
+            response = self.network.get(timeout=max(0, deadline - time.time()))
+            if response is None:
+                return False
+            if is_video_response(response):
+                print(f"🎬 从网络请求发现视频: {response['url']}")
+                self.video_responses.append(response)
+                return True
+    
     def find_and_download_video(self):
         """查找并下载视频"""
         print("🔍 正在查找视频下载方式...")
@@ -178,10 +257,10 @@ class MetasoSeleniumDownloader:
                     if onclick:
                         print(f"🖱️ 尝试点击下载按钮 {i+1}")
                         try:
+                            initial_files = set(self.download_dir.glob("*"))
                             element.click()
-                            time.sleep(3)
                             # 检查是否有新的下载开始
-                            if self.check_download_started():
+                            if self.check_download_started(initial_files):
                                 return True
                         except Exception as e:
                             print(f"⚠️ 点击失败: {e}")
@@ -200,7 +279,7 @@ class MetasoSeleniumDownloader:
             
             # 获取当前页面的cookies
             cookies = self.driver.get_cookies()
-            session = requests.Session()
+            session = create_session('page')
             
             for cookie in cookies:
                 session.cookies.set(cookie['name'], cookie['value'])
@@ -236,14 +315,18 @@ class MetasoSeleniumDownloader:
         
         return False
     
-    def check_download_started(self):
-        """检查是否有下载开始"""
-        # 检查下载目录是否有新文件
-        initial_files = set(self.download_dir.glob("*"))
-        time.sleep(5)
-        current_files = set(self.download_dir.glob("*"))
+    def check_download_started(self, initial_files=None, timeout=8):
+        """
+        检查是否有下载开始
         
-        new_files = current_files - initial_files
+        Args:
+            initial_files: 触发下载之前下载目录中的文件，为None时以当前文件为准
+            timeout: 最长等待时间（秒），出现新文件时立即返回
+        """
+        # 等待下载目录出现新文件
+        if initial_files is None:
+            initial_files = set(self.download_dir.glob("*"))
+        new_files = wait_for_new_file(self.download_dir, initial_files, timeout)
         if new_files:
             print(f"✅ 检测到新下载文件: {list(new_files)}")
             return True
@@ -253,20 +336,15 @@ class MetasoSeleniumDownloader:
     def extract_video_from_network(self):
         """从浏览器网络请求中提取视频URL"""
         try:
-            # 获取浏览器日志（需要启用日志记录）
-            logs = self.driver.get_log('performance')
+            # 等待期间已发现的视频响应，加上后台捕获队列中剩余的
+            responses = self.video_responses + [r for r in self.network.pending() if is_video_response(r)]
+            self.video_responses = []
             
-            for log in logs:
-                message = json.loads(log['message'])
-                if message['message']['method'] == 'Network.responseReceived':
-                    response = message['message']['params']['response']
-                    url = response['url']
-                    content_type = response.get('mimeType', '')
-                    
-                    if 'video/' in content_type or url.endswith('.mp4'):
-                        print(f"🎬 从网络日志发现视频: {url}")
-                        if self.download_video_from_url(url, "network_video.mp4"):
-                            return True
+            for response in responses:
+                url = response['url']
+                print(f"🎬 从网络日志发现视频: {url}")
+                if self.download_video_from_url(url, "network_video.mp4"):
+                    return True
                             
         except Exception as e:
             print(f"⚠️ 网络日志分析失败: {e}")
@@ -311,51 +389,125 @@ class MetasoSeleniumDownloader:
             print(f"⚠️ 获取页面信息失败: {e}")
     
     def close(self):
-        """关闭浏览器"""
+        """关闭浏览器，来自浏览器池时归还"""
+        if self.network:
+            self.network.stop()
+            self.network = None
+        if self.watcher:
+            self.watcher.unregister()
+            self.watcher = None
         if self.driver:
-            self.driver.quit()
-            print("🔒 浏览器已关闭")
+            if self.pool:
+                self.pool.release(self.driver)
+                print("🔒 浏览器已归还")
+            else:
+                self.driver.quit()
+                print("🔒 浏览器已关闭")
+            self.driver = None
+
+def process_page(downloader, target_url):
+    """访问单个页面，等待视频生成并下载，返回是否成功"""
+    # 访问页面
+    if not downloader.navigate_to_metaso(target_url):
+        return False
+    
+    # 获取页面信息
+    downloader.get_page_info()
+    
+    # 截图
+    downloader.take_screenshot("initial_page.png")
+    
+    # 等待视频生成
+    if downloader.wait_for_video_generation():
+        # 尝试下载视频
+        if downloader.find_and_download_video():
+            print("\n🎉 视频下载成功！")
+            return True
+        print("\n❌ 视频下载失败")
+        downloader.take_screenshot("final_page.png")
+    else:
+        print("\n⏰ 视频生成超时或失败")
+        downloader.take_screenshot("timeout_page.png")
+    return False
+
+def page_download_dir(target_url, root="downloads"):
+    """
+    批量处理时每个页面的下载目录
+
+    并发的浏览器各自写入自己的目录，固定的文件名（network_video.mp4、截图等）不会互相覆盖，
+    检测下载是否开始时也不会把其他页面的文件算进来
+    """
+    name = urlparse(target_url).path.rstrip('/').rsplit('/', 1)[-1]
+    name = re.sub(r'[^\w.-]', '_', name) or 'page'
+    digest = hashlib.sha1(target_url.encode('utf-8')).hexdigest()[:8]
+    return Path(root) / f"{name}_{digest}"
+
+def process_with_pool(pool, target_url, lean=True):
+    """从浏览器池租用浏览器处理一个页面，下载到该页面自己的目录"""
+    downloader = MetasoSeleniumDownloader(pool=pool, lean=lean, download_dir=page_download_dir(target_url))
+    try:
+        if not downloader.setup_driver():
+            return False
+        return process_page(downloader, target_url)
+    except Exception as e:
+        print(f"\n❌ 处理失败: {target_url} ({e})")
+        return False
+    finally:
+        downloader.close()
+
+def run_batch(urls, workers, lean=True):
+    """多个页面：用预热的无头浏览器池并发处理，浏览器在页面之间复用，默认使用精简模式"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    # 重复的页面只处理一次，同一页面的下载目录相同
+    urls = list(dict.fromkeys(urls))
+    pool = BrowserPool(size=workers, options_factory=MetasoSeleniumDownloader(lean=lean).build_options,
+                       headless=True)
+    try:
+        pool.warm()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda url: process_with_pool(pool, url, lean), urls))
+    finally:
+        pool.close()
+    
+    print(f"\n📊 完成: 成功 {sum(results)} / {len(urls)}")
 
 def main():
-    # Metaso视频页面URL
+    import sys
+    
+    # Metaso视频页面URL，可在命令行传入多个
     target_url = "https://metaso.cn/search/8651522172447916032"
+    urls = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or [target_url]
+    workers = 2
+    for arg in sys.argv[1:]:
+        if arg.startswith('--workers='):
+            workers = int(arg.split('=', 1)[1])
+    # 批量处理默认使用无头精简模式，单个页面默认打开完整的浏览器窗口；
+    # --lean / --full 对两种情况都适用，分别强制精简模式 / 完整页面
+    lean = '--full' not in sys.argv and ('--lean' in sys.argv or len(urls) > 1)
     
     print("="*80)
     print("🎬 Metaso视频自动化下载器")
     print("="*80)
     
-    downloader = MetasoSeleniumDownloader(headless=False)
+    if len(urls) > 1:
+        print(f"📦 {len(urls)} 个页面，浏览器池大小 {workers}")
+        run_batch(urls, workers, lean=lean)
+        return
+    
+    downloader = MetasoSeleniumDownloader(headless=False, lean=lean)
     
     try:
         # 启动浏览器
         if not downloader.setup_driver():
             return
         
-        # 访问页面
-        if not downloader.navigate_to_metaso(target_url):
-            return
-        
-        # 获取页面信息
-        downloader.get_page_info()
-        
-        # 截图
-        downloader.take_screenshot("initial_page.png")
-        
-        # 等待视频生成
-        if downloader.wait_for_video_generation():
-            # 尝试下载视频
-            if downloader.find_and_download_video():
-                print("\n🎉 视频下载成功！")
-            else:
-                print("\n❌ 视频下载失败")
-                downloader.take_screenshot("final_page.png")
-        else:
-            print("\n⏰ 视频生成超时或失败")
-            downloader.take_screenshot("timeout_page.png")
+        process_page(downloader, urls[0])
         
         # 保持浏览器打开一段时间供用户查看
-        print("\n⏳ 浏览器将在30秒后关闭，您可以手动查看页面...")
-        time.sleep(30)
+        if not downloader.headless:
+            print("\n⏳ 浏览器将在30秒后关闭，您可以手动查看页面（关闭窗口可提前结束）...")
+            wait_for_window_closed(downloader.driver, 30)
         
     except KeyboardInterrupt:
         print("\n⚠️ 用户中断操作")
@@ -8,17 +8,33 @@ Metaso Selenium视频下载器
 import time
 import os
 import json
-import requests
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from http_session import create_session
+from credential_store import CredentialStore, check_login
+from browser_waits import wait_for_page_load
+from network_capture import NetworkCapture
+from lean_browser import INTERACTIVE_BLOCKED_URLS, enable_performance_log, enable_resource_blocking
+from segmented_downloader import SegmentedDownloader
+from video_url_extractor import best_video_url
+from streaming_json import preview_text
 
 class SeleniumVideoDownloader:
-    def __init__(self):
+    # 视频相关请求URL中的关键词
+    VIDEO_KEYWORDS = ['video', 'stream', 'media', 'download', 'export', 'generate']
+    
+    def __init__(self, lean=False):
+        """
+        Args:
+            lean: 登录完成后拦截图片、字体和统计请求（需要手动登录，浏览器仍然可见并保留样式表）
+        """
         self.driver = None
+        self.lean = lean
+        self.network = None
         self.target_url = "https://metaso.cn/bookshelf?displayUrl=%2Fapi%2Ffile%2F8651522172447916032%2Fpreview&url=%2Fapi%2Ffile%2F8651522172447916032%2Fpreview&page=1&totalPage=44&file_path=&_id=8651522172447916032&title=%E3%80%90%E8%AF%BE%E4%BB%B6%E3%80%91%E7%AC%AC1%E7%AB%A0_%E5%A4%A7%E8%AF%AD%E8%A8%80%E6%A8%A1%E5%9E%8B%E6%A6%82%E8%BF%B0.pptx&snippet=undefined&sessionId=null&tag=%E6%9C%AC%E5%9C%B0%E6%96%87%E4%BB%B6%E4%B8%8A%E4%BC%A0%E5%88%B0%E4%B9%A6%E6%9E%B6%E4%B8%93%E7%94%A8%E4%B8%93%E9%A2%98654ce6f986a91de24c79b52f&author=&publishDate=undefined&showFront=false&downloadUrl=%2Fapi%2Ffile%2F8651522172447916032%2Fdownload&previewUrl=%2Fapi%2Ffile%2F8651522172447916032%2Fpreview&type=pptx"
         self.file_id = "8651522172447916032"
         self.chapter_id = "8651523279591608320"
@@ -27,11 +43,13 @@ class SeleniumVideoDownloader:
         self.download_dir = "downloads"
         if not os.path.exists(self.download_dir):
             os.makedirs(self.download_dir)
-    
-    def setup_driver(self):
-        """设置Chrome浏览器"""
-        print("🚀 启动浏览器...")
         
+        # 保存的登录cookies，仍然有效时不再启动浏览器
+        self.credentials = CredentialStore(profile='selenium_video_downloader')
+        self.login_check_url = f"https://metaso.cn/api/file/{self.file_id}/download"
+    
+    def build_options(self):
+        """Chrome启动选项"""
         chrome_options = Options()
         # 设置下载目录
         prefs = {
@@ -52,9 +70,20 @@ class SeleniumVideoDownloader:
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
         
+        # 读取网络日志需要性能日志
+        enable_performance_log(chrome_options)
+        return chrome_options
+    
+    def setup_driver(self):
+        """设置Chrome浏览器"""
+        print("🚀 启动浏览器...")
+        
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
+            self.driver = webdriver.Chrome(options=self.build_options())
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            # 后台读取网络日志，页面加载期间就开始收集视频相关请求
+            self.network = NetworkCapture(self.driver, keywords=self.VIDEO_KEYWORDS)
+            self.network.start()
             print("✅ 浏览器启动成功")
             return True
         except Exception as e:
@@ -68,7 +97,7 @@ class SeleniumVideoDownloader:
         
         try:
             self.driver.get(self.target_url)
-            time.sleep(3)
+            self.wait_for_page_ready()
             
             # 检查页面是否加载成功
             if "metaso.cn" in self.driver.current_url:
@@ -82,6 +111,12 @@ class SeleniumVideoDownloader:
             print(f"❌ 访问页面失败: {str(e)}")
             return False
     
+    def wait_for_page_ready(self, timeout=15):
+        """等待页面加载完成且网络空闲（页面脚本加载完数据后）"""
+        start = time.time()
+        wait_for_page_load(self.driver, timeout)
+        self.network.wait_for_idle(timeout=max(0, timeout - (time.time() - start)))
+    
     def wait_for_login(self):
         """等待用户手动登录"""
         print("\n🔐 请在浏览器中手动登录Metaso账户")
@@ -92,7 +127,7 @@ class SeleniumVideoDownloader:
         try:
             # 刷新页面以确保登录状态生效
             self.driver.refresh()
-            time.sleep(3)
+            self.wait_for_page_ready()
             
             # 简单检查：看看页面是否还在登录页面
             if "login" in self.driver.current_url.lower():
@@ -173,29 +208,28 @@ class SeleniumVideoDownloader:
         self.driver.execute_cdp_cmd('Log.clear', {})
         
         print("   请在浏览器中执行可能触发视频加载的操作（如点击播放、下载按钮等）")
-        print("   等待10秒钟收集网络请求...")
-        
-        time.sleep(10)
+        print("   最多等待10秒，发现视频相关请求并且网络空闲后立即继续...")
         
-        # 获取网络日志
+        # 后台捕获的响应（包括页面加载期间的）在队列中；取到第一个后再等同一批请求结束
         try:
-            logs = self.driver.get_log('performance')
             video_requests = []
+            first = self.network.get(timeout=10)
+            if first:
+                self.network.wait_for_idle(timeout=3)
+                responses = [first] + self.network.pending()
+            else:
+                responses = []
             
-            for log in logs:
-                message = json.loads(log['message'])
-                if message['message']['method'] == 'Network.responseReceived':
-                    url = message['message']['params']['response']['url']
-                    content_type = message['message']['params']['response'].get('headers', {}).get('content-type', '')
-                    
-                    # 检查是否是视频相关的请求
-                    if any(keyword in url.lower() for keyword in ['video', 'stream', 'media', 'download', 'export', 'generate']):
-                        video_requests.append({
-                            'url': url,
-                            'content_type': content_type,
-                            'status': message['message']['params']['response']['status']
-                        })
-                        print(f"   🎬 发现视频请求: {url}")
+            for response in responses:
+                url = response['url']
+                # 关键词也可能出现在响应头中，这里只看URL
+                if any(keyword in url.lower() for keyword in self.VIDEO_KEYWORDS):
+                    video_requests.append({
+                        'url': url,
+                        'content_type': response['content_type'],
+                        'status': response['status']
+                    })
+                    print(f"   🎬 发现视频请求: {url}")
             
             return video_requests
             
@@ -203,25 +237,44 @@ class SeleniumVideoDownloader:
             print(f"❌ 获取网络日志失败: {str(e)}")
             return []
     
-    def try_download_with_cookies(self):
-        """使用浏览器cookies尝试下载"""
-        print("\n🍪 使用浏览器cookies尝试下载...")
+    def save_login(self):
+        """保存浏览器登录后的cookies，下次运行直接使用"""
+        self.credentials.save_browser_cookies(
+            self.driver.get_cookies(), user_agent=self.driver.execute_script("return navigator.userAgent;"))
+    
+    def restore_login(self):
+        """
+        加载保存的登录cookies并用一个请求验证
         
-        # 获取浏览器cookies
-        cookies = self.driver.get_cookies()
+        Returns:
+            requests.Session: 登录仍然有效时返回已加载cookies的会话，否则返回None
+        """
+        session = create_session('api')
+        if self.credentials.restore(session, lambda s: check_login(s, self.login_check_url)):
+            print("✅ 已保存的登录状态有效，跳过浏览器")
+            return session
+        return None
+    
+    def try_download_with_cookies(self, session=None):
+        """
+        使用浏览器cookies尝试下载
         
-        # 创建requests session并设置cookies
-        session = requests.Session()
-        for cookie in cookies:
-            session.cookies.set(cookie['name'], cookie['value'])
+        Args:
+            session: 已加载cookies的会话，为None时从当前浏览器读取cookies
+        """
+        print("\n🍪 使用浏览器cookies尝试下载...")
         
-        # 设置headers
-        session.headers.update({
-            'User-Agent': self.driver.execute_script("return navigator.userAgent;"),
-            'Referer': self.driver.current_url,
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8'
-        })
+        if session is None:
+            # 获取浏览器cookies
+            cookies = self.driver.get_cookies()
+            
+            # 创建共享配置的session并设置cookies，请求头与浏览器保持一致
+            session = create_session('api', headers={
+                'User-Agent': self.driver.execute_script("return navigator.userAgent;"),
+                'Referer': self.driver.current_url,
+            })
+            for cookie in cookies:
+                session.cookies.set(cookie['name'], cookie['value'])
         
         # 尝试各种视频API端点
         video_endpoints = [
@@ -243,7 +296,7 @@ class SeleniumVideoDownloader:
                 if response.status_code == 200:
                     try:
                         data = response.json()
-                        print(f"   响应: {json.dumps(data, ensure_ascii=False, indent=2)[:200]}...")
+                        print(f"   响应: {preview_text(response.content, 200)}")
                         
                         # 检查响应中是否有视频URL
                         if self.extract_and_download_video(data, session, endpoint):
@@ -259,31 +312,10 @@ class SeleniumVideoDownloader:
     
     def extract_and_download_video(self, data, session, source_endpoint):
         """从响应数据中提取并下载视频"""
-        video_url = None
-        
-        # 查找视频URL
-        def find_video_url(obj):
-            nonlocal video_url
-            
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    if key.lower() in ['url', 'videourl', 'downloadurl', 'streamurl', 'playurl', 'mediaurl']:
-                        if isinstance(value, str) and ('http' in value or value.startswith('/')):
-                            video_url = value
-                            return True
-                    if find_video_url(value):
-                        return True
-            elif isinstance(obj, list):
-                for item in obj:
-                    if find_video_url(item):
-                        return True
-            elif isinstance(obj, str):
-                if any(ext in obj.lower() for ext in ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm']):
-                    video_url = obj
-                    return True
-            return False
+        best = best_video_url(data)
         
-        if find_video_url(data) and video_url:
+        if best:
+            video_url = best['url']
             print(f"   🎯 发现视频URL: {video_url}")
             
             # 如果是相对URL，转换为绝对URL
@@ -300,38 +332,46 @@ class SeleniumVideoDownloader:
         print(f"\n📥 开始下载视频: {video_url}")
         
         try:
-            response = session.get(video_url, stream=True, timeout=30)
+            downloader = SegmentedDownloader(session)
+            info = downloader.probe(video_url)
             
-            if response.status_code == 200:
+            if info['status_code'] in (200, 206):
                 filename = f"metaso_video_{self.file_id}.mp4"
                 filepath = os.path.join(self.download_dir, filename)
                 
-                file_size = int(response.headers.get('Content-Length', 0))
+                file_size = info['total_size']
                 print(f"   文件大小: {file_size / 1024 / 1024:.2f} MB")
                 print(f"   保存到: {filepath}")
                 
-                with open(filepath, 'wb') as f:
-                    downloaded = 0
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            
-                            if file_size > 0:
-                                progress = (downloaded / file_size) * 100
-                                print(f"\r   下载进度: {progress:.1f}%", end='', flush=True)
+                if not downloader.download(video_url, filepath, info=info):
+                    print(f"❌ 下载失败: {filepath}")
+                    return False
                 
-                print(f"\n✅ 视频下载成功: {filepath}")
+                print(f"✅ 视频下载成功: {filepath}")
                 print(f"   来源: {source_endpoint}")
                 return True
             else:
-                print(f"❌ 下载失败，状态码: {response.status_code}")
+                print(f"❌ 下载失败，状态码: {info['status_code']}")
+                downloader.release(info)
                 return False
                 
         except Exception as e:
             print(f"❌ 下载视频时出错: {str(e)}")
             return False
     
+    def report_result(self, success):
+        """打印下载结果"""
+        if success:
+            print("\n🎉 视频下载成功！")
+            return True
+        
+        print("\n❌ 未能下载视频")
+        print("\n💡 建议:")
+        print("   1. 确认视频已经生成完成")
+        print("   2. 尝试在浏览器中手动点击下载按钮")
+        print("   3. 检查网络请求中是否有视频相关的API")
+        return False
+    
     def run(self):
         """运行下载器"""
         print("="*80)
@@ -340,6 +380,11 @@ class SeleniumVideoDownloader:
         print(f"📋 章节ID: {self.chapter_id}")
         
         try:
+            # 登录状态仍然有效时直接用HTTP请求下载
+            session = self.restore_login()
+            if session:
+                return self.report_result(self.try_download_with_cookies(session))
+            
             # 设置浏览器
             if not self.setup_driver():
                 return False
@@ -351,6 +396,11 @@ class SeleniumVideoDownloader:
             # 等待用户登录
             if not self.wait_for_login():
                 return False
+            self.save_login()
+            
+            # 登录页可能需要扫码，登录完成后才开始拦截图片
+            if self.lean:
+                enable_resource_blocking(self.driver, INTERACTIVE_BLOCKED_URLS)
             
             # 查找视频元素
             video_elements = self.find_video_elements()
@@ -359,26 +409,21 @@ class SeleniumVideoDownloader:
             network_requests = self.intercept_network_requests()
             
             # 使用cookies尝试下载
-            if self.try_download_with_cookies():
-                print("\n🎉 视频下载成功！")
-                return True
-            else:
-                print("\n❌ 未能下载视频")
-                print("\n💡 建议:")
-                print("   1. 确认视频已经生成完成")
-                print("   2. 尝试在浏览器中手动点击下载按钮")
-                print("   3. 检查网络请求中是否有视频相关的API")
-                return False
+            return self.report_result(self.try_download_with_cookies())
                 
         except Exception as e:
             print(f"❌ 运行过程中出错: {str(e)}")
             return False
             
         finally:
+            if self.network:
+                self.network.stop()
+                self.network = None
             if self.driver:
                 print("\n🔚 关闭浏览器")
                 self.driver.quit()
 
 if __name__ == "__main__":
-    downloader = SeleniumVideoDownloader()
+    import sys
+    downloader = SeleniumVideoDownloader(lean='--lean' in sys.argv)
     downloader.run()
\ No newline at end of file
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相同请求合并（singleflight）
+批量处理同一文件的多个章节时，多个线程会同时请求相同的地址
+（/api/file/{file_id}/...、页面HTML等）。同一个键的请求进行中时，
+后到的调用方不再发请求，而是等待第一个请求完成并共享它的解析结果；
+第一个请求抛出的异常也会原样抛给所有等待者
+
+只合并同时进行的请求，请求完成后不保留结果
+"""
+
+import threading
+
+from endpoint_cache import auth_identity
+
+
+def request_key(session, url, method='GET'):
+    """
+    生成请求的合并键：方法、URL和会话的认证身份
+
+    不同账号的相同URL可能返回不同内容，不能合并
+    """
+    return (method.upper(), url, auth_identity(session))
+
+
+class _Flight:
+    """一个进行中的请求"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """按键合并同时进行的调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        # 被合并掉的调用次数
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        执行fn()并返回结果；同一个键已有调用进行中时等待并共享它的结果
+
+        Args:
+            key: 可哈希的合并键，通常由request_key生成
+            fn: 无参数的函数，返回解析后的结果
+
+        Returns:
+            fn()的返回值
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def in_flight(self):
+        """当前进行中的调用数"""
+        with self._lock:
+            return len(self._flights)
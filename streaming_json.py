@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式JSON扫描
+按数据块增量解析JSON，产出 (键, 值) 事件，不构建完整文档；
+扫描视频URL时一旦找到足够可信的候选就停止读取，
+日志预览直接取响应开头的字节，不再对整个文档做解析和重新序列化
+"""
+
+import codecs
+import json
+import re
+
+from video_url_extractor import score_candidate
+
+# 达到该置信度的候选视为可信，扫描到即停止
+CONFIDENT_SCORE = 0.9
+
+_TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<punct>[{}\[\]:,])
+      | "(?P<string>(?:[^"\\]|\\.)*)"
+      | (?P<scalar>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null)
+    )
+''', re.VERBOSE | re.DOTALL)
+
+_LITERALS = {'true': True, 'false': False, 'null': None}
+
+# 可能还没有结束的数字（如 "1." "1.5e" "-"），位于数据末尾时要等下一段数据
+_PARTIAL_NUMBER_RE = re.compile(r'-?\d*(?:\.\d*)?(?:[eE][+-]?\d*)?')
+
+
+def _decode_string(raw):
+    """还原JSON字符串中的转义（常见的 \\/ 等）"""
+    if '\\' not in raw:
+        return raw
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+
+def _decode_scalar(raw):
+    if raw in _LITERALS:
+        return _LITERALS[raw]
+    try:
+        return int(raw)
+    except ValueError:
+        return float(raw)
+
+
+class JsonEventParser:
+    """增量JSON解析器，只产出标量值事件"""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._text = ''
+        # 每层容器: [类型('object'/'array'), 当前键或下标]
+        self._stack = []
+        self._expect_key = False
+        self.error = False
+
+    @property
+    def depth(self):
+        """当前所在容器的嵌套层数"""
+        return len(self._stack)
+
+    def path(self):
+        """当前值的JSON路径，格式与video_url_extractor一致"""
+        parts = []
+        for kind, key in self._stack:
+            if kind == 'array':
+                parts.append(f"[{key}]")
+            elif parts:
+                parts.append(f".{key}")
+            else:
+                parts.append(str(key))
+        return ''.join(parts)
+
+    def feed(self, data, final=False):
+        """
+        输入一段数据，逐个产出其中完整的标量值
+
+        Args:
+            data: bytes或str
+            final: 是否是最后一段数据
+
+        Yields:
+            tuple: (键, 值)，数组元素的键为None；产出时path()指向该值
+        """
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data, final)
+        text = self._text + data
+        pos = 0
+
+        while True:
+            match = _TOKEN_RE.match(text, pos)
+            if not match:
+                # 剩余内容不可能是某个记号的开头时，说明不是合法JSON
+                rest = text[pos:].lstrip()
+                if rest and rest[0] not in '"-0123456789tfn':
+                    self.error = True
+                break
+            # 数字可能在下一段数据中继续（包括停在小数点或指数符号处的情况）
+            if match.group('scalar') and not final:
+                partial = _PARTIAL_NUMBER_RE.match(text, match.start('scalar'))
+                if match.end() == len(text) or partial.end() == len(text):
+                    break
+            pos = match.end()
+
+            punct = match.group('punct')
+            if punct:
+                self._handle_punct(punct)
+                continue
+
+            raw = match.group('string')
+            if raw is not None:
+                value = _decode_string(raw)
+                if self._expect_key:
+                    self._stack[-1][1] = value
+                    self._expect_key = False
+                    continue
+            else:
+                value = _decode_scalar(match.group('scalar'))
+
+            top = self._stack[-1] if self._stack else None
+            yield (top[1] if top and top[0] == 'object' else None), value
+
+        self._text = text[pos:]
+        if final and (self._text.strip() or self._stack):
+            self.error = True
+
+    def _handle_punct(self, punct):
+        if punct == '{':
+            self._stack.append(['object', None])
+            self._expect_key = True
+        elif punct == '[':
+            self._stack.append(['array', 0])
+            self._expect_key = False
+        elif punct in '}]':
+            if self._stack:
+                self._stack.pop()
+            self._expect_key = False
+        elif punct == ':':
+            self._expect_key = False
+        elif self._stack:
+            # 逗号：对象中接下来是键，数组中下标加一
+            if self._stack[-1][0] == 'object':
+                self._expect_key = True
+            else:
+                self._stack[-1][1] += 1
+
+
+def scan_video_urls(chunks, stop_score=CONFIDENT_SCORE):
+    """
+    流式扫描JSON数据中的视频URL
+
+    Args:
+        chunks: 字节块的可迭代对象（如response.iter_content()）
+        stop_score: 找到置信度不低于该值的候选时立即停止
+
+    Returns:
+        dict: candidates（按置信度排序的候选列表，格式与extract_video_urls相同）、
+        best（最佳候选或None）、fields（顶层标量字段，如errCode/errMsg）、
+        complete（是否读完整个文档）、error（文档是否不是合法JSON）、bytes_read
+    """
+    parser = JsonEventParser()
+    result = {'candidates': [], 'best': None, 'fields': {}, 'complete': False, 'error': False,
+              'bytes_read': 0}
+    seen = set()
+
+    def consume(events):
+        for key, value in events:
+            if parser.depth == 1 and key is not None:
+                result['fields'][key] = value
+            score = score_candidate(key, value)
+            if score > 0 and value not in seen:
+                seen.add(value)
+                result['candidates'].append({'url': value, 'path': parser.path(), 'key': key, 'score': score})
+                if score >= stop_score:
+                    return True
+        return False
+
+    stopped = False
+    for chunk in chunks:
+        result['bytes_read'] += len(chunk)
+        if consume(parser.feed(chunk)) or parser.error:
+            stopped = True
+            break
+    if not stopped:
+        consume(parser.feed(b'', final=True))
+        result['complete'] = True
+    result['error'] = parser.error
+
+    result['candidates'].sort(key=lambda c: -c['score'])
+    if result['candidates']:
+        result['best'] = result['candidates'][0]
+    return result
+
+
+def preview_text(head, limit=300, encoding='utf-8'):
+    """用响应开头的字节生成日志预览，截断处可能是不完整的字符"""
+    text = head[:limit * 4].decode(encoding or 'utf-8', errors='ignore')
+    text = ' '.join(text.split())
+    return text[:limit] + ('...' if len(text) > limit else '')
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP/2传输测试
+在本地启动一个h2c（明文HTTP/2，prior knowledge）服务器，通过 http1=False 的适配器访问，
+检查429/503重试、熔断和经过CachingHTTP2Adapter的304重新验证
+"""
+
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip('httpx')
+h2_config = pytest.importorskip('h2.config')
+h2_connection = pytest.importorskip('h2.connection')
+h2_events = pytest.importorskip('h2.events')
+
+from http2_transport import CachingHTTP2Adapter, HTTP2Adapter, enable_http2
+from http_cache import HTTPCache, enable_http_cache
+from http_retry import CircuitBreaker, CircuitOpenError, build_retry
+from http_session import create_session
+
+
+class H2CServer:
+    """最小的h2c服务器，每个请求交给handler(path, headers)返回 (状态码, 响应头列表, 响应体)"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(8)
+        self.base_url = f"http://127.0.0.1:{self.sock.getsockname()[1]}"
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        h2 = h2_connection.H2Connection(
+            config=h2_config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        h2.initiate_connection()
+        conn.sendall(h2.data_to_send())
+        headers = {}
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(65535)
+                except OSError:
+                    return
+                if not data:
+                    return
+                for event in h2.receive_data(data):
+                    if isinstance(event, h2_events.RequestReceived):
+                        headers[event.stream_id] = dict(event.headers)
+                    elif isinstance(event, h2_events.DataReceived):
+                        h2.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2_events.StreamEnded):
+                        self._respond(h2, event.stream_id, headers.pop(event.stream_id))
+                conn.sendall(h2.data_to_send())
+
+    def _respond(self, h2, stream_id, request_headers):
+        path = request_headers[':path']
+        self.requests.append((path, request_headers))
+        status, headers, body = self.handler(path, request_headers)
+        h2.send_headers(stream_id, [(':status', str(status)), ('content-length', str(len(body)))] + headers,
+                        end_stream=not body)
+        if body:
+            h2.send_data(stream_id, body, end_stream=True)
+
+    def hits(self, path):
+        return sum(1 for p, _ in self.requests if p == path)
+
+    def close(self):
+        self.sock.close()
+
+
+def handle(path, headers):
+    if path == '/api/flaky':
+        # 第一次429，第二次503，之后正常
+        attempt = server_state['flaky']
+        server_state['flaky'] += 1
+        if attempt == 0:
+            return 429, [('retry-after', '0')], b''
+        if attempt == 1:
+            return 503, [], b''
+        return 200, [('content-type', 'application/json')], b'{"ok": 1}'
+    if path == '/api/down':
+        return 503, [], b''
+    if path == '/api/meta':
+        if headers.get('if-none-match') == '"v1"':
+            return 304, [('etag', '"v1"')], b''
+        return 200, [('content-type', 'application/json'), ('etag', '"v1"'), ('cache-control', 'no-cache')], \
+            b'{"title": "chapter 1"}'
+    return 404, [], b''
+
+
+server_state = {}
+
+
+@pytest.fixture
+def server():
+    server_state['flaky'] = 0
+    srv = H2CServer(handle)
+    yield srv
+    srv.close()
+
+
+def h2c_session(server, breaker=True, retries=None, cache_dir=None):
+    """会话中指向测试服务器的请求走h2c"""
+    session = create_session('api', retries=retries, breaker=breaker)
+    cache = enable_http_cache(session, HTTPCache(path=cache_dir)) if cache_dir else None
+    assert enable_http2(session, prefixes=(server.base_url,), http1=False)
+    return session, cache
+
+
+def test_retries_429_and_503(server):
+    retry = build_retry(total=3, backoff_factor=0.01, backoff_jitter=0)
+    session, _ = h2c_session(server, retries=retry)
+    assert isinstance(session.get_adapter(server.base_url), HTTP2Adapter)
+
+    response = session.get(server.base_url + '/api/flaky')
+    assert response.status_code == 200
+    assert response.json() == {'ok': 1}
+    assert response.http_version == 'HTTP/2'
+    assert server.hits('/api/flaky') == 3
+
+
+def test_breaker_opens_after_failures(server):
+    breaker = CircuitBreaker(window=4, min_failures=2, failure_rate=0.5, cooldown=60)
+    session, _ = h2c_session(server, breaker=breaker, retries=0)
+
+    for _ in range(2):
+        assert session.get(server.base_url + '/api/down').status_code == 503
+    with pytest.raises(CircuitOpenError):
+        session.get(server.base_url + '/api/down')
+    assert server.hits('/api/down') == 2
+
+
+def test_cache_revalidates_with_304(server, tmp_path):
+    session, cache = h2c_session(server, cache_dir=tmp_path / 'http')
+    assert isinstance(session.get_adapter(server.base_url), CachingHTTP2Adapter)
+
+    first = session.get(server.base_url + '/api/meta')
+    assert first.status_code == 200
+    assert not getattr(first, 'from_cache', False)
+
+    second = session.get(server.base_url + '/api/meta')
+    assert second.status_code == 200
+    assert second.from_cache
+    assert second.json() == {'title': 'chapter 1'}
+    assert cache.revalidated == 1
+    # 第二次请求带着HTTP/2下小写保存的ETag重新验证
+    assert server.requests[-1][1].get('if-none-match') == '"v1"'
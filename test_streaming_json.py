@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式JSON扫描测试
+同一个文档在每个位置切成两段输入，结果都应与一次性输入相同
+"""
+
+from streaming_json import JsonEventParser, scan_video_urls
+
+DOCUMENT = (b'{"errCode": 0, "ratio": -1.5e+3, "size": 12.25, "ok": true, "none": null, '
+            b'"list": [1, 2.0E-2, "a"], "data": {"videoUrl": "https:\\/\\/cdn.example.com\\/v.mp4"}}')
+
+
+def events(chunks):
+    parser = JsonEventParser()
+    result = []
+    for chunk in chunks:
+        result.extend(parser.feed(chunk))
+    result.extend(parser.feed(b'', final=True))
+    return result, parser.error
+
+
+def test_every_split_offset():
+    expected, error = events([DOCUMENT])
+    assert not error
+    for offset in range(len(DOCUMENT) + 1):
+        assert events([DOCUMENT[:offset], DOCUMENT[offset:]]) == (expected, False), offset
+
+
+def test_split_inside_float_keeps_video_url():
+    scan = scan_video_urls([b'{"a": 1.', b'5, "videoUrl": "https://x/v.mp4"}'])
+    assert not scan['error']
+    assert scan['best']['url'] == 'https://x/v.mp4'
+
+    scan = scan_video_urls([b'{"a": 1.5e', b'3, "videoUrl": "https://x/v.mp4"}'])
+    assert not scan['error']
+    assert scan['fields']['a'] == 1500.0
+
+
+def test_invalid_json_is_reported():
+    assert events([b'{"a": 1.5.5}'])[1]
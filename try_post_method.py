@@ -4,34 +4,50 @@
 尝试使用POST方法和不同的认证方式下载视频
 """
 
-import requests
 import json
 import os
 from pathlib import Path
+from http_session import create_session
 
-def try_different_auth_methods(url, uid, sid, filename):
-    """尝试不同的认证方法"""
+def build_auth_sessions(uid, sid):
+    """
+    为三种认证方式各创建一个会话，另有一个不带认证信息的下载会话
     
-    # 方法1: Bearer Token (uid-sid)
-    print(f"\n🔍 方法1: Bearer Token (uid-sid)")
-    session1 = requests.Session()
-    token1 = f"{uid}-{sid}"
-    headers1 = {
-        'Authorization': f'Bearer {token1}',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    会话在所有端点之间复用，后续请求复用已建立的连接
+    """
+    common = {
         'Accept': 'application/json, */*',
         'Content-Type': 'application/json',
-        'Referer': 'https://metaso.cn/',
-        'Origin': 'https://metaso.cn'
     }
-    session1.headers.update(headers1)
+    
+    # 方法1: Bearer Token (uid-sid)
+    token = f"{uid}-{sid}"
+    bearer = create_session('api', headers=dict(common, Authorization=f'Bearer {token}'))
+    
+    # 方法2: 直接在Cookie中设置uid和sid
+    cookie = create_session('api', headers=dict(common, Cookie=f'uid={uid}; sid={sid}'))
+    
+    # 方法3: 在请求体中发送认证信息
+    body = create_session('api', headers=common)
+    
+    # 下载响应中给出的视频地址（可能在其他主机上），不携带认证信息
+    download = create_session('api')
+    
+    return {'bearer': bearer, 'cookie': cookie, 'body': body, 'download': download}
+
+def try_different_auth_methods(url, sessions, uid, sid, filename):
+    """尝试不同的认证方法"""
+    
+    # 方法1: Bearer Token (uid-sid)
+    print(f"\n🔍 方法1: Bearer Token (uid-sid)")
+    session1 = sessions['bearer']
     
     # 尝试POST方法
     try:
         response = session1.post(url, timeout=30)
         print(f"   POST状态码: {response.status_code}")
         if response.status_code == 200:
-            return handle_response(response, filename, "POST-Bearer")
+            return handle_response(response, filename, "POST-Bearer", sessions['download'])
     except Exception as e:
         print(f"   POST异常: {e}")
     
@@ -40,29 +56,20 @@ def try_different_auth_methods(url, uid, sid, filename):
         response = session1.get(url, timeout=30)
         print(f"   GET状态码: {response.status_code}")
         if response.status_code == 200:
-            return handle_response(response, filename, "GET-Bearer")
+            return handle_response(response, filename, "GET-Bearer", sessions['download'])
     except Exception as e:
         print(f"   GET异常: {e}")
     
     # 方法2: 直接在Cookie中设置uid和sid
     print(f"\n🔍 方法2: Cookie认证")
-    session2 = requests.Session()
-    headers2 = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        'Accept': 'application/json, */*',
-        'Content-Type': 'application/json',
-        'Referer': 'https://metaso.cn/',
-        'Origin': 'https://metaso.cn',
-        'Cookie': f'uid={uid}; sid={sid}'
-    }
-    session2.headers.update(headers2)
+    session2 = sessions['cookie']
     
     # 尝试POST方法
     try:
         response = session2.post(url, timeout=30)
         print(f"   POST状态码: {response.status_code}")
         if response.status_code == 200:
-            return handle_response(response, filename, "POST-Cookie")
+            return handle_response(response, filename, "POST-Cookie", sessions['download'])
     except Exception as e:
         print(f"   POST异常: {e}")
     
@@ -71,21 +78,13 @@ def try_different_auth_methods(url, uid, sid, filename):
         response = session2.get(url, timeout=30)
         print(f"   GET状态码: {response.status_code}")
         if response.status_code == 200:
-            return handle_response(response, filename, "GET-Cookie")
+            return handle_response(response, filename, "GET-Cookie", sessions['download'])
     except Exception as e:
         print(f"   GET异常: {e}")
     
     # 方法3: 在请求体中发送认证信息
     print(f"\n🔍 方法3: 请求体认证")
-    session3 = requests.Session()
-    headers3 = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        'Accept': 'application/json, */*',
-        'Content-Type': 'application/json',
-        'Referer': 'https://metaso.cn/',
-        'Origin': 'https://metaso.cn'
-    }
-    session3.headers.update(headers3)
+    session3 = sessions['body']
     
     # 尝试POST方法，在请求体中包含认证信息
     auth_data = {
@@ -97,13 +96,13 @@ def try_different_auth_methods(url, uid, sid, filename):
         response = session3.post(url, json=auth_data, timeout=30)
         print(f"   POST状态码: {response.status_code}")
         if response.status_code == 200:
-            return handle_response(response, filename, "POST-Body")
+            return handle_response(response, filename, "POST-Body", sessions['download'])
     except Exception as e:
         print(f"   POST异常: {e}")
     
     return False
 
-def handle_response(response, filename, method):
+def handle_response(response, filename, method, download_session):
     """处理响应"""
     content_type = response.headers.get('Content-Type', '')
     print(f"   Content-Type: {content_type}")
@@ -141,7 +140,7 @@ def handle_response(response, filename, method):
                             video_url = data[key]
                             print(f"   🎬 发现{key}: {video_url}")
                             # 可以递归尝试下载这个URL
-                            return try_download_from_url(video_url, filename)
+                            return try_download_from_url(video_url, filename, download_session)
             
             # 检查错误信息
             if 'errCode' in json_data:
@@ -152,7 +151,7 @@ def handle_response(response, filename, method):
                 # 如果错误信息包含URL，尝试访问
                 if 'http' in err_msg:
                     print(f"   🔗 尝试错误信息中的URL: {err_msg}")
-                    return try_download_from_url(err_msg, filename)
+                    return try_download_from_url(err_msg, filename, download_session)
         
         except Exception as e:
             print(f"   ❌ JSON解析错误: {e}")
@@ -164,10 +163,10 @@ def handle_response(response, filename, method):
     
     return False
 
-def try_download_from_url(url, filename):
+def try_download_from_url(url, filename, session):
     """尝试从URL下载"""
     try:
-        response = requests.get(url, timeout=30, stream=True)
+        response = session.get(url, timeout=30, stream=True)
         if response.status_code == 200:
             content_type = response.headers.get('Content-Type', '')
             if 'video/' in content_type:
@@ -205,11 +204,14 @@ def main():
     print(f"🔐 认证信息: UID={uid[:10]}..., SID={sid[:10]}...")
     print("="*80)
     
+    # 三种认证方式的会话只创建一次，所有端点共用
+    sessions = build_auth_sessions(uid, sid)
+    
     for i, endpoint in enumerate(test_endpoints, 1):
         print(f"\n📹 测试端点 {i}/{len(test_endpoints)}: {endpoint}")
         filename = f"metaso_video_method_{i}.mp4"
         
-        success = try_different_auth_methods(endpoint, uid, sid, filename)
+        success = try_different_auth_methods(endpoint, sessions, uid, sid, filename)
         if success:
             print(f"\n🎉 视频下载成功！")
             break
@@ -4,26 +4,18 @@
 尝试从API分析中发现的视频链接下载视频
 """
 
-import requests
 import os
+from http_session import create_session
 from pathlib import Path
 
 def download_video_from_link(url, uid, sid, filename):
     """从指定链接下载视频"""
-    session = requests.Session()
-    
     # 设置认证头
     token = f"{uid}-{sid}"
-    headers = {
+    session = create_session('api', headers={
         'Authorization': f'Bearer {token}',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
         'Accept': '*/*',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Referer': 'https://metaso.cn/',
-        'Origin': 'https://metaso.cn'
-    }
-    
-    session.headers.update(headers)
+    })
     
     print(f"🔍 尝试下载: {url}")
     
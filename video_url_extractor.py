@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON视频URL提取器
+用显式栈单次遍历JSON数据（不递归，嵌套再深也不会超出递归深度），
+把字段名与预先归一化的字段表比较，返回所有候选URL及其JSON路径和置信度，
+调用方可以先尝试置信度最高的候选
+"""
+
+from urllib.parse import urlparse
+
+# 归一化字段名（小写、去掉下划线和连字符） -> 基础置信度
+VIDEO_URL_FIELDS = {
+    'videourl': 1.0,
+    'mp4url': 1.0,
+    'playurl': 0.95,
+    'streamurl': 0.9,
+    'mediaurl': 0.9,
+    'hlsurl': 0.9,
+    'm3u8url': 0.9,
+    'downloadurl': 0.8,
+    'url': 0.5,
+    'src': 0.45,
+    'href': 0.35,
+}
+
+# 字段名不在表中、但值是视频文件地址时的基础置信度
+MEDIA_VALUE_SCORE = 0.6
+
+MEDIA_EXTENSIONS = ('.mp4', '.m3u8', '.webm', '.flv', '.mov', '.avi', '.wmv', '.m4v', '.mkv')
+
+# 明显不是视频的文件类型
+NON_VIDEO_EXTENSIONS = ('.ppt', '.pptx', '.pdf', '.doc', '.docx', '.png', '.jpg', '.jpeg',
+                        '.gif', '.svg', '.webp', '.css', '.js', '.html', '.json')
+
+_KEY_TRANSLATION = str.maketrans('', '', '_-')
+
+
+def normalize_key(key):
+    """归一化字段名：videoUrl / video_url / Video-URL 都得到 videourl"""
+    return str(key).casefold().translate(_KEY_TRANSLATION)
+
+
+def _media_path(value):
+    """返回URL路径部分（小写），用于判断扩展名"""
+    try:
+        return urlparse(value).path.lower()
+    except ValueError:
+        return value.lower()
+
+
+def score_candidate(key, value):
+    """
+    计算一个字段值作为视频URL的置信度
+
+    Args:
+        key: 字段名（None表示数组元素）
+        value: 字段值
+
+    Returns:
+        float: 0到1之间的置信度，不是候选时返回0
+    """
+    if not isinstance(value, str) or not value:
+        return 0.0
+
+    path = _media_path(value)
+    is_media = path.endswith(MEDIA_EXTENSIONS)
+    looks_like_url = value.startswith(('http://', 'https://', '//', '/'))
+
+    base = VIDEO_URL_FIELDS.get(normalize_key(key)) if key is not None else None
+    if base is None:
+        if not is_media:
+            return 0.0
+        base = MEDIA_VALUE_SCORE
+    elif not (looks_like_url or is_media):
+        return 0.0
+
+    score = base
+    if is_media:
+        score += 0.3
+    elif path.endswith(NON_VIDEO_EXTENSIONS):
+        score -= 0.4
+    if 'video' in path:
+        score += 0.1
+    if value.startswith(('http://', 'https://')):
+        score += 0.1
+
+    return round(min(max(score, 0.0), 1.0), 3)
+
+
+def extract_video_urls(data):
+    """
+    遍历JSON数据，返回所有视频URL候选
+
+    Returns:
+        list: [{'url', 'path', 'key', 'score'}, ...]，按置信度从高到低排序，
+        置信度相同时保持在文档中出现的顺序
+    """
+    candidates = []
+    seen = set()
+    stack = [('', None, data)]
+
+    while stack:
+        path, key, value = stack.pop()
+
+        if isinstance(value, dict):
+            # 逆序入栈，出栈顺序与文档顺序一致
+            for child_key, child in reversed(list(value.items())):
+                child_path = f"{path}.{child_key}" if path else str(child_key)
+                stack.append((child_path, child_key, child))
+
+        elif isinstance(value, list):
+            for index in range(len(value) - 1, -1, -1):
+                stack.append((f"{path}[{index}]", None, value[index]))
+
+        elif isinstance(value, str):
+            score = score_candidate(key, value)
+            if score > 0 and value not in seen:
+                seen.add(value)
+                candidates.append({'url': value, 'path': path, 'key': key, 'score': score})
+
+    candidates.sort(key=lambda c: -c['score'])
+    return candidates
+
+
+def best_video_url(data, min_score=0.0):
+    """返回置信度最高的候选，没有候选或置信度低于min_score时返回None"""
+    candidates = extract_video_urls(data)
+    if candidates and candidates[0]['score'] >= min_score:
+        return candidates[0]
+    return None